@@ -0,0 +1,84 @@
+"""
+Measure the per-case overhead of the loop running donated test cases.
+
+The donated test of a trivial function is run over in-memory cases, and the
+time per case is compared with calling the function directly:
+
+    python benchmarks/bench_wrapper.py --cases 100000 --repeat 5
+    python benchmarks/bench_wrapper.py --log-level INFO --progress
+
+The decorated function is only created inside main(), so importing this
+module (pytest does when collecting a tree that mentions donate) has no
+side effect.
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+
+def identity(x):
+    return x
+
+
+def build_test(func_name: str, cases: int):
+    """Register cases for a fresh function and get its donated test"""
+    from donate_a_pytest.decorators import register_for_donation
+    from donate_a_pytest.interface import register_test_cases
+
+    def func(x):
+        return x
+
+    func.__name__ = func.__qualname__ = func_name
+    register_test_cases(
+        func_name,
+        [{"input": {"x": i}, "output": i} for i in range(cases)],
+        validate="none",
+    )
+    register_for_donation(func)
+    return getattr(sys.modules[__name__], f"test_{func_name}")
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--progress", action="store_true")
+    args = parser.parse_args(argv)
+
+    from donate_a_pytest.settings import update_settings
+
+    logging.basicConfig(level=args.log_level, stream=sys.stderr)
+    update_settings(progress=args.progress)
+
+    test_func = build_test("bench_wrapper_identity", args.cases)
+    inputs = [{"x": i} for i in range(args.cases)]
+
+    def direct():
+        for inp in inputs:
+            assert identity(**inp) == inp["x"]
+
+    wrapper = best_of(test_func, args.repeat)
+    baseline = best_of(direct, args.repeat)
+    overhead = (wrapper - baseline) / args.cases * 1e9
+
+    print(f"cases:            {args.cases}")
+    print(f"wrapper:          {wrapper / args.cases * 1e9:10.0f} ns/case")
+    print(f"direct call:      {baseline / args.cases * 1e9:10.0f} ns/case")
+    print(f"wrapper overhead: {overhead:10.0f} ns/case")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Synthetic repository trees and case corpora for the benchmarks.
+
+Everything is written to disk by the functions below; importing this module
+has no side effect. Corpora are written one case at a time, so even the
+10M case corpora never sit in memory.
+"""
+
+import json
+import os
+
+CORPUS_FORMATS = ("json", "jsonl", "yaml")
+
+
+def make_case(index: int) -> dict:
+    """The index-th synthetic case of add(a, b)"""
+    a, b = index, index % 97
+    return {
+        "input": {"a": a, "b": b},
+        "output": a + b,
+        "description": f"case {index}",
+    }
+
+
+def iter_cases(count: int):
+    """Yield count synthetic cases"""
+    for index in range(count):
+        yield make_case(index)
+
+
+def write_corpus(path: str, count: int, file_format: str) -> str:
+    """
+    Write count synthetic cases to a json, json lines or yaml case file.
+
+    YAML cases are written as JSON flow mappings, which YAML parses as is.
+    """
+    if file_format not in CORPUS_FORMATS:
+        raise ValueError(f"Unknown corpus format: {file_format}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    dumps = json.dumps
+    with open(path, "w", encoding="utf-8") as f:
+        if file_format == "json":
+            f.write("[")
+            for index, case in enumerate(iter_cases(count)):
+                f.write(",\n" if index else "\n")
+                f.write(dumps(case))
+            f.write("\n]\n")
+        elif file_format == "jsonl":
+            for case in iter_cases(count):
+                f.write(dumps(case))
+                f.write("\n")
+        else:
+            for case in iter_cases(count):
+                f.write(f"- input: {dumps(case['input'])}\n")
+                f.write(f"  output: {dumps(case['output'])}\n")
+                f.write(f"  description: {dumps(case['description'])}\n")
+    return path
+
+
+def corpus_path(data_dir: str, func_name: str, count: int, file_format: str) -> str:
+    """
+    Get the directory holding a corpus of count cases for func_name, writing
+    it the first time. Corpora are kept in data_dir between runs.
+    """
+    directory = os.path.join(data_dir, f"corpus-{file_format}-{count}")
+    path = os.path.join(directory, f"{func_name}.{file_format}")
+    if not os.path.exists(path):
+        tmp_path = path + ".partial"
+        write_corpus(tmp_path, count, file_format)
+        os.replace(tmp_path, path)
+    return directory
+
+
+def make_tree(root: str, depth: int, width: int, files_per_dir: int) -> int:
+    """
+    Write a tree of nested directories under root: width subdirectories per
+    directory, depth levels deep, with files_per_dir files in each, mixing
+    Python modules, text files and case files of other functions.
+
+    Returns:
+        int: The number of files written
+    """
+    written = 0
+    directories = [root]
+    for level in range(depth + 1):
+        next_level = []
+        for directory in directories:
+            os.makedirs(directory, exist_ok=True)
+            for index in range(files_per_dir):
+                kind = index % 3
+                if kind == 0:
+                    name = f"module_{level}_{index}.py"
+                    content = f"VALUE = {index}\n"
+                elif kind == 1:
+                    name = f"notes_{level}_{index}.txt"
+                    content = "notes\n"
+                else:
+                    name = f"other_func_{level}_{index}.json"
+                    content = json.dumps([make_case(index)])
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(content)
+                written += 1
+            if level < depth:
+                next_level.extend(
+                    os.path.join(directory, f"pkg_{level}_{index}")
+                    for index in range(width)
+                )
+        directories = next_level
+    return written
+
+
+def tree_path(data_dir: str, depth: int, width: int, files_per_dir: int) -> str:
+    """Get a synthetic tree kept in data_dir, writing it the first time"""
+    root = os.path.join(data_dir, f"tree-{depth}-{width}-{files_per_dir}")
+    marker = os.path.join(root, ".complete")
+    if not os.path.exists(marker):
+        make_tree(root, depth, width, files_per_dir)
+        with open(marker, "w"):
+            pass
+    return root
+
+
+def write_donating_module(path: str, functions: int) -> str:
+    """Write a module donating functions decorated with register_for_donation"""
+    lines = ["from donate_a_pytest import register_for_donation", ""]
+    for index in range(functions):
+        lines += [
+            "",
+            "@register_for_donation",
+            f"def donated_{index}(a, b):",
+            "    return a + b",
+            "",
+        ]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return path
@@ -0,0 +1,201 @@
+"""
+Run the donate-a-pytest benchmarks and compare them with a baseline.
+
+    python benchmarks/run.py                        # quick preset
+    python benchmarks/run.py --preset full -o results.json
+    python benchmarks/run.py -k registry --sizes 10 1000000
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+
+Results are written as JSON. With --baseline, every benchmark slower than
+its baseline by more than --threshold (a fraction, 0.25 by default) is
+reported as a regression and the exit status is 1. Benchmarks taking less
+than --min-time seconds in the baseline are not compared. Synthetic trees and
+corpora are kept in --data-dir between runs, so the large corpora are only
+generated once.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import suite
+
+RESULTS_VERSION = 1
+
+
+def result_key(name: str, params: dict) -> str:
+    """Identify a benchmark run, like get_all_test_cases[format=json,size=10]"""
+    if not params:
+        return name
+    values = ",".join(
+        f"{param}={'x'.join(map(str, value)) if isinstance(value, tuple) else value}"
+        for param, value in params.items()
+    )
+    return f"{name}[{values}]"
+
+
+def run_benchmark(timed: suite.Timed, repeat: int) -> list:
+    """Get the duration of each repeat of a benchmark, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        if timed.setup is not None:
+            timed.setup()
+        start = time.perf_counter()
+        measured = timed.run()
+        elapsed = time.perf_counter() - start
+        timings.append(measured if isinstance(measured, float) else elapsed)
+    return timings
+
+
+def run_suite(
+    data_dir: str,
+    preset: dict,
+    repeat: int,
+    keywords: list = None,
+    report: callable = print,
+) -> dict:
+    """Run every selected benchmark and get the results by key"""
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="donate-bench-")
+    context = suite.Context(data_dir=data_dir, work_dir=work_dir)
+    try:
+        for bench in suite.BENCHMARKS.values():
+            for params in bench.combinations(preset):
+                key = result_key(bench.name, params)
+                if keywords and not any(keyword in key for keyword in keywords):
+                    continue
+
+                timed = bench.factory(context, **params)
+                timings = run_benchmark(timed, repeat)
+                best = min(timings)
+                results[key] = {
+                    "name": bench.name,
+                    "params": params,
+                    "items": timed.items,
+                    "best": best,
+                    "median": statistics.median(timings),
+                    "per_item_ns": best / max(timed.items, 1) * 1e9,
+                }
+                per_item = results[key]["per_item_ns"]
+                report(f"{key:<60} {best * 1e3:12.3f} ms {per_item:12.0f} ns/item")
+    finally:
+        suite.reset_state()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def environment() -> dict:
+    """Describe where the benchmarks ran"""
+    from donate_a_pytest.loaders import loader_info
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "loaders": loader_info(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, min_seconds: float = 0.001
+) -> list:
+    """
+    Compare results with baseline results (both by key), on the best time.
+    Benchmarks faster than min_seconds in the baseline are too noisy to
+    compare and are skipped.
+
+    Returns:
+        list: (key, baseline seconds, current seconds, ratio) of every
+        benchmark slower than its baseline by more than threshold
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None or previous["best"] < min_seconds:
+            continue
+        ratio = result["best"] / previous["best"]
+        if ratio > 1 + threshold:
+            regressions.append((key, previous["best"], result["best"], ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the donate-a-pytest benchmarks")
+    parser.add_argument(
+        "-k",
+        dest="keywords",
+        action="append",
+        help="Only run benchmarks whose key contains this text (repeatable)",
+    )
+    parser.add_argument("--preset", choices=sorted(suite.PRESETS), default="quick")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", help="Corpus sizes, overriding the preset"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "donate-bench-data"),
+        help="Directory keeping the generated trees and corpora",
+    )
+    parser.add_argument("-o", "--output", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.001,
+        help="Skip benchmarks faster than this many seconds in the baseline",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List the benchmarks and exit"
+    )
+    args = parser.parse_args(argv)
+
+    preset = dict(suite.PRESETS[args.preset])
+    if args.sizes:
+        preset["sizes"] = tuple(args.sizes)
+
+    if args.list:
+        for bench in suite.BENCHMARKS.values():
+            for params in bench.combinations(preset):
+                print(result_key(bench.name, params))
+        return 0
+
+    results = run_suite(args.data_dir, preset, args.repeat, args.keywords)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": RESULTS_VERSION,
+                    "environment": environment(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_time)
+        for key, before, after, ratio in regressions:
+            print(
+                f"REGRESSION {key}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms "
+                f"({ratio:.2f}x)"
+            )
+        if regressions:
+            return 1
+        print(f"No regression over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+The benchmarks of the crawler, the registry, collection and execution.
+
+A benchmark is a function registered with @benchmark. It is called once per
+combination of its parameters and returns a Timed: run() is timed on every
+repeat, after the untimed setup(). When run() returns a number, that number
+of seconds is used instead of the wall time of the call, for benchmarks
+that only measure part of what run() does.
+
+Nothing runs at import time.
+"""
+
+import contextlib
+import io
+import itertools
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import generators
+
+# Sizes of the case corpora, by preset
+PRESETS = {
+    "quick": {
+        "sizes": (10, 1_000, 10_000),
+        "trees": ((2, 3, 10), (3, 4, 20)),
+        "modules": (10, 100),
+    },
+    "full": {
+        "sizes": (10, 1_000, 100_000, 1_000_000, 10_000_000),
+        "trees": ((2, 3, 10), (3, 5, 20), (4, 6, 30)),
+        "modules": (10, 100, 1_000),
+    },
+}
+
+FUNC_NAME = "add"
+
+
+@dataclass
+class Timed:
+    run: Callable
+    setup: Optional[Callable] = None
+    # Number of cases, files or functions handled by one run
+    items: int = 1
+
+
+@dataclass
+class Benchmark:
+    name: str
+    factory: Callable
+    # Parameter name -> name of the preset entry giving its values
+    grid: dict = field(default_factory=dict)
+
+    def combinations(self, preset: dict) -> list:
+        names = list(self.grid)
+        values = [
+            preset[source] if isinstance(source, str) else source
+            for source in self.grid.values()
+        ]
+        return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+BENCHMARKS: dict = {}
+
+
+def benchmark(name: str, **grid):
+    """
+    Register a benchmark. Each keyword names a parameter and gives either
+    its values or the name of the preset entry holding them.
+    """
+
+    def decorator(factory):
+        BENCHMARKS[name] = Benchmark(name, factory, grid)
+        return factory
+
+    return decorator
+
+
+@dataclass
+class Context:
+    data_dir: str
+    work_dir: str
+
+
+def reset_state() -> None:
+    """Forget the registered cases and the indexed trees"""
+    from donate_a_pytest.model import InputOutputRegistry
+    from donate_a_pytest.utils import clear_file_indexes
+
+    InputOutputRegistry._instance = None
+    clear_file_indexes()
+
+
+@benchmark("find_paths_with_substring", tree="trees")
+def bench_find_paths(ctx: Context, tree: tuple) -> Timed:
+    from donate_a_pytest.utils import find_paths_with_substring
+
+    root = generators.tree_path(ctx.data_dir, *tree)
+    files = sum(len(names) for _, _, names in os.walk(root))
+    return Timed(
+        run=lambda: find_paths_with_substring(root, "other_func", ".json"),
+        items=files,
+    )
+
+
+@benchmark("get_all_test_cases", format=generators.CORPUS_FORMATS, size="sizes")
+def bench_get_all_test_cases(ctx: Context, format: str, size: int) -> Timed:
+    from donate_a_pytest.tests_crawler import get_all_test_cases
+
+    directory = generators.corpus_path(ctx.data_dir, FUNC_NAME, size, format)
+
+    def run():
+        cases = get_all_test_cases(FUNC_NAME, search_dir=directory)
+        assert len(cases) == size
+
+    return Timed(run=run, setup=reset_state, items=size)
+
+
+@benchmark("get_all_test_cases:loaded", size="sizes")
+def bench_get_loaded_test_cases(ctx: Context, size: int) -> Timed:
+    from donate_a_pytest.tests_crawler import get_all_test_cases
+
+    directory = generators.corpus_path(ctx.data_dir, FUNC_NAME, size, "jsonl")
+    reset_state()
+    get_all_test_cases(FUNC_NAME, search_dir=directory)
+    return Timed(
+        run=lambda: get_all_test_cases(FUNC_NAME, search_dir=directory), items=size
+    )
+
+
+def _records(size: int) -> list:
+    from donate_a_pytest.model import CaseRecord
+
+    return [CaseRecord.from_raw(case) for case in generators.iter_cases(size)]
+
+
+@benchmark("registry.extend", size="sizes")
+def bench_registry_extend(ctx: Context, size: int) -> Timed:
+    from donate_a_pytest.model import InputOutputRegistry
+
+    records = _records(size)
+    return Timed(
+        run=lambda: InputOutputRegistry.get_instance().extend(FUNC_NAME, records),
+        setup=reset_state,
+        items=size,
+    )
+
+
+@benchmark("registry.extend:duplicates", size="sizes")
+def bench_registry_dedup(ctx: Context, size: int) -> Timed:
+    from donate_a_pytest.model import InputOutputRegistry
+
+    records = _records(size)
+
+    def setup():
+        reset_state()
+        InputOutputRegistry.get_instance().extend(FUNC_NAME, records)
+
+    def run():
+        added = InputOutputRegistry.get_instance().extend(FUNC_NAME, records)
+        assert added == 0
+
+    return Timed(run=run, setup=setup, items=size)
+
+
+@benchmark("registry.register_testcase", size="sizes")
+def bench_registry_register(ctx: Context, size: int) -> Timed:
+    from donate_a_pytest.model import InputOutputRegistry
+
+    records = _records(size)
+
+    def run():
+        register = InputOutputRegistry.get_instance().register_testcase
+        for record in records:
+            register(FUNC_NAME, record)
+
+    return Timed(run=run, setup=reset_state, items=size)
+
+
+class _DonatedCollectTimer:
+    """pytest plugin adding up the time DonatedTestFile.collect takes"""
+
+    def __init__(self) -> None:
+        self.elapsed = 0.0
+        self.items = 0
+
+    def pytest_make_collect_report(self, collector):
+        from donate_a_pytest.plugin import DonatedTestFile
+
+        if isinstance(collector, DonatedTestFile):
+            start = time.perf_counter()
+            collector._bench_items = list(collector.collect())
+            self.elapsed += time.perf_counter() - start
+            self.items += len(collector._bench_items)
+            # pytest collects the items again, from the list
+            collector.collect = lambda: collector._bench_items
+        return None
+
+
+@benchmark("DonatedTestFile.collect", functions="modules")
+def bench_collect(ctx: Context, functions: int) -> Timed:
+    import pytest
+
+    module_name = f"bench_donated_{functions}"
+    directory = os.path.join(ctx.work_dir, f"collect-{functions}")
+    generators.write_donating_module(
+        os.path.join(directory, module_name + ".py"), functions
+    )
+
+    def setup():
+        reset_state()
+        sys.modules.pop(module_name, None)
+
+    def run():
+        timer = _DonatedCollectTimer()
+        with contextlib.redirect_stdout(io.StringIO()):
+            pytest.main(
+                ["--collect-only", "-q", "-p", "no:cacheprovider", directory],
+                plugins=[timer],
+            )
+        assert timer.items == functions, timer.items
+        return timer.elapsed
+
+    return Timed(run=run, setup=setup, items=functions)
+
+
+@benchmark("test_wrapper", size="sizes")
+def bench_test_wrapper(ctx: Context, size: int) -> Timed:
+    from donate_a_pytest.decorators import register_for_donation
+    from donate_a_pytest.interface import register_test_cases
+    from donate_a_pytest.tests_crawler import get_all_test_cases
+
+    reset_state()
+    func_name = f"bench_add_{size}"
+
+    def func(a, b):
+        return a + b
+
+    func.__name__ = func.__qualname__ = func_name
+    register_test_cases(func_name, generators.iter_cases(size), validate="none")
+    register_for_donation(func)
+    test_func = getattr(sys.modules[__name__], f"test_{func_name}")
+    # Index the working directory and mark the cases loaded before timing
+    get_all_test_cases(func_name)
+
+    return Timed(run=test_func, items=size)
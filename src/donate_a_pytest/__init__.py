@@ -11,6 +11,7 @@ from donate_a_pytest.interface import (
     clear_all_test_cases,
 )
 from donate_a_pytest.model import TestCase
+from donate_a_pytest.sources import CaseSource, SQLiteCaseSource, register_case_source
 
 __all__ = [
     "run_donated_tests",
@@ -25,4 +26,7 @@ __all__ = [
     "TestCase",
     "clear_function_test_cases",
     "clear_all_test_cases",
+    "CaseSource",
+    "SQLiteCaseSource",
+    "register_case_source",
 ]
@@ -0,0 +1,323 @@
+"""
+On-disk caches that let later sessions skip work done by earlier ones.
+
+CaseFileCache stores the validated test cases of every case file it has
+seen, so an unchanged JSON/YAML file is loaded with a single pickle.load
+instead of being parsed and validated again. The cache directory must only
+be writable by the user running the tests, as entries are unpickled.
+
+ResultCache remembers which test cases passed, so that they are not run
+again until the function, a project module it depends on or the case
+changes.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import sys
+import sysconfig
+import tempfile
+from collections import OrderedDict
+from typing import Optional
+
+from donate_a_pytest.settings import get_settings
+from donate_a_pytest.utils import stable_digest
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 3
+
+
+def file_digest(path: str) -> str:
+    """Get the sha256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write data to path so that readers never see a partial file"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class CaseFileCache:
+    """
+    Cache of parsed and validated test cases, one entry per case file.
+
+    An entry is used when the file's path, mtime and size are unchanged. With
+    verify_hash the content digest has to match as well, which still reads
+    the file but skips the parser and the validation.
+    """
+
+    def __init__(self, directory: str, verify_hash: bool = False) -> None:
+        self.directory = str(directory)
+        self.verify_hash = verify_hash
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _entry_path(self, path: str) -> str:
+        name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.pickle")
+
+    def load(self, path: str, stat: os.stat_result) -> Optional[list]:
+        """Get the cached test cases for a file, or None if there is no valid entry"""
+        try:
+            with open(self._entry_path(path), "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning(f"Ignoring unreadable cache entry for {path}")
+            return None
+
+        if (
+            entry.get("version") != CACHE_VERSION
+            or entry.get("path") != os.path.abspath(path)
+            or entry.get("mtime_ns") != stat.st_mtime_ns
+            or entry.get("size") != stat.st_size
+        ):
+            return None
+        if self.verify_hash and entry.get("digest") != file_digest(path):
+            return None
+        return entry["cases"]
+
+    def store(self, path: str, stat: os.stat_result, cases: list) -> None:
+        """Save the test cases parsed from a file, as of the given stat result"""
+        entry = {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": file_digest(path) if self.verify_hash else None,
+            "cases": cases,
+        }
+        try:
+            write_atomic(
+                self._entry_path(path),
+                pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {path}: {e}")
+
+    def clear(self) -> None:
+        """Remove every cache entry"""
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                os.unlink(os.path.join(self.directory, name))
+
+
+_case_file_caches: dict[tuple, CaseFileCache] = {}
+
+
+def get_case_file_cache() -> Optional[CaseFileCache]:
+    """Get the cache configured in the settings, or None if caching is off"""
+    settings = get_settings()
+    if not settings.case_cache_dir:
+        return None
+
+    key = (str(settings.case_cache_dir), settings.case_cache_verify)
+    cache = _case_file_caches.get(key)
+    if cache is None:
+        cache = CaseFileCache(settings.case_cache_dir, settings.case_cache_verify)
+        _case_file_caches[key] = cache
+    return cache
+
+
+@functools.lru_cache(maxsize=None)
+def _library_prefixes() -> tuple:
+    paths = sysconfig.get_paths()
+    return tuple(
+        os.path.abspath(paths[name]) + os.sep
+        for name in ("stdlib", "platstdlib", "purelib", "platlib")
+        if paths.get(name)
+    )
+
+
+def _is_project_file(path: str) -> bool:
+    """Check that a module file belongs to the project, not to Python or a library"""
+    if not path or not path.endswith(".py"):
+        return False
+    return not os.path.abspath(path).startswith(_library_prefixes())
+
+
+def _module_dependencies(module) -> set:
+    """Get the modules a module refers to from its namespace"""
+    dependencies = set()
+    for value in list(vars(module).values()):
+        if inspect.ismodule(value):
+            dependencies.add(value)
+            continue
+        dependency = sys.modules.get(getattr(value, "__module__", None) or "")
+        if dependency is not None:
+            dependencies.add(dependency)
+    return dependencies
+
+
+# (module name, file) -> hash, for the current session
+_module_hashes: dict[tuple, str] = {}
+
+
+def project_module_files(module) -> list:
+    """
+    Get the files of a module and of the project modules it depends on,
+    transitively. Modules of the standard library and of installed packages
+    are left out.
+    """
+    files = []
+    pending = [module]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current.__name__ in seen:
+            continue
+        seen.add(current.__name__)
+        path = getattr(current, "__file__", None)
+        if not _is_project_file(path):
+            continue
+        files.append(os.path.abspath(path))
+        pending.extend(_module_dependencies(current))
+    return files
+
+
+def module_hash(module) -> str:
+    """
+    Hash the source of a module and of the project modules it depends on
+    (see project_module_files). Hashes are computed once per process.
+    """
+    key = (module.__name__, getattr(module, "__file__", None))
+    if key in _module_hashes:
+        return _module_hashes[key]
+
+    files = {}
+    for path in project_module_files(module):
+        try:
+            files[path] = file_digest(path)
+        except OSError:
+            continue
+
+    digest = stable_digest(sorted(files.items()))
+    _module_hashes[key] = digest
+    return digest
+
+
+def function_hash(func: callable) -> str:
+    """Hash the code of a function together with its module's dependencies"""
+    try:
+        code = inspect.getsource(func)
+    except (OSError, TypeError):
+        code_object = getattr(func, "__code__", None)
+        code = repr(
+            (code_object.co_code, code_object.co_consts) if code_object else func
+        )
+
+    module = inspect.getmodule(func)
+    return stable_digest([code, module_hash(module) if module else None])
+
+
+class ResultCache:
+    """
+    Remembers which test cases passed, so they can be skipped while neither
+    the function nor the case changes.
+
+    Keys combine a hash of the function (see function_hash) with hashes of
+    the case input and expected output. At most max_entries keys are kept;
+    the least recently used ones are dropped when saving.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000) -> None:
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._keys: OrderedDict = OrderedDict()
+        self._function_hashes: dict = {}
+        self.changed = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._keys = OrderedDict.fromkeys(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError):
+            logger.warning(f"Ignoring unreadable result cache {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def case_key(self, func: callable, test_case) -> str:
+        """Get the key of a test case of a function"""
+        func_hash = self._function_hashes.get(func)
+        if func_hash is None:
+            func_hash = self._function_hashes[func] = function_hash(func)
+        parts = [func_hash, stable_digest(test_case.inp), stable_digest(test_case.outp)]
+        if test_case.budget is not None:
+            parts.append(list(test_case.budget))
+        return stable_digest(parts)
+
+    def pending(self, func: callable, test_cases, keys: list):
+        """
+        Yield the test cases that did not pass before, appending the key of
+        each yielded case to keys.
+        """
+        for test_case in test_cases:
+            key = self.case_key(func, test_case)
+            if not self.has_passed(key):
+                keys.append(key)
+                yield test_case
+
+    def has_passed(self, key: str) -> bool:
+        """Check if a case passed before, marking it as recently used"""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add_passed(self, key: str) -> None:
+        """Remember that a case passed"""
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        self.changed = True
+
+    def save(self) -> None:
+        """Write the cache, dropping the least recently used keys beyond the limit"""
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_atomic(self.path, json.dumps(list(self._keys)).encode("utf-8"))
+        self.changed = False
+
+
+_result_caches: dict[str, ResultCache] = {}
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Get the result cache configured in the settings, or None if it is off"""
+    settings = get_settings()
+    if not settings.result_cache_path:
+        return None
+
+    cache = _result_caches.get(settings.result_cache_path)
+    if cache is None:
+        cache = ResultCache(settings.result_cache_path, settings.result_cache_size)
+        _result_caches[settings.result_cache_path] = cache
+    return cache
+
+
+def save_result_caches() -> None:
+    """Write every result cache that recorded new passes and forget them"""
+    for cache in _result_caches.values():
+        if cache.changed:
+            cache.save()
+    _result_caches.clear()
+    _module_hashes.clear()
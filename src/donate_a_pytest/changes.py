@@ -0,0 +1,84 @@
+"""
+Work out which donated functions are affected by the changes to a project,
+so that only their tests need to run.
+"""
+
+import inspect
+import logging
+import os
+import subprocess
+from typing import Optional
+
+from donate_a_pytest.cache import project_module_files
+from donate_a_pytest.manifest import CollectionManifest
+
+logger = logging.getLogger(__name__)
+
+# Value of --donate-changed that compares with the previous session
+# instead of a git revision
+SINCE_LAST_SESSION = "mtime"
+
+
+def _git(args: list, cwd: str) -> list:
+    result = subprocess.run(
+        ["git", *args], cwd=cwd, capture_output=True, text=True, check=True
+    )
+    return [line for line in result.stdout.splitlines() if line]
+
+
+def git_changed_files(ref: str, directory: str) -> Optional[set]:
+    """
+    Get the absolute paths of the files that differ from a git revision,
+    including untracked files, or None if git cannot tell.
+    """
+    try:
+        top = _git(["rev-parse", "--show-toplevel"], directory)[0]
+        changed = _git(["diff", "--name-only", ref, "--"], top)
+        untracked = _git(["ls-files", "--others", "--exclude-standard"], top)
+    except (OSError, IndexError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Cannot get the files changed since {ref} from git: {e}")
+        return None
+    return {os.path.normpath(os.path.join(top, path)) for path in changed + untracked}
+
+
+def _source_file(func: callable) -> Optional[str]:
+    try:
+        return os.path.abspath(inspect.getsourcefile(func))
+    except TypeError:
+        return None
+
+
+def is_affected(
+    func: callable,
+    changed: set,
+    manifest: CollectionManifest,
+    since_last_session: bool = False,
+) -> bool:
+    """
+    Check if a donated function is affected by a set of changed files: its
+    module, a project module it depends on or one of its current or previous
+    case files changed.
+
+    When comparing with the previous session, functions in modules it did
+    not know about and functions whose set of case files changed count as
+    affected too.
+    """
+    source_file = _source_file(func)
+    if source_file is None or source_file in changed:
+        return True
+
+    module = inspect.getmodule(func)
+    if module is not None and not changed.isdisjoint(project_module_files(module)):
+        return True
+
+    case_files = set(manifest.case_files(func.__name__))
+    previous_case_files = set(manifest.previous_case_files(func.__name__))
+    if (case_files | previous_case_files) & changed:
+        return True
+
+    if since_last_session:
+        if not manifest.is_known_module(source_file):
+            return True
+        if case_files != previous_case_files:
+            return True
+    return False
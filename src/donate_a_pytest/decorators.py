@@ -2,12 +2,25 @@ import logging
 import pytest
 import inspect
 import sys
+import time
 from tqdm import tqdm
 
-from donate_a_pytest.tests_crawler import get_all_test_cases
+from donate_a_pytest.cache import get_result_cache
+from donate_a_pytest.executor import (
+    check_budget,
+    format_failure,
+    run_cases_async,
+    run_cases_in_processes,
+)
+from donate_a_pytest.settings import get_settings
+from donate_a_pytest.tests_crawler import get_all_test_cases, iter_test_cases
+from donate_a_pytest.timings import get_timings, timed
 
 logger = logging.getLogger(__name__)
 
+# Seconds between two updates of the progress bar
+PROGRESS_INTERVAL = 0.5
+
 
 def register_for_donation(func):
     """
@@ -20,30 +33,103 @@ def register_for_donation(func):
     The test function will:
     - Have the name "test_{original_function_name}"
     - Be marked with @pytest.mark.donate
-    - Run all test cases found for the original function
+    - Run all test cases found for the original function, streaming them
+      from their files when the donate_stream option is set, or over a
+      pool of worker processes when donate_workers is above 1
+    - Await the cases of a coroutine function concurrently on one event loop
+    - Skip the cases that passed before when the donate_result_cache option
+      is set and neither the function nor the case changed since
+    - Show a progress bar when the donate_progress option is set
+    - Time every case when the donate_durations option is set
+    - Fail the cases over their time or memory budget (max_ms, max_peak_kb)
     """
     # Create the test wrapper function
     @pytest.mark.donate
     def test_wrapper():
         logger.info(f"Donating tests for {func.__name__}")
-        test_cases = get_all_test_cases(func.__name__)
-        for test_case in tqdm(test_cases):
-            func_args = test_case.inp
-            output = func(**func_args)
+        settings = get_settings()
+        if settings.stream_cases:
+            test_cases = iter_test_cases(func.__name__)
+        else:
+            test_cases = get_all_test_cases(func.__name__)
+
+        result_cache = get_result_cache()
+        keys = []
+        if result_cache is not None:
+            test_cases = result_cache.pending(func, test_cases, keys)
+
+        if inspect.iscoroutinefunction(func):
+            with timed(func.__name__, "execute"):
+                failures = run_cases_async(
+                    func, test_cases, settings.async_concurrency, settings.case_timeout
+                )
+            error_msg = f"{len(failures)} test cases failed for {func.__name__}"
+            assert not failures, error_msg + "".join(failures)
+            for key in keys:
+                result_cache.add_passed(key)
+            return
+
+        if settings.workers > 1:
+            with timed(func.__name__, "execute"):
+                failures = run_cases_in_processes(
+                    func, test_cases, settings.workers, settings.chunk_size
+                )
+            if failures is not None:
+                error_msg = f"{len(failures)} test cases failed for {func.__name__}"
+                assert not failures, error_msg + "".join(failures)
+                for key in keys:
+                    result_cache.add_passed(key)
+                return
+            logger.warning(
+                f"{func.__qualname__} cannot be imported by worker processes, "
+                "running its test cases sequentially"
+            )
+
+        if settings.progress:
+            test_cases = tqdm(test_cases, mininterval=PROGRESS_INTERVAL)
+        # Decide once, so passing cases cost nothing but the call and the compare
+        log_cases = logger.isEnabledFor(logging.INFO)
+        timings = get_timings()
+        perf_counter = time.perf_counter
+
+        for index, test_case in enumerate(test_cases):
+            if timings is None:
+                output = func(**test_case.inp)
+                passed = output == test_case.outp
+            else:
+                start = perf_counter()
+                output = func(**test_case.inp)
+                executed = perf_counter()
+                passed = output == test_case.outp
+                timings.add_case(
+                    func.__name__,
+                    index,
+                    test_case,
+                    executed - start,
+                    perf_counter() - executed,
+                )
 
-            # Print test information
-            logger.info("***********************")
-            logger.info(f"Input: {test_case.inp}")
-            logger.info(f"Expected output: {test_case.outp}")
-            logger.info(f"Actual output: {output}")
-            logger.info("***********************")
+            if log_cases:
+                logger.info(
+                    "Input: %s\nExpected output: %s\nActual output: %s",
+                    test_case.inp,
+                    test_case.outp,
+                    output,
+                )
 
-            error_msg = f"\nFailed test case:\nInput: {test_case.inp}\nExpected output: {test_case.outp}\nActual output: {output}"
-            assert output == test_case.outp, error_msg
+            # The message is only formatted when the case fails
+            assert passed, format_failure(test_case.inp, test_case.outp, output)
+            if test_case.budget is not None:
+                failure = check_budget(func, test_case)
+                assert failure is None, failure
+            if result_cache is not None:
+                result_cache.add_passed(keys[-1])
 
     # Rename the wrapper to ensure pytest collection
     test_name = f"test_{func.__name__}"
     test_wrapper.__name__ = test_name
+    # Let the plugin find the donated function, e.g. to split its test cases
+    test_wrapper.donated_function = func
 
     # Get the module where the original function was defined
     module = inspect.getmodule(func)
@@ -0,0 +1,289 @@
+"""
+Ways of running the test cases of a donated function other than one by one
+in the test process.
+"""
+
+import asyncio
+import importlib
+import logging
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Iterable, Optional
+
+from donate_a_pytest.model import CaseRecord
+
+logger = logging.getLogger(__name__)
+
+
+def format_failure(inp: dict, expected: Any, actual: Any) -> str:
+    """Describe a failed test case"""
+    return f"\nFailed test case:\nInput: {inp}\nExpected output: {expected}\nActual output: {actual}"
+
+
+def format_budget_failure(inp: dict, problems: list) -> str:
+    """Describe a test case over its budget"""
+    return "\nTest case over budget:\nInput: {}\n{}".format(inp, "\n".join(problems))
+
+
+def _budget_problems(budget, durations: list, peak: Optional[int]) -> list:
+    problems = []
+    if durations:
+        median_ms = statistics.median(durations) / 1e6
+        if median_ms > budget.max_ms:
+            fastest, slowest = min(durations) / 1e6, max(durations) / 1e6
+            problems.append(
+                f"Time: median {median_ms:.3f} ms over {len(durations)} runs "
+                f"(min {fastest:.3f} ms, max {slowest:.3f} ms), "
+                f"budget {budget.max_ms} ms"
+            )
+    if peak is not None:
+        peak_kb = peak / 1024
+        if peak_kb > budget.max_peak_kb:
+            problems.append(
+                f"Peak memory: {peak_kb:.1f} KiB, budget {budget.max_peak_kb} KiB"
+            )
+    return problems
+
+
+def _start_tracing() -> tuple[bool, int]:
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    return tracing, tracemalloc.get_traced_memory()[0]
+
+
+def _stop_tracing(tracing: bool, baseline: int) -> int:
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if not tracing:
+        tracemalloc.stop()
+    return peak
+
+
+def check_budget(func: callable, test_case) -> Optional[str]:
+    """
+    Enforce the budget of a test case, if it has one.
+
+    The function is called repeat more times, timed with perf_counter_ns,
+    and the median time is compared with max_ms. For max_peak_kb it is
+    called once more under tracemalloc, which slows it down, so that call is
+    not timed.
+
+    Returns:
+        str: The failure message, or None if the case is within its budget
+    """
+    budget = test_case.budget
+    if budget is None:
+        return None
+
+    durations = []
+    if budget.max_ms is not None:
+        for _ in range(budget.repeat):
+            start = time.perf_counter_ns()
+            func(**test_case.inp)
+            durations.append(time.perf_counter_ns() - start)
+
+    peak = None
+    if budget.max_peak_kb is not None:
+        tracing, baseline = _start_tracing()
+        try:
+            func(**test_case.inp)
+        finally:
+            peak = _stop_tracing(tracing, baseline)
+
+    problems = _budget_problems(budget, durations, peak)
+    return format_budget_failure(test_case.inp, problems) if problems else None
+
+
+async def check_budget_async(func: callable, test_case) -> Optional[str]:
+    """check_budget for coroutine functions, awaiting every call"""
+    budget = test_case.budget
+    if budget is None:
+        return None
+
+    durations = []
+    if budget.max_ms is not None:
+        for _ in range(budget.repeat):
+            start = time.perf_counter_ns()
+            await func(**test_case.inp)
+            durations.append(time.perf_counter_ns() - start)
+
+    peak = None
+    if budget.max_peak_kb is not None:
+        tracing, baseline = _start_tracing()
+        try:
+            await func(**test_case.inp)
+        finally:
+            peak = _stop_tracing(tracing, baseline)
+
+    problems = _budget_problems(budget, durations, peak)
+    return format_budget_failure(test_case.inp, problems) if problems else None
+
+
+def _resolve_function(module_name: str, qualname: str) -> Optional[callable]:
+    """Find a function by the name of its module and its qualified name"""
+    try:
+        obj = sys.modules.get(module_name) or importlib.import_module(module_name)
+        for part in qualname.split("."):
+            obj = getattr(obj, part)
+    except (ImportError, AttributeError):
+        return None
+    return obj
+
+
+def _is_importable(func: callable) -> bool:
+    """Check that worker processes can find func by its module and qualname"""
+    module_name = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", "")
+    if not module_name or "<locals>" in qualname:
+        return False
+    return _resolve_function(module_name, qualname) is func
+
+
+def _run_chunk(
+    module_name: str, qualname: str, sys_path: list, chunk: list
+) -> list[tuple[int, str]]:
+    """Run a chunk of (index, case) pairs in a worker process"""
+    for path in reversed(sys_path):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    func = _resolve_function(module_name, qualname)
+    if func is None:
+        raise RuntimeError(f"Cannot import {module_name}.{qualname} in worker process")
+
+    failures = []
+    for index, test_case in chunk:
+        inp, outp = test_case.inp, test_case.outp
+        try:
+            output = func(**inp)
+        except Exception as e:
+            failures.append((index, format_failure(inp, outp, f"raised {e!r}")))
+            continue
+        if output != outp:
+            failures.append((index, format_failure(inp, outp, output)))
+        elif test_case.budget is not None:
+            message = check_budget(func, test_case)
+            if message is not None:
+                failures.append((index, message))
+    return failures
+
+
+def _as_record(test_case) -> CaseRecord:
+    if isinstance(test_case, CaseRecord):
+        return test_case
+    return CaseRecord.from_test_case(test_case)
+
+
+def run_cases_in_processes(
+    func: callable, test_cases: Iterable, workers: int, chunk_size: int = 256
+) -> Optional[list[str]]:
+    """
+    Run test cases over a pool of worker processes.
+
+    The function is sent to the workers by module and qualified name and the
+    cases in chunks, with at most two chunks per worker in flight so that a
+    streamed corpus is never fully loaded. Every failing case is collected,
+    in the order of the cases.
+
+    Returns:
+        list: The failure messages, or None if func cannot be imported by the
+        workers (e.g. a nested function), in which case nothing was run
+    """
+    if not _is_importable(func):
+        return None
+
+    module_name, qualname = func.__module__, func.__qualname__
+    # Sent as CaseRecords, which pickle compactly, budget included
+    cases = (
+        (index, _as_record(test_case)) for index, test_case in enumerate(test_cases)
+    )
+
+    failures = []
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < workers * 2:
+                chunk = list(islice(cases, chunk_size))
+                if not chunk:
+                    break
+                pending.add(
+                    pool.submit(_run_chunk, module_name, qualname, sys.path, chunk)
+                )
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                failures.extend(future.result())
+
+    failures.sort()
+    return [message for _, message in failures]
+
+
+async def _run_cases_concurrently(
+    func: callable, test_cases: Iterable, concurrency: int, timeout: Optional[float]
+) -> list[str]:
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = []
+    # Cases with a budget that passed, checked once the others are done
+    budgeted = []
+
+    async def run_case(index: int, test_case) -> None:
+        try:
+            output = await asyncio.wait_for(func(**test_case.inp), timeout)
+        except asyncio.TimeoutError:
+            output = f"timed out after {timeout}s"
+        except Exception as e:
+            output = f"raised {e!r}"
+        else:
+            if output == test_case.outp:
+                if test_case.budget is not None:
+                    budgeted.append((index, test_case))
+                return
+        finally:
+            semaphore.release()
+        failures.append((index, format_failure(test_case.inp, test_case.outp, output)))
+
+    tasks = set()
+    for index, test_case in enumerate(test_cases):
+        # Only start a case once a slot is free, so cases are pulled lazily
+        await semaphore.acquire()
+        task = asyncio.ensure_future(run_case(index, test_case))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+    # One at a time, so other cases do not skew the time and memory measured
+    for index, test_case in budgeted:
+        message = await check_budget_async(func, test_case)
+        if message is not None:
+            failures.append((index, message))
+
+    failures.sort()
+    return [message for _, message in failures]
+
+
+def run_cases_async(
+    func: callable,
+    test_cases: Iterable,
+    concurrency: int = 100,
+    timeout: Optional[float] = None,
+) -> list[str]:
+    """
+    Run the test cases of a coroutine function concurrently on one event loop.
+
+    At most concurrency cases are awaited at the same time, and a case that
+    takes longer than timeout seconds fails. Every failing case is collected,
+    in the order of the cases.
+
+    Returns:
+        list: The failure messages
+    """
+    return asyncio.run(
+        _run_cases_concurrently(func, test_cases, max(concurrency, 1), timeout)
+    )
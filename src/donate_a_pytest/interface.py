@@ -1,6 +1,11 @@
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
-from donate_a_pytest.model import InputOutputRegistry, TestCase
+from donate_a_pytest.model import (
+    CaseRecord,
+    InputOutputRegistry,
+    TestCase,
+    validate_test_cases,
+)
 
 
 def register_test_case(func_name: str, test_case: TestCase):
@@ -16,9 +21,25 @@ def register(func_name: str, inp: dict, outp: Any, desc: Optional[str] = None):
     InputOutputRegistry.get_instance().register(test_name, None, inp, outp, desc)
 
 
-def register_test_cases(func_name: str, test_cases: list[TestCase]):
-    for test_case in test_cases:
-        register_test_case(func_name, test_case)
+def register_test_cases(func_name: str, test_cases: Iterable, validate: str = "batch"):
+    """
+    Register many test cases at once, given as TestCase objects or dicts.
+
+    With validate="batch" the whole list is validated in a single pydantic
+    call. With validate="none" TestCase objects are taken as they are and
+    dicts take the fast path of CaseRecord.from_raw.
+    """
+    if validate == "batch":
+        test_cases = validate_test_cases(test_cases)
+    elif validate == "none":
+        test_cases = [
+            CaseRecord.from_raw(test_case) if isinstance(test_case, dict) else test_case
+            for test_case in test_cases
+        ]
+    else:
+        raise ValueError(f"validate must be 'batch' or 'none', got {validate!r}")
+
+    InputOutputRegistry.get_instance().extend(func_name, test_cases)
 
 
 def get_test_cases(func_name: str):
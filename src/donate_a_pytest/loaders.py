@@ -0,0 +1,75 @@
+"""
+The fastest available parsers for case files.
+
+YAML is parsed with libyaml's CSafeLoader when PyYAML was built with it,
+and JSON with orjson or msgspec when one of them is installed. Otherwise
+the pure Python loaders are used. loader_info() tells which ones are in use.
+"""
+
+import json
+
+import yaml
+
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    JSON_LOADER = f"orjson {orjson.__version__}"
+    _fast_loads = orjson.loads
+    _fast_errors = (orjson.JSONDecodeError,)
+    # orjson turns integers beyond 64 bits into floats instead of failing
+    _checks_big_ints = True
+elif msgspec is not None:
+    JSON_LOADER = f"msgspec {msgspec.__version__}"
+    _fast_loads = msgspec.json.decode
+    _fast_errors = (msgspec.DecodeError,)
+    _checks_big_ints = False
+else:
+    JSON_LOADER = "json"
+    _fast_loads = None
+    _fast_errors = ()
+    _checks_big_ints = False
+
+# Maps digits to "0" and every other byte to " ", so that a run of digits
+# is found with a single bytes.find
+_DIGITS = bytes(48 if 48 <= c <= 57 else 32 for c in range(256))
+# Integers outside the 64 bit range have at least 19 digits
+_LONG_DIGIT_RUN = b"0" * 19
+
+
+def _has_long_number(data: str | bytes) -> bool:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return data.translate(_DIGITS).find(_LONG_DIGIT_RUN) != -1
+
+
+def loads_json(data: str | bytes):
+    """
+    Parse a JSON document with the fastest available loader.
+
+    Documents the fast loaders reject but the json module accepts, such as
+    NaN, are parsed again with the json module, which also raises the
+    json.JSONDecodeError for invalid documents. So are documents holding a
+    run of 19 digits or more when orjson is used, as it would read integers
+    beyond 64 bits as floats.
+    """
+    if _fast_loads is not None and not (_checks_big_ints and _has_long_number(data)):
+        try:
+            return _fast_loads(data)
+        except _fast_errors:
+            pass
+    return json.loads(data)
+
+
+def loader_info() -> dict:
+    """Get the names of the JSON and YAML loaders in use"""
+    return {"json": JSON_LOADER, "yaml": YAML_LOADER.__name__}
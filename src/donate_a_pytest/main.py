@@ -1,18 +1,83 @@
 import os
 import argparse
+import contextlib
+import io
+import json
 import logging
 import sys
+import tempfile
 import pytest
+from collections import Counter
 from pathlib import Path
 
+from donate_a_pytest.packs import PACK_EXTENSION
+from donate_a_pytest.plugin import _donated_function
+from donate_a_pytest.profiling import (
+    DEFAULT_OUTLIER_THRESHOLD,
+    find_outliers,
+    format_profile,
+    profile_cases,
+    write_profile,
+)
+from donate_a_pytest.tests_crawler import get_all_test_cases, pack_test_cases
+
 logger = logging.getLogger(__name__)
 
 
+class _OutcomeCollector:
+    """pytest plugin collecting the outcome of every test of a run"""
+
+    def __init__(self) -> None:
+        self.tests = []
+
+    def pytest_runtest_logreport(self, report):
+        # The call phase, or the setup or teardown phase if it failed or skipped
+        if report.when == "call" or report.outcome != "passed":
+            self.tests.append(
+                {
+                    "nodeid": report.nodeid,
+                    "when": report.when,
+                    "outcome": report.outcome,
+                    "duration": report.duration,
+                }
+            )
+
+
+class _DonatedFunctionCollector:
+    """
+    pytest plugin collecting the donated functions of the selected tests and,
+    with load_cases, their test cases
+    """
+
+    def __init__(self, search_dir: str = None, load_cases: bool = False) -> None:
+        self.search_dir = search_dir
+        self.load_cases = load_cases
+        self.functions = {}
+        self.test_cases = {}
+
+    def pytest_collection_finish(self, session):
+        for item in session.items:
+            func = _donated_function(item)
+            if func is not None:
+                self.functions.setdefault(func.__name__, func)
+
+        if self.load_cases:
+            # While the settings and case sources of the session are in effect
+            for name in self.functions:
+                self.test_cases[name] = list(
+                    get_all_test_cases(name, search_dir=self.search_dir)
+                )
+
+
 def run_donated_tests(
     directory: str = None,
     verbose: bool = False,
     output_format: str = "summary",
     failfast: bool = False,
+    workers: int = 0,
+    changed: str = None,
+    durations: int = None,
+    keyword: str = None,
 ) -> dict:
     """
     Run all tests marked with @pytest.mark.donate
@@ -20,11 +85,22 @@ def run_donated_tests(
     Args:
         directory: Directory to search for tests (default: current directory)
         verbose: Whether to show verbose output
-        output_format: Format for results output ("summary", "detailed")
+        output_format: Format for results output ("summary", "detailed").
+            In detailed mode pytest's terminal output goes to stderr, leaving
+            stdout to the results
         failfast: Whether to stop at first failure
+        workers: Number of worker processes running the test cases of each
+            donated function (default: run them in the test process)
+        changed: Only run the tests of functions affected by the changes since
+            this git revision, or since the previous run if "mtime"
+        durations: Show the N slowest donated functions and test cases
+            (0 for all)
+        keyword: Only run the tests matching this pytest -k expression
 
     Returns:
-        dict: Test results summary
+        dict: Test results summary. With output_format="detailed" it also
+        holds the outcome of every test ("tests" and "outcomes") and the
+        phase timings of every donated function ("timings")
     """
     logger.info("Running tests with @pytest.mark.donate marker")
 
@@ -44,13 +120,44 @@ def run_donated_tests(
     # Add marker filter
     pytest_args.extend(["-m", "donate"])
 
+    if keyword:
+        pytest_args.extend(["-k", keyword])
+
     # Add fail fast if requested
     if failfast:
         pytest_args.append("--exitfirst")
 
+    if workers > 1:
+        pytest_args.append(f"--donate-workers={workers}")
+
+    if changed:
+        pytest_args.append(f"--donate-changed={changed}")
+
+    if durations is not None:
+        pytest_args.append(f"--donate-durations={durations}")
+
+    plugins = []
+    timings = {}
+    if output_format == "detailed":
+        collector = _OutcomeCollector()
+        plugins.append(collector)
+
     # Run pytest
-    logger.info(f"Running pytest with arguments: {pytest_args}")
-    result = pytest.main(pytest_args)
+    output = contextlib.nullcontext()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if output_format == "detailed":
+            timings_path = os.path.join(tmp_dir, "timings.json")
+            pytest_args.append(f"--donate-durations-json={timings_path}")
+            # The results are printed as JSON, which must be all of stdout
+            output = contextlib.redirect_stdout(sys.stderr)
+
+        logger.info(f"Running pytest with arguments: {pytest_args}")
+        with output:
+            result = pytest.main(pytest_args, plugins=plugins)
+
+        if output_format == "detailed" and os.path.exists(timings_path):
+            with open(timings_path, encoding="utf-8") as f:
+                timings = json.load(f)
 
     # Process results
     success = result == pytest.ExitCode.OK
@@ -62,9 +169,11 @@ def run_donated_tests(
     }
 
     if output_format == "detailed":
-        # In a real implementation, you might capture and process the test output
-        # This would require more complex pytest configuration
-        pass
+        result_summary["tests"] = collector.tests
+        result_summary["outcomes"] = dict(
+            Counter(test["outcome"] for test in collector.tests)
+        )
+        result_summary["timings"] = timings
 
     return result_summary
 
@@ -84,11 +193,123 @@ def setup_logging(verbose: bool = False):
     )
 
 
+def _collect_donated_functions(
+    directory: str = None, keyword: str = None, load_cases: bool = False
+) -> _DonatedFunctionCollector:
+    pytest_args = [directory or os.getcwd(), "--collect-only", "-q", "-m", "donate"]
+    if keyword:
+        pytest_args.extend(["-k", keyword])
+
+    collector = _DonatedFunctionCollector(directory, load_cases)
+    # Only the functions are wanted, not the collection report
+    with contextlib.redirect_stdout(io.StringIO()):
+        pytest.main(pytest_args, plugins=[collector])
+    return collector
+
+
+def find_donated_functions(directory: str = None, keyword: str = None) -> list:
+    """
+    Import the donated functions of a directory, like a donated test run
+    would, keeping those whose test matches a pytest -k expression
+
+    Returns:
+        list: The donated functions
+    """
+    return list(_collect_donated_functions(directory, keyword).functions.values())
+
+
+def profile_donated_functions(
+    directory: str = None,
+    keyword: str = None,
+    mode: str = "cpu",
+    output_dir: str = "donate-profiles",
+    outlier_threshold: float = None,
+) -> list:
+    """
+    Profile donated functions against their test cases
+
+    Args:
+        directory: Directory to search for tests and case files
+            (default: current directory)
+        keyword: Only profile the functions whose test matches this pytest
+            -k expression
+        mode: "cpu" to run the cases under cProfile, "mem" under tracemalloc
+        output_dir: Directory the .pstats or .allocations.txt files are
+            written to
+        outlier_threshold: Flag the cases far slower than the others, see
+            find_outliers (default: no flags)
+
+    Returns:
+        list: (ProfileResult, written file, outlier CaseRuns) per function,
+            see format_profile for a summary of each
+    """
+    # The cases are loaded during collection, as the pytest configuration
+    # (donate_match, donate_case_sources, ...) is reset once pytest exits
+    collector = _collect_donated_functions(directory, keyword, load_cases=True)
+    profiles = []
+    for name, func in collector.functions.items():
+        result = profile_cases(func, collector.test_cases[name], mode)
+        path = write_profile(result, output_dir)
+        outliers = []
+        if outlier_threshold is not None:
+            outliers = find_outliers(result.runs, outlier_threshold)
+        logger.info(f"Profiled {len(result.runs)} test cases of {func.__name__}")
+        profiles.append((result, path, outliers))
+    return profiles
+
+
+def pack_cases(func_names: list, directory: str = None, output_dir: str = None) -> list:
+    """
+    Compile the json, json lines and yaml test cases of functions into case
+    packs, one <name>.dapack file per function
+
+    Args:
+        func_names: Names of the functions whose cases are packed
+        directory: Directory to search for case files (default: current directory)
+        output_dir: Directory the packs are written to (default: directory)
+
+    Returns:
+        list: (path, number of cases) of every written pack
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    packs = []
+    for func_name in func_names:
+        output = None
+        if output_dir:
+            output = os.path.join(output_dir, f"{func_name}{PACK_EXTENSION}")
+        path, count = pack_test_cases(func_name, directory, output)
+        logger.info(f"Packed {count} test cases for {func_name} into {path}")
+        packs.append((path, count))
+    return packs
+
+
 def main():
     """CLI entry point for donate-a-pytest"""
     parser = argparse.ArgumentParser(
         description="Run tests with @pytest.mark.donate marker"
     )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    pack_parser = subparsers.add_parser(
+        "pack",
+        help="Compile the test cases of functions into binary case packs",
+        description="Compile the json, json lines and yaml test cases of "
+        "functions into <name>.dapack case packs, read through mmap",
+    )
+    pack_parser.add_argument("functions", nargs="+", help="Function names")
+    pack_parser.add_argument(
+        "-d",
+        "--directory",
+        help="Directory to search for case files (default: current directory)",
+        default=None,
+    )
+    pack_parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="Directory the packs are written to (default: the search directory)",
+        default=None,
+    )
 
     parser.add_argument(
         "-d",
@@ -113,11 +334,109 @@ def main():
         "-f", "--failfast", help="Stop at first failure", action="store_true"
     )
 
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Run the test cases of each function over N worker processes",
+        type=int,
+        default=0,
+    )
+
+    parser.add_argument(
+        "-c",
+        "--changed",
+        help="Only run the tests of functions whose module or case files changed "
+        "since the git revision REF (default: HEAD), or since the previous run "
+        "with --changed=mtime",
+        nargs="?",
+        const="HEAD",
+        default=None,
+        metavar="REF",
+    )
+
+    parser.add_argument(
+        "-k",
+        "--keyword",
+        help="Only run, or profile, the tests matching this pytest -k expression",
+        default=None,
+        metavar="EXPRESSION",
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Profile the donated functions against their test cases instead of "
+        "testing them, under cProfile (cpu, the default) or tracemalloc (mem)",
+        nargs="?",
+        const="cpu",
+        choices=["cpu", "mem"],
+        default=None,
+    )
+
+    parser.add_argument(
+        "--profile-dir",
+        help="Directory the profiles are written to (default: donate-profiles)",
+        default="donate-profiles",
+    )
+
+    parser.add_argument(
+        "--profile-top",
+        help="Number of functions or allocation sites shown per profile",
+        type=int,
+        default=20,
+    )
+
+    parser.add_argument(
+        "--outliers",
+        help="Flag the profiled cases whose log runtime is more than Z scaled median "
+        "absolute deviations above the median, and that take at least 10 times "
+        f"the median runtime (default Z: {DEFAULT_OUTLIER_THRESHOLD})",
+        nargs="?",
+        const=DEFAULT_OUTLIER_THRESHOLD,
+        type=float,
+        default=None,
+        metavar="Z",
+    )
+
+    parser.add_argument(
+        "--durations",
+        help="Show the N slowest donated functions and test cases (0 for all)",
+        type=int,
+        default=None,
+        metavar="N",
+    )
+
     args = parser.parse_args()
 
     # Set up logging
     setup_logging(args.verbose)
 
+    if args.command == "pack":
+        try:
+            for path, count in pack_cases(
+                args.functions, args.directory, args.output_dir
+            ):
+                print(f"{path}: {count} test cases")
+        except (OSError, ValueError) as e:
+            logger.error(f"Error packing test cases: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.profile:
+        profiles = profile_donated_functions(
+            directory=args.directory,
+            keyword=args.keyword,
+            mode=args.profile,
+            output_dir=args.profile_dir,
+            outlier_threshold=args.outliers,
+        )
+        if not profiles:
+            logger.error("No donated function matches")
+            sys.exit(1)
+        for result, path, outliers in profiles:
+            print(format_profile(result, args.profile_top, outliers))
+            print(f"Profile written to {path}")
+        sys.exit(0)
+
     try:
         # Run tests
         result = run_donated_tests(
@@ -125,12 +444,18 @@ def main():
             verbose=args.verbose,
             output_format=args.output_format,
             failfast=args.failfast,
+            workers=args.workers,
+            changed=args.changed,
+            durations=args.durations,
+            keyword=args.keyword,
         )
 
         # Output results
         if args.output_format == "summary":
             print(f"Test run {'succeeded' if result['success'] else 'failed'}")
             print(f"Exit code: {result['exit_code']} ({result['exit_code_name']})")
+        else:
+            print(json.dumps(result, indent=2))
 
         # Set exit code based on test results
         sys.exit(0 if result["success"] else 1)
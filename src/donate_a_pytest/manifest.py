@@ -0,0 +1,119 @@
+"""
+Collection manifest kept in pytest's cache between sessions.
+
+The manifest records, with fingerprints, which source files donate which
+functions, which case files belong to which function, and the directory
+listing of the case file index. A later session reuses all of it and only
+looks again at files and directories whose mtime or size changed. It also
+records which functions failed their donated tests, until they pass.
+"""
+
+import logging
+import os
+
+from donate_a_pytest.scanner import ModuleScanner
+from donate_a_pytest.utils import file_index_snapshots
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_KEY = "donate/manifest"
+MANIFEST_VERSION = 1
+
+
+def file_fingerprint(path: str):
+    """Get the [mtime_ns, size] fingerprint of a file, None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class CollectionManifest:
+    """
+    What earlier sessions learned about the donated functions of a project.
+    """
+
+    def __init__(self, data: dict = None) -> None:
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            data = {}
+        self._loaded = data
+        self.scanner = ModuleScanner(data.get("modules"))
+        # Function name -> {case file path: [mtime_ns, size]}
+        self._cases: dict[str, dict] = dict(data.get("cases", {}))
+        self.index_snapshots: dict = dict(data.get("indexes", {}))
+        # Functions whose donated tests failed in the last session running them
+        self._failed: set = set(data.get("failed", ()))
+
+    @classmethod
+    def load(cls, cache) -> "CollectionManifest":
+        """Read the manifest from pytest's cache"""
+        return cls(cache.get(MANIFEST_KEY, None))
+
+    def save(self, cache) -> None:
+        """Write the manifest to pytest's cache if anything changed"""
+        data = self.to_dict()
+        if data != self._loaded:
+            cache.set(MANIFEST_KEY, data)
+            self._loaded = data
+
+    def record_case_files(self, func_name: str, paths: list) -> None:
+        """Remember the case files of a function, with their fingerprints"""
+        files = {}
+        for path in paths:
+            fingerprint = file_fingerprint(path)
+            if fingerprint is not None:
+                files[str(path)] = fingerprint
+        self._cases[func_name] = files
+
+    def case_files(self, func_name: str) -> dict:
+        """Get the recorded case files of a function and their fingerprints"""
+        return dict(self._cases.get(func_name, {}))
+
+    def functions(self) -> list:
+        """Get the names of every function with recorded case files"""
+        return list(self._cases)
+
+    def record_results(self, ran: set, failed: set) -> None:
+        """
+        Remember the outcome of the functions whose donated tests ran: the
+        failed ones are kept until a session where they pass
+        """
+        self._failed = (self._failed - ran) | failed
+
+    def has_failed(self, func_name: str) -> bool:
+        """Check if the donated tests of a function failed when they last ran"""
+        return func_name in self._failed
+
+    def is_known_module(self, path: str) -> bool:
+        """Check if a source file had been scanned by the previous session"""
+        return str(path) in self._loaded.get("modules", {})
+
+    def previous_case_files(self, func_name: str) -> dict:
+        """Get the case files the previous session recorded for a function"""
+        return dict(self._loaded.get("cases", {}).get(func_name, {}))
+
+    def changed_files(self) -> set:
+        """
+        Get the files recorded by the previous session whose fingerprint no
+        longer matches, including files that were removed since.
+        """
+        changed = set()
+        for path, entry in self._loaded.get("modules", {}).items():
+            if file_fingerprint(path) != entry[:2]:
+                changed.add(path)
+        for files in self._loaded.get("cases", {}).values():
+            for path, fingerprint in files.items():
+                if file_fingerprint(path) != fingerprint:
+                    changed.add(path)
+        return changed
+
+    def to_dict(self) -> dict:
+        """Get the manifest in a JSON serializable form"""
+        return {
+            "version": MANIFEST_VERSION,
+            "modules": self.scanner.to_dict(),
+            "cases": self._cases,
+            "indexes": file_index_snapshots(),
+            "failed": sorted(self._failed),
+        }
@@ -1,27 +1,231 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Any
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Optional, Any, Iterable, NamedTuple
+from itertools import chain
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
 
+class Budget(NamedTuple):
+    """
+    The performance budget of a test case: the median time of repeat calls,
+    in milliseconds, and the peak memory allocated by a call, in KiB
+    """
+
+    max_ms: Optional[float] = None
+    max_peak_kb: Optional[float] = None
+    repeat: int = 1
+
+
 class TestCase(BaseModel):
     inp: dict = Field(alias="input")
     outp: Any = Field(alias="output")
     desc: Optional[str] = Field(default=None, alias="description")
+    max_ms: Optional[float] = Field(default=None, gt=0)
+    max_peak_kb: Optional[float] = Field(default=None, gt=0)
+    repeat: int = Field(default=1, ge=1)
+
+    @property
+    def budget(self) -> Optional[Budget]:
+        """The performance budget of the case, None if it has none"""
+        if self.max_ms is None and self.max_peak_kb is None:
+            return None
+        return Budget(self.max_ms, self.max_peak_kb, self.repeat)
+
+
+# Keys of a raw case that only TestCase validation handles
+_BUDGET_KEYS = frozenset(Budget._fields)
+
+
+class CaseRecord:
+    """
+    Lightweight stand-in for TestCase, used for the cases loaded in bulk from
+    case files.
+
+    A record has the inp, outp, desc and budget attributes of a TestCase but
+    no per-instance dict or pydantic bookkeeping, so a large corpus costs
+    little more than its payload. Records compare equal to TestCase objects
+    with the same content.
+    """
+
+    __slots__ = ("inp", "outp", "desc", "budget")
+
+    def __init__(
+        self,
+        inp: dict,
+        outp: Any,
+        desc: Optional[str] = None,
+        budget: Optional[Budget] = None,
+    ) -> None:
+        self.inp = inp
+        self.outp = outp
+        self.desc = desc
+        self.budget = budget
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> "CaseRecord":
+        """
+        Build a record from a raw case, e.g. a dict read from a case file.
+
+        Well-formed cases are taken as they are; anything else, including
+        cases with a budget, goes through TestCase validation, which raises a
+        ValidationError for invalid cases. Records are returned as they are.
+        """
+        if type(raw) is cls:
+            return raw
+        if type(raw) is dict and "input" in raw and "output" in raw:
+            inp = raw["input"]
+            desc = raw.get("description")
+            if (
+                type(inp) is dict
+                and (desc is None or type(desc) is str)
+                and (len(raw) == 2 or _BUDGET_KEYS.isdisjoint(raw))
+            ):
+                return cls(inp, raw["output"], desc)
+        return cls.from_test_case(TestCase(**raw))
+
+    @classmethod
+    def from_test_case(cls, test_case: TestCase) -> "CaseRecord":
+        return cls(test_case.inp, test_case.outp, test_case.desc, test_case.budget)
+
+    def validate(self) -> TestCase:
+        """Validate the record, returning the equivalent TestCase"""
+        budget = self.budget._asdict() if self.budget is not None else {}
+        return TestCase(
+            input=self.inp, output=self.outp, description=self.desc, **budget
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (CaseRecord, TestCase)):
+            return NotImplemented
+        return _same_case(self, other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (CaseRecord, (self.inp, self.outp, self.desc, self.budget))
+
+    def __repr__(self) -> str:
+        budget = f", budget={self.budget!r}" if self.budget is not None else ""
+        return (
+            f"CaseRecord(inp={self.inp!r}, outp={self.outp!r}, "
+            f"desc={self.desc!r}{budget})"
+        )
+
+
+_test_case_list_adapter = None
+
+
+def validate_test_cases(test_cases: Iterable) -> list[TestCase]:
+    """
+    Validate a batch of test cases, given as TestCase objects or as dicts,
+    with a single pydantic call. Raises a ValidationError listing every
+    invalid case.
+    """
+    global _test_case_list_adapter
+    if _test_case_list_adapter is None:
+        _test_case_list_adapter = TypeAdapter(list[TestCase])
+    return _test_case_list_adapter.validate_python(list(test_cases))
+
+
+def _freeze(value: Any):
+    """
+    Build a hashable stand-in for value.
+
+    Two frozen values compare equal exactly when the original values do, so
+    they can be kept in a set instead of comparing cases one by one. Raises
+    TypeError if value holds something that cannot be hashed.
+    """
+    if isinstance(value, dict):
+        return ("dict", frozenset((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("list", tuple(_freeze(v) for v in value))
+    if isinstance(value, tuple):
+        return ("tuple", tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return ("set", frozenset(value))
+    hash(value)
+    return value
+
+
+def _case_key(test_case) -> tuple:
+    """Get the fingerprint used to detect duplicate test cases"""
+    return (
+        _freeze(test_case.inp),
+        _freeze(test_case.outp),
+        test_case.desc,
+        test_case.budget,
+    )
+
+
+def _case_digest(test_case) -> int:
+    """
+    Hash a test case. Equal cases have the same digest, but cases with the
+    same digest still have to be compared, as different ones may collide.
+    """
+    return hash(_case_key(test_case))
+
+
+def _add_position(positions: dict, digest: int, position: int) -> None:
+    """Map a digest to the position of a case, or to a list of them"""
+    existing = positions.get(digest)
+    if existing is None:
+        positions[digest] = position
+    elif type(existing) is int:
+        positions[digest] = [existing, position]
+    else:
+        existing.append(position)
+
+
+def _positions(entry) -> Iterable:
+    return (entry,) if type(entry) is int else entry
+
+
+def _same_case(first, second) -> bool:
+    return (
+        first.inp == second.inp
+        and first.outp == second.outp
+        and first.desc == second.desc
+        and first.budget == second.budget
+    )
+
+
+# Number of locks the registry spreads function names over
+LOCK_STRIPES = 16
 
 
 class InputOutputRegistry:
     """
     Singleton class to manage registered test functions and their test cases.
+
+    The registry can be used from several threads. Each function name maps to
+    one of LOCK_STRIPES locks, so registrations for different functions
+    rarely wait for each other. A forked child process starts with a copy of
+    the cases registered so far and fresh locks; what either process
+    registers afterwards is not seen by the other.
     """
 
     _instance = None
+    _lock = threading.RLock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(InputOutputRegistry, cls).__new__(cls)
-            cls._instance._test_cases = {}
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(InputOutputRegistry, cls).__new__(cls)
+                    instance._test_cases = {}
+                    # Function name -> {case digest: position(s) in _test_cases}
+                    instance._fingerprints = {}
+                    instance._unhashable = {}
+                    # Function name -> fingerprint of the files its cases came from
+                    instance._loaded = {}
+                    # Function name -> the cases registered from its case files
+                    # and sources, dropped when they are loaded again
+                    instance._loaded_cases = {}
+                    instance._reset_locks()
+                    cls._instance = instance
         return cls._instance
 
     def __init__(self) -> None:
@@ -33,16 +237,43 @@ class InputOutputRegistry:
             cls._instance = cls.__new__(cls)
         return cls._instance
 
+    def _reset_locks(self) -> None:
+        self._locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+    def _lock_for(self, test_name: str) -> threading.RLock:
+        """Get the lock guarding the test cases of a function"""
+        return self._locks[hash(test_name) % LOCK_STRIPES]
+
     def _check_duplicate(self, test_name: str, target_case: TestCase) -> bool:
         """Check if the input output set is already registered"""
-        for test_case in self._test_cases.get(test_name, []):
-            if (
-                test_case.inp == target_case.inp
-                and test_case.outp == target_case.outp
-                and test_case.desc == target_case.desc
-            ):
-                return True
-        return False
+        registered = self._test_cases.get(test_name, [])
+        try:
+            digest = _case_digest(target_case)
+        except TypeError:
+            # Cases holding unhashable values can only be compared one by one
+            return any(_same_case(test_case, target_case) for test_case in registered)
+
+        entry = self._fingerprints.get(test_name, {}).get(digest)
+        if entry is not None and any(
+            _same_case(registered[i], target_case) for i in _positions(entry)
+        ):
+            return True
+        return any(
+            _same_case(test_case, target_case)
+            for test_case in self._unhashable.get(test_name, [])
+        )
+
+    def _append(self, test_name: str, test_case: TestCase) -> None:
+        """Store a test case that is known not to be a duplicate"""
+        registered = self._test_cases.setdefault(test_name, [])
+        registered.append(test_case)
+        try:
+            digest = _case_digest(test_case)
+        except TypeError:
+            self._unhashable.setdefault(test_name, []).append(test_case)
+        else:
+            fingerprints = self._fingerprints.setdefault(test_name, {})
+            _add_position(fingerprints, digest, len(registered) - 1)
 
     def register(
         self,
@@ -53,8 +284,6 @@ class InputOutputRegistry:
         desc: Optional[str] = None,
     ) -> None:
         """Register an input output set for a test function"""
-        logger = logging.getLogger(__name__)
-
         if func_name:
             test_name = func_name
         elif func:
@@ -63,23 +292,130 @@ class InputOutputRegistry:
             raise ValueError("Either func_name or func must be provided")
 
         target_case = TestCase(input=inp, output=outp, description=desc)
-        if self._check_duplicate(test_name, target_case):
-            logger.info(f"Test case already registered: {test_name}")
-            return
-
-        tests_cases = self._test_cases.get(test_name, [])
-        tests_cases.append(target_case)
-        self._test_cases[test_name] = tests_cases
+        self.register_testcase(test_name, target_case)
 
     def register_testcase(self, test_name: str, test_case: TestCase) -> None:
-        """Register a test case for a test function"""
-        if self._check_duplicate(test_name, test_case):
-            logger.info(f"Test case already registered: {test_name}")
-            return
+        """Register a test case (a TestCase or a CaseRecord) for a test function"""
+        with self._lock_for(test_name):
+            if self._check_duplicate(test_name, test_case):
+                logger.info(f"Test case already registered: {test_name}")
+                return
+
+            self._append(test_name, test_case)
+
+    def extend(self, test_name: str, test_cases: Iterable, loaded: bool = False) -> int:
+        """
+        Register many test cases for a test function at once.
+
+        Duplicates, of registered cases or within the batch, are found by
+        digest, and the new cases are appended in one go, in order. Cases
+        read from case files or sources are registered with loaded=True, so
+        that forget_loaded() can drop them when the files change.
+
+        Returns:
+            int: The number of cases that were added
+        """
+        with self._lock_for(test_name):
+            added = self._extend(test_name, test_cases)
+            if loaded:
+                self._loaded_cases.setdefault(test_name, []).extend(added)
+            return len(added)
+
+    def _extend(self, test_name: str, test_cases: Iterable) -> list:
+        fingerprints = self._fingerprints.setdefault(test_name, {})
+        registered = self._test_cases.get(test_name, [])
+        unhashable = list(self._unhashable.get(test_name, []))
+        added = []
+        added_unhashable = []
+        # Digests of the batch, only kept once every case was read
+        added_positions = {}
+        skipped = 0
+
+        def is_registered(test_case, digest: int) -> bool:
+            entry = fingerprints.get(digest)
+            if entry is not None and any(
+                _same_case(registered[i], test_case) for i in _positions(entry)
+            ):
+                return True
+            entry = added_positions.get(digest)
+            return entry is not None and any(
+                _same_case(added[i], test_case) for i in _positions(entry)
+            )
+
+        for test_case in test_cases:
+            try:
+                digest = _case_digest(test_case)
+            except TypeError:
+                if any(
+                    _same_case(other, test_case) for other in chain(registered, added)
+                ):
+                    skipped += 1
+                    continue
+                added_unhashable.append(test_case)
+            else:
+                if is_registered(test_case, digest) or (
+                    (unhashable or added_unhashable)
+                    and any(
+                        _same_case(other, test_case)
+                        for other in chain(unhashable, added_unhashable)
+                    )
+                ):
+                    skipped += 1
+                    continue
+                _add_position(added_positions, digest, len(added))
+            added.append(test_case)
+
+        start = len(registered)
+        for digest, entry in added_positions.items():
+            for position in _positions(entry):
+                _add_position(fingerprints, digest, start + position)
 
-        tests_cases = self._test_cases.get(test_name, [])
-        tests_cases.append(test_case)
-        self._test_cases[test_name] = tests_cases
+        if skipped:
+            logger.info(f"{skipped} test cases already registered: {test_name}")
+        self._test_cases.setdefault(test_name, []).extend(added)
+        if added_unhashable:
+            self._unhashable.setdefault(test_name, []).extend(added_unhashable)
+        return added
+
+    def forget_loaded(self, test_name: str) -> None:
+        """
+        Drop the cases of a function that were registered from its case files
+        and sources, keeping the ones registered in memory
+        """
+        with self._lock_for(test_name):
+            self._loaded.pop(test_name, None)
+            loaded = self._loaded_cases.pop(test_name, None)
+            if not loaded:
+                return
+            loaded_ids = {id(test_case) for test_case in loaded}
+            kept = [
+                test_case
+                for test_case in self._test_cases.get(test_name, [])
+                if id(test_case) not in loaded_ids
+            ]
+            self._test_cases.pop(test_name, None)
+            self._fingerprints.pop(test_name, None)
+            self._unhashable.pop(test_name, None)
+            for test_case in kept:
+                self._append(test_name, test_case)
+
+    def mark_loaded(self, test_name: str, fingerprint) -> None:
+        """
+        Remember that the case files of a function, as identified by
+        fingerprint, are registered. Clearing the function forgets it.
+        """
+        with self._lock_for(test_name):
+            self._loaded[test_name] = fingerprint
+
+    def is_loaded(self, test_name: str, fingerprint) -> bool:
+        """Check if the case files identified by fingerprint are registered"""
+        with self._lock_for(test_name):
+            return self._loaded.get(test_name) == fingerprint
+
+    def contains(self, test_name: str, test_case: TestCase) -> bool:
+        """Check if a test case is registered for a test function"""
+        with self._lock_for(test_name):
+            return self._check_duplicate(test_name, test_case)
 
     def get(self, func_name: str = "", func: callable = None) -> callable:
         """Get an input output set by name"""
@@ -96,8 +432,37 @@ class InputOutputRegistry:
 
     def clear(self):
         """Clear all registered test cases."""
-        self._test_cases = {}
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self._test_cases = {}
+            self._fingerprints = {}
+            self._unhashable = {}
+            self._loaded = {}
+            self._loaded_cases = {}
+        finally:
+            for lock in self._locks:
+                lock.release()
 
     def clear_by_func_name(self, func_name: str):
         """Clear all registered test cases for a given function name."""
-        self._test_cases.pop(func_name, None)
+        with self._lock_for(func_name):
+            self._test_cases.pop(func_name, None)
+            self._fingerprints.pop(func_name, None)
+            self._unhashable.pop(func_name, None)
+            self._loaded.pop(func_name, None)
+            self._loaded_cases.pop(func_name, None)
+
+
+def _reset_locks_after_fork() -> None:
+    """
+    Give a forked child fresh registry locks, as a lock held by another
+    thread at fork time would never be released in the child
+    """
+    InputOutputRegistry._lock = threading.RLock()
+    if InputOutputRegistry._instance is not None:
+        InputOutputRegistry._instance._reset_locks()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
@@ -0,0 +1,134 @@
+"""
+Binary case packs for large read-only corpora.
+
+A pack holds the test cases of one function in a single file:
+
+    magic (8 bytes)
+    records: one pickled (input, output, description) tuple per case, with
+        the budget as a fourth item for cases that have one
+    offsets: count + 1 little-endian uint64, where each record starts and
+        where the last one ends
+    footer: count and position of the offsets table as little-endian
+        uint64, followed by the magic again
+
+Packs are read through mmap and a case is only decoded when it is reached,
+so opening a pack costs almost nothing and processes reading the same pack
+share the page cache. Like the case file cache, packs are unpickled: only
+use packs you built yourself.
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from typing import Iterable, Iterator
+
+from donate_a_pytest.model import Budget, CaseRecord
+
+PACK_EXTENSION = ".dapack"
+MAGIC = b"DAPACK\x00\x01"
+_FOOTER = struct.Struct("<QQ8s")
+_OFFSET = struct.Struct("<Q")
+
+
+class PackError(ValueError):
+    """Raised when a file is not a valid case pack"""
+
+
+def write_pack(path: str, test_cases: Iterable) -> int:
+    """
+    Write test cases (TestCases or CaseRecords) to a pack, atomically.
+
+    Returns:
+        int: The number of cases written
+    """
+    path = str(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    offsets = []
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            position = len(MAGIC)
+            for test_case in test_cases:
+                offsets.append(position)
+                record = (test_case.inp, test_case.outp, test_case.desc)
+                if test_case.budget is not None:
+                    record += (tuple(test_case.budget),)
+                data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(data)
+                position += len(data)
+            offsets.append(position)
+
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            f.write(_FOOTER.pack(len(offsets) - 1, position, MAGIC))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(offsets) - 1
+
+
+class CasePack:
+    """
+    A case pack opened through mmap. Cases are decoded on access, by index
+    or while iterating.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(MAGIC) + _OFFSET.size + _FOOTER.size:
+                raise PackError(f"Not a case pack: {self.path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        count, table, magic = _FOOTER.unpack_from(self._mmap, size - _FOOTER.size)
+        if (
+            self._mmap[: len(MAGIC)] != MAGIC
+            or magic != MAGIC
+            or table + (count + 1) * _OFFSET.size != size - _FOOTER.size
+        ):
+            self.close()
+            raise PackError(f"Not a case pack: {self.path}")
+        self._count = count
+        self._table = table
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> CaseRecord:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("case pack index out of range")
+
+        position = self._table + index * _OFFSET.size
+        start, end = struct.unpack_from("<QQ", self._mmap, position)
+        try:
+            inp, outp, desc, *budget = pickle.loads(self._mmap[start:end])
+        except Exception as e:
+            raise PackError(f"Corrupt case {index} in {self.path}") from e
+        if budget:
+            return CaseRecord(inp, outp, desc, Budget(*budget[0]))
+        return CaseRecord(inp, outp, desc)
+
+    def __iter__(self) -> Iterator[CaseRecord]:
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> "CasePack":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def iter_pack_file(path: str) -> Iterator[CaseRecord]:
+    """Yield the cases of a pack one at a time, decoding each when reached"""
+    with CasePack(path) as pack:
+        yield from pack
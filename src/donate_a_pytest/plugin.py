@@ -6,55 +6,731 @@ It registers the custom donate marker and makes the decorator available.
 It also allows pytest to discover tests in files without the test_ prefix.
 """
 
+import asyncio
+import inspect
 import os
+import re
 import sys
+import time
+import warnings
 import pytest
+from donate_a_pytest.cache import get_result_cache, save_result_caches
 from donate_a_pytest.decorators import register_for_donation
+from donate_a_pytest.executor import (
+    check_budget,
+    check_budget_async,
+    format_failure,
+)
+from donate_a_pytest.changes import SINCE_LAST_SESSION, git_changed_files, is_affected
+from donate_a_pytest.loaders import loader_info
+from donate_a_pytest.manifest import CollectionManifest
+from donate_a_pytest.settings import get_settings
+from donate_a_pytest.sources import SOURCE_TYPES, close_case_sources
+from donate_a_pytest.tests_crawler import (
+    find_case_files,
+    get_all_test_cases,
+    shutdown_parse_pool,
+)
+from donate_a_pytest.timings import get_timings, reset_timings
+from donate_a_pytest.settings import (
+    CASE_MATCHING_STRATEGIES,
+    DEFAULT_CASE_GLOBS,
+    DEFAULT_IGNORED_DIRS,
+    update_settings,
+    set_settings,
+)
+from donate_a_pytest.utils import (
+    clear_file_indexes,
+    load_file_index_snapshots,
+    stable_digest,
+)
 
 # Export the decorator for convenient imports
 __all__ = ["register_for_donation", "donate"]
 
 
+_previous_settings_key = pytest.StashKey()
+_manifest_key = pytest.StashKey()
+_changed_files_key = pytest.StashKey()
+# Node ID -> name of the donated function of every collected donated test
+_donated_items_key = pytest.StashKey()
+# (functions whose donated tests ran, functions whose donated tests failed)
+_outcomes_key = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    """Register the donate-a-pytest ini values and command line options."""
+    parser.addini(
+        "donate_ignore_dirs",
+        "Directory names skipped when searching for test case files",
+        type="args",
+        default=sorted(DEFAULT_IGNORED_DIRS),
+    )
+
+    parser.addini(
+        "donate_match",
+        "How case files are matched to a function: "
+        + ", ".join(CASE_MATCHING_STRATEGIES),
+        default="substring",
+    )
+    parser.addini(
+        "donate_case_globs",
+        "Patterns of the case files of a function for donate_match = glob, "
+        "relative to the search directory, {name} is the function name",
+        type="linelist",
+        default=list(DEFAULT_CASE_GLOBS),
+    )
+    parser.addini(
+        "donate_cases",
+        "Case file patterns of specific functions, one "
+        "'<function> = <pattern> [<pattern>...]' per line",
+        type="linelist",
+        default=[],
+    )
+    parser.addini(
+        "donate_case_sources",
+        "Case sources to read test cases from, as <scheme>:<location> "
+        "(e.g. sqlite:cases.db), relative to the rootdir",
+        type="linelist",
+        default=[],
+    )
+
+    group = parser.getgroup("donate", "donate-a-pytest")
+    group.addoption(
+        "--donate-match",
+        choices=CASE_MATCHING_STRATEGIES,
+        default=None,
+        help="How case files are matched to a function (default: substring)",
+    )
+    group.addoption(
+        "--donate-cache",
+        action="store_true",
+        default=False,
+        help="Cache parsed test case files in the pytest cache directory",
+    )
+    parser.addini(
+        "donate_cache",
+        "Cache parsed test case files in the pytest cache directory",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-cache-verify",
+        action="store_true",
+        default=False,
+        help="Also compare content hashes before using a cached test case file",
+    )
+    parser.addini(
+        "donate_cache_verify",
+        "Also compare content hashes before using a cached test case file",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-stream",
+        action="store_true",
+        default=False,
+        help="Stream test cases from their files instead of loading them all first",
+    )
+    parser.addini(
+        "donate_stream",
+        "Stream test cases from their files instead of loading them all first",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-parse-workers",
+        type=int,
+        default=None,
+        help="Threads reading the case files of a function concurrently (default: 8)",
+    )
+    parser.addini(
+        "donate_parse_workers",
+        "Threads reading the case files of a function concurrently",
+        default="8",
+    )
+    group.addoption(
+        "--donate-parse-processes",
+        type=int,
+        default=None,
+        help="Parse yaml case files over N worker processes",
+    )
+    parser.addini(
+        "donate_parse_processes",
+        "Parse yaml case files over N worker processes",
+        default="0",
+    )
+    group.addoption(
+        "--donate-validate",
+        action="store_true",
+        default=False,
+        help="Fully validate every test case read from a file",
+    )
+    parser.addini(
+        "donate_validate",
+        "Fully validate every test case read from a file",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-progress",
+        action="store_true",
+        default=False,
+        help="Show a progress bar while the test cases of a function run",
+    )
+    parser.addini(
+        "donate_progress",
+        "Show a progress bar while the test cases of a function run",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-workers",
+        type=int,
+        default=None,
+        help="Run the test cases of each donated function over N worker processes",
+    )
+    parser.addini(
+        "donate_workers",
+        "Run the test cases of each donated function over N worker processes",
+        default="0",
+    )
+    group.addoption(
+        "--donate-chunk-size",
+        type=int,
+        default=None,
+        help="Number of test cases sent to a worker process at a time (default: 256)",
+    )
+    parser.addini(
+        "donate_chunk_size",
+        "Number of test cases sent to a worker process at a time",
+        default="256",
+    )
+    group.addoption(
+        "--donate-concurrency",
+        type=int,
+        default=None,
+        help="Test cases of a coroutine function awaited at the same time (default: 100)",
+    )
+    parser.addini(
+        "donate_concurrency",
+        "Test cases of a coroutine function awaited at the same time",
+        default="100",
+    )
+    group.addoption(
+        "--donate-timeout",
+        type=float,
+        default=None,
+        help="Seconds a single test case of a coroutine function may take",
+    )
+    parser.addini(
+        "donate_timeout",
+        "Seconds a single test case of a coroutine function may take",
+        default="",
+    )
+    group.addoption(
+        "--donate-split",
+        action="store_true",
+        default=False,
+        help="Collect every donated test case as its own test item",
+    )
+    parser.addini(
+        "donate_split",
+        "Collect every donated test case as its own test item",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-result-cache",
+        action="store_true",
+        default=False,
+        help="Skip test cases that passed before, as long as neither the function, "
+        "the project modules it depends on nor the case changed",
+    )
+    parser.addini(
+        "donate_result_cache",
+        "Skip test cases that passed before while nothing they depend on changed",
+        type="bool",
+        default=False,
+    )
+    group.addoption(
+        "--donate-no-result-cache",
+        action="store_true",
+        default=False,
+        help="Run every test case, even if donate_result_cache is set. The "
+        "parsed file cache of --donate-cache is not affected",
+    )
+    group.addoption(
+        "--donate-result-cache-size",
+        type=int,
+        default=None,
+        help="Number of passed test cases remembered by the result cache "
+        "(default: 200000)",
+    )
+    parser.addini(
+        "donate_result_cache_size",
+        "Number of passed test cases remembered by the result cache",
+        default="200000",
+    )
+    group.addoption(
+        "--donate-durations",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Show the N slowest donated functions and test cases, with the time "
+        "spent in each phase (N=0 for all)",
+    )
+    group.addoption(
+        "--donate-durations-json",
+        default=None,
+        metavar="PATH",
+        help="Write the timings of every donated function to a JSON file",
+    )
+    group.addoption(
+        "--donate-import-all",
+        action="store_true",
+        default=False,
+        help="Import every non-test module when collecting, even if its source "
+        "does not mention donate-a-pytest",
+    )
+    group.addoption(
+        "--donate-changed",
+        nargs="?",
+        const="HEAD",
+        default=None,
+        metavar="REF",
+        help="Only run the donated tests of functions whose module or case files "
+        "changed since the git revision REF (default: HEAD), or since the "
+        f"previous session with --donate-changed={SINCE_LAST_SESSION}",
+    )
+
+
+def _flag(config, name: str) -> bool:
+    """Get a boolean option that can be set on the command line or in the ini file"""
+    return bool(config.getoption(name) or config.getini(name))
+
+
+def _int(config, name: str) -> int:
+    """Get an integer option that can be set on the command line or in the ini file"""
+    value = config.getoption(name)
+    if value is None:
+        value = config.getini(name)
+    try:
+        return int(value)
+    except ValueError:
+        raise pytest.UsageError(f"{name} must be an integer, got {value!r}")
+
+
+def _float(config, name: str):
+    """Get an optional number that can be set on the command line or in the ini file"""
+    value = config.getoption(name)
+    if value is None:
+        value = config.getini(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise pytest.UsageError(f"{name} must be a number, got {value!r}")
+
+
+def _case_cache_dir(config):
+    """Get the directory of the parsed case file cache, if it is enabled"""
+    if not _flag(config, "donate_cache"):
+        return None
+    if getattr(config, "cache", None) is None:
+        warnings.warn("--donate-cache needs the cacheprovider plugin, ignoring it")
+        return None
+    return str(config.cache.mkdir("donate_cases"))
+
+
+def _result_cache_path(config):
+    """Get the file of the test result cache, if it is enabled"""
+    if config.getoption("donate_no_result_cache") or not _flag(
+        config, "donate_result_cache"
+    ):
+        return None
+    if getattr(config, "cache", None) is None:
+        warnings.warn(
+            "--donate-result-cache needs the cacheprovider plugin, ignoring it"
+        )
+        return None
+    return str(config.cache.mkdir("donate_results") / "passed.json")
+
+
+def _case_matching(config) -> str:
+    """Get the case matching strategy, from the command line or the ini file"""
+    strategy = config.getoption("donate_match") or config.getini("donate_match")
+    if strategy not in CASE_MATCHING_STRATEGIES:
+        raise pytest.UsageError(
+            f"donate_match must be one of {', '.join(CASE_MATCHING_STRATEGIES)}, "
+            f"got {strategy!r}"
+        )
+    return strategy
+
+
+def _case_file_patterns(config) -> dict:
+    """Parse the donate_cases mapping of function names to case file patterns"""
+    patterns = {}
+    for line in config.getini("donate_cases"):
+        name, sep, globs = line.partition("=")
+        if not sep or not name.strip() or not globs.split():
+            raise pytest.UsageError(
+                "donate_cases lines must look like '<function> = <pattern>', "
+                f"got {line!r}"
+            )
+        patterns.setdefault(name.strip(), []).extend(globs.split())
+    return patterns
+
+
+def _case_sources(config) -> tuple:
+    """Get the donate_case_sources locations, with paths made absolute"""
+    locations = []
+    for location in config.getini("donate_case_sources"):
+        scheme, sep, rest = location.partition(":")
+        if not sep or scheme not in SOURCE_TYPES:
+            scheme, rest = "", location
+        if rest and not os.path.isabs(rest) and "://" not in rest:
+            rest = str(config.rootpath / rest)
+        locations.append(f"{scheme}:{rest}" if scheme else rest)
+    return tuple(locations)
+
+
 def pytest_configure(config):
     """
     Register custom markers with pytest.
 
     This will eliminate warnings about unknown markers when users run tests
     with the 'donate' marker, and provides documentation for the marker.
+    It also applies the donate-a-pytest options for this session.
     """
     config.addinivalue_line(
         "markers",
         "donate: mark tests that are created via the @register_for_donation decorator",
     )
 
+    config.stash[_previous_settings_key] = update_settings(
+        ignore_dirs=frozenset(config.getini("donate_ignore_dirs")),
+        case_matching=_case_matching(config),
+        case_globs=tuple(config.getini("donate_case_globs")),
+        case_files=_case_file_patterns(config),
+        case_cache_dir=_case_cache_dir(config),
+        case_cache_verify=_flag(config, "donate_cache_verify"),
+        stream_cases=_flag(config, "donate_stream"),
+        progress=_flag(config, "donate_progress"),
+        parse_workers=_int(config, "donate_parse_workers"),
+        parse_processes=_int(config, "donate_parse_processes"),
+        validate_cases=_flag(config, "donate_validate"),
+        workers=_int(config, "donate_workers"),
+        chunk_size=_int(config, "donate_chunk_size"),
+        async_concurrency=_int(config, "donate_concurrency"),
+        case_timeout=_float(config, "donate_timeout"),
+        split_cases=_flag(config, "donate_split"),
+        case_sources=_case_sources(config),
+        result_cache_path=_result_cache_path(config),
+        result_cache_size=_int(config, "donate_result_cache_size"),
+        record_timings=config.getoption("donate_durations") is not None
+        or config.getoption("donate_durations_json") is not None,
+    )
+
+    cache = getattr(config, "cache", None)
+    if cache is not None:
+        manifest = CollectionManifest.load(cache)
+    else:
+        manifest = CollectionManifest()
+    load_file_index_snapshots(manifest.index_snapshots)
+    config.stash[_manifest_key] = manifest
+
+    ref = config.getoption("donate_changed")
+    if ref is not None and ref != SINCE_LAST_SESSION:
+        config.stash[_changed_files_key] = git_changed_files(ref, str(config.rootpath))
+
+
+def pytest_unconfigure(config):
+    """Restore the settings that were in effect before this session."""
+    save_result_caches()
+    close_case_sources()
+    shutdown_parse_pool()
+    timings = get_timings()
+    path = config.getoption("donate_durations_json", None)
+    if timings is not None and path:
+        timings.write(path)
+    reset_timings()
+    manifest = config.stash.get(_manifest_key, None)
+    cache = getattr(config, "cache", None)
+    if manifest is not None and cache is not None:
+        ran, failed = config.stash.get(_outcomes_key, (set(), set()))
+        manifest.record_results(ran, failed)
+        manifest.save(cache)
+    load_file_index_snapshots({})
+
+    previous = config.stash.get(_previous_settings_key, None)
+    if previous is not None:
+        set_settings(previous)
+    clear_file_indexes()
+
+
+def pytest_report_header(config):
+    """Show the case file loaders in use in verbose runs."""
+    if config.getoption("verbose") > 0:
+        info = loader_info()
+        return (
+            f"donate-a-pytest: json loader {info['json']}, yaml loader {info['yaml']}"
+        )
+    return None
+
+
+def _format_phases(timings) -> str:
+    return ", ".join(
+        f"{phase} {seconds:.3f}s" for phase, seconds in timings.phases.items()
+    )
+
 
-def pytest_collect_file(parent, path):
+def pytest_terminal_summary(terminalreporter):
+    """Show the slowest donated functions and cases, like --durations."""
+    count = terminalreporter.config.getoption("donate_durations")
+    timings = get_timings()
+    if count is None or timings is None:
+        return
+
+    terminalreporter.write_sep("=", "slowest donated functions")
+    for function in timings.slowest_functions(count):
+        terminalreporter.write_line(
+            f"{function.total:.3f}s {function.name} ({function.cases} cases): "
+            + _format_phases(function)
+        )
+
+    terminalreporter.write_sep("=", "slowest donated test cases")
+    for seconds, name, index, test_case in timings.slowest_cases_overall(count):
+        description = test_case.desc or repr(test_case.inp)
+        if len(description) > 60:
+            description = description[:57] + "..."
+        terminalreporter.write_line(f"{seconds:.6f}s {name}[{index}] {description}")
+
+
+def pytest_sessionstart(session):
+    """Start every session with a fresh index of the test case files."""
+    clear_file_indexes()
+
+
+def pytest_collect_file(parent, file_path):
     """
     Custom hook to collect test files that don't start with 'test_'.
 
     This allows pytest to discover tests in regular Python files that contain
-    functions decorated with @register_for_donation.
+    functions decorated with @register_for_donation. Unless --donate-import-all
+    is given, only files whose source mentions donate-a-pytest are imported.
     """
+    name = file_path.name
+    if not name.endswith(".py"):
+        return None
+
+    # Scan every Python file, so the manifest knows which functions it donates
+    manifest = parent.config.stash.get(_manifest_key, None)
+    donating = manifest is None or manifest.scanner.is_donating(file_path)
+
     # Skip files that pytest already collects (test_*.py or *_test.py)
-    name = os.path.basename(str(path))
     if name.startswith("test_") or name.endswith("_test.py"):
         return None
 
-    # Only process Python files
-    if str(path).endswith(".py"):
+    if donating or parent.config.getoption("donate_import_all"):
         # Create our custom file collector for donated tests
-        return DonatedTestFile.from_parent(parent, fspath=path)
+        return DonatedTestFile.from_parent(parent, path=file_path)
 
     return None
 
 
+def _donated_function(item):
+    """Get the donated function an item tests, None for other tests"""
+    if isinstance(item, DonatedCaseItem):
+        return item.func
+    obj = getattr(item, "obj", None)
+    return getattr(obj, "donated_function", None) if inspect.isfunction(obj) else None
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Deselect the donated tests of functions that are not affected by the
+    changes when --donate-changed is given. Other tests are left alone, and
+    so are functions whose donated tests failed when they last ran.
+    """
+    donated_items = {}
+    for item in items:
+        func = _donated_function(item)
+        if func is not None:
+            donated_items[item.nodeid] = func.__name__
+    config.stash[_donated_items_key] = donated_items
+    config.stash[_outcomes_key] = (set(), set())
+
+    if config.getoption("donate_changed") is None:
+        return
+
+    manifest = config.stash[_manifest_key]
+    changed = config.stash.get(_changed_files_key, None)
+    since_last_session = changed is None
+    if since_last_session:
+        changed = manifest.changed_files()
+
+    selected, deselected = [], []
+    affected = {}
+    for item in items:
+        func = _donated_function(item)
+        if func is not None:
+            if func not in affected:
+                affected[func] = manifest.has_failed(func.__name__) or is_affected(
+                    func, changed, manifest, since_last_session
+                )
+            if not affected[func]:
+                deselected.append(item)
+                continue
+        selected.append(item)
+
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Note which donated functions ran and which failed, for the manifest"""
+    report = yield
+    func_name = item.config.stash.get(_donated_items_key, {}).get(item.nodeid)
+    if func_name is not None and not report.skipped:
+        ran, failed = item.config.stash[_outcomes_key]
+        ran.add(func_name)
+        if report.failed:
+            failed.add(func_name)
+    return report
+
+
+def _record_case_files(config, func) -> None:
+    """Remember the case files of a donated function in the manifest"""
+    manifest = config.stash.get(_manifest_key, None)
+    if manifest is not None:
+        manifest.record_case_files(func.__name__, find_case_files(func.__name__))
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pycollect_makeitem(collector, name, obj):
+    """
+    Split the generated tests found in regular test modules into one item per
+    test case when the donate_split option is set.
+    """
+    func = getattr(obj, "donated_function", None) if inspect.isfunction(obj) else None
+    if func is None or not collector.funcnamefilter(name):
+        return None
+
+    _record_case_files(collector.config, func)
+    if get_settings().split_cases:
+        return list(_case_items(collector, name, obj)) or None
+    return None
+
+
+def _case_ids(test_cases: list) -> list:
+    """
+    Name test cases after their description, or a hash of their content.
+    Repeated names get a numeric suffix, like pytest's parametrize ids.
+    """
+    ids = []
+    for test_case in test_cases:
+        if test_case.desc:
+            ids.append(re.sub(r"[^\w.-]+", "_", test_case.desc).strip("_") or "_")
+        else:
+            ids.append(stable_digest([test_case.inp, test_case.outp], digest_size=6))
+
+    counts = {}
+    for case_id in ids:
+        counts[case_id] = counts.get(case_id, 0) + 1
+    seen = {}
+    for i, case_id in enumerate(ids):
+        if counts[case_id] > 1:
+            seen[case_id] = seen.get(case_id, -1) + 1
+            ids[i] = f"{case_id}{seen[case_id]}"
+    return ids
+
+
+def _case_items(parent, name: str, obj):
+    """Create one DonatedCaseItem per test case of a generated test function"""
+    func = obj.donated_function
+    test_cases = list(get_all_test_cases(func.__name__))
+    for index, (case_id, test_case) in enumerate(
+        zip(_case_ids(test_cases), test_cases)
+    ):
+        yield DonatedCaseItem.from_parent(
+            parent,
+            name=f"{name}[{case_id}]",
+            func=func,
+            test_case=test_case,
+            index=index,
+        )
+
+
+class DonatedCaseItem(pytest.Item):
+    """A single test case of a donated function, run as its own test item."""
+
+    def __init__(self, *, func, test_case, index=0, **kwargs):
+        super().__init__(**kwargs)
+        self.func = func
+        self.test_case = test_case
+        self.index = index
+        self.add_marker(pytest.mark.donate)
+
+    def runtest(self):
+        """Call the function with the case input and compare its output."""
+        result_cache = get_result_cache()
+        if result_cache is not None:
+            key = result_cache.case_key(self.func, self.test_case)
+            if result_cache.has_passed(key):
+                return
+
+        start = time.perf_counter()
+        if inspect.iscoroutinefunction(self.func):
+            output = asyncio.run(
+                asyncio.wait_for(
+                    self.func(**self.test_case.inp), get_settings().case_timeout
+                )
+            )
+        else:
+            output = self.func(**self.test_case.inp)
+        executed = time.perf_counter()
+        passed = output == self.test_case.outp
+
+        timings = get_timings()
+        if timings is not None:
+            timings.add_case(
+                self.func.__name__,
+                self.index,
+                self.test_case,
+                executed - start,
+                time.perf_counter() - executed,
+            )
+
+        # The message is only formatted when the case fails
+        assert passed, format_failure(self.test_case.inp, self.test_case.outp, output)
+        if self.test_case.budget is not None:
+            if inspect.iscoroutinefunction(self.func):
+                failure = asyncio.run(check_budget_async(self.func, self.test_case))
+            else:
+                failure = check_budget(self.func, self.test_case)
+            assert failure is None, failure
+        if result_cache is not None:
+            result_cache.add_passed(key)
+
+    def reportinfo(self):
+        try:
+            lineno = inspect.getsourcelines(self.func)[1] - 1
+        except (OSError, TypeError):
+            lineno = None
+        return self.path, lineno, self.name
+
+
 class DonatedTestFile(pytest.File):
     """Custom file collector for files containing donated tests."""
 
     def collect(self):
         """Find test functions in a non-test file."""
         # Import the module
-        module_path = str(self.fspath)
+        module_path = str(self.path)
         module_name = os.path.splitext(os.path.basename(module_path))[0]
 
         # Try to load the module into sys.modules
@@ -82,8 +758,16 @@ class DonatedTestFile(pytest.File):
             ):
                 # Check if this function has our donate marker
                 if any(marker.name == "donate" for marker in obj.pytestmark):
-                    # Yield test item from the parent class
-                    yield pytest.Function.from_parent(self, name=name)
+                    items = []
+                    if hasattr(obj, "donated_function"):
+                        _record_case_files(self.config, obj.donated_function)
+                        if get_settings().split_cases:
+                            items = list(_case_items(self, name, obj))
+                    if items:
+                        yield from items
+                    else:
+                        # Yield test item from the parent class
+                        yield pytest.Function.from_parent(self, name=name)
 
 
 # Make the marker available directly
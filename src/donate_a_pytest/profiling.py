@@ -0,0 +1,282 @@
+"""
+Profile donated functions against their own test cases.
+
+profile_cases() calls a function with the input of every one of its test
+cases under cProfile ("cpu") or tracemalloc ("mem"), aggregating the
+results over all cases:
+
+    cpu  one cProfile profile of every call, dumped to <name>.pstats
+    mem  the peak memory of every call, and the allocation sites of the
+         memory still held after each call (the output and anything the
+         function kept), added up over the cases and written to
+         <name>.allocations.txt
+
+Outputs are not compared with the expected outputs: profiling does not
+check correctness, and cases raising an exception are only counted. The
+runtime of every case is measured too, so find_outliers() can flag the
+cases far slower than the rest.
+"""
+
+import asyncio
+import cProfile
+import inspect
+import io
+import math
+import os
+import pstats
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+PROFILE_MODES = ("cpu", "mem")
+
+# Robust z-score above which a case is an outlier, see find_outliers
+DEFAULT_OUTLIER_THRESHOLD = 5.0
+# Times the median runtime an outlier takes at least
+OUTLIER_MIN_RATIO = 10.0
+
+# Scales the median absolute deviation to the standard deviation of a normal
+# distribution
+_MAD_SCALE = 1.4826
+
+
+@dataclass
+class CaseRun:
+    """One profiled call of a donated function"""
+
+    index: int
+    test_case: object
+    # Wall time of the call, in nanoseconds
+    ns: int
+    # Peak memory allocated during the call, in bytes (mem mode only)
+    peak: Optional[int] = None
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class ProfileResult:
+    """The aggregated profile of a donated function over its test cases"""
+
+    func_name: str
+    mode: str
+    runs: list = field(default_factory=list)
+    # cpu mode: the profile of every call
+    stats: Optional[pstats.Stats] = None
+    # mem mode: (site, bytes, blocks) still allocated after the calls,
+    # largest first
+    allocations: list = field(default_factory=list)
+
+    @property
+    def errors(self) -> int:
+        return sum(run.error is not None for run in self.runs)
+
+
+@contextmanager
+def _case_calls(func: callable):
+    """
+    Yield a function giving the call to make for the input of a case, as
+    (callable, args, kwargs). Coroutines are run on one event loop. Whether
+    func is a coroutine function is only checked once, so that neither the
+    check nor a wrapper shows up in the profiles.
+    """
+    if not inspect.iscoroutinefunction(func):
+        yield lambda inp: (func, (), inp)
+        return
+
+    loop = asyncio.new_event_loop()
+    try:
+        yield lambda inp: (loop.run_until_complete, (func(**inp),), {})
+    finally:
+        loop.close()
+
+
+def _profile_cpu(func: callable, test_cases: Iterable, result: ProfileResult):
+    profiler = cProfile.Profile()
+    with _case_calls(func) as case_call:
+        for index, test_case in enumerate(test_cases):
+            error = None
+            target, args, kwargs = case_call(test_case.inp)
+            start = time.perf_counter_ns()
+            try:
+                profiler.runcall(target, *args, **kwargs)
+            except Exception as e:
+                error = e
+            result.runs.append(
+                CaseRun(index, test_case, time.perf_counter_ns() - start, error=error)
+            )
+    result.stats = pstats.Stats(profiler)
+
+
+def _profile_mem(func: callable, test_cases: Iterable, result: ProfileResult):
+    sites = {}
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        # Leave out the allocations of tracemalloc and of this module
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        # The filename patterns are compiled the first time a trace is
+        # filtered; do it up front (the filters themselves are traced) so
+        # that it is not reported as allocated by the first case
+        tracemalloc.take_snapshot().filter_traces(filters)
+        with _case_calls(func) as case_call:
+            for index, test_case in enumerate(test_cases):
+                error = output = None
+                before = tracemalloc.take_snapshot().filter_traces(filters)
+                target, args, kwargs = case_call(test_case.inp)
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                start = time.perf_counter_ns()
+                try:
+                    output = target(*args, **kwargs)
+                except Exception as e:
+                    error = e
+                ns = time.perf_counter_ns() - start
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+
+                # The output is still referenced, so its allocations are counted
+                after = tracemalloc.take_snapshot().filter_traces(filters)
+                for diff in after.compare_to(before, "lineno"):
+                    if diff.size_diff > 0:
+                        frame = diff.traceback[0]
+                        site = f"{frame.filename}:{frame.lineno}"
+                        size, count = sites.get(site, (0, 0))
+                        sites[site] = (size + diff.size_diff, count + diff.count_diff)
+                del output
+                result.runs.append(CaseRun(index, test_case, ns, peak, error))
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    result.allocations = sorted(
+        ((site, size, count) for site, (size, count) in sites.items()),
+        key=lambda allocation: -allocation[1],
+    )
+
+
+def profile_cases(func: callable, test_cases: Iterable, mode: str = "cpu"):
+    """
+    Call a function with the input of each test case under cProfile ("cpu")
+    or tracemalloc ("mem").
+
+    Returns:
+        ProfileResult: The profile aggregated over all cases
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"mode must be 'cpu' or 'mem', got {mode!r}")
+
+    result = ProfileResult(func.__name__, mode)
+    if mode == "cpu":
+        _profile_cpu(func, test_cases, result)
+    else:
+        _profile_mem(func, test_cases, result)
+    return result
+
+
+def find_outliers(
+    runs: list,
+    threshold: float = DEFAULT_OUTLIER_THRESHOLD,
+    min_ratio: float = OUTLIER_MIN_RATIO,
+) -> list:
+    """
+    Get the runs far slower than the others, slowest first.
+
+    Runtimes are compared on a log scale, where their distribution is
+    closer to normal: a run is an outlier when its robust z-score, the
+    distance of its log runtime to the median in scaled median absolute
+    deviations, is above threshold. It must also take min_ratio times the
+    median runtime, so the jitter of functions taking microseconds, whose
+    runtimes barely spread, is not flagged.
+    """
+    if len(runs) < 3:
+        return []
+    logs = [math.log(max(run.ns, 1)) for run in runs]
+    median = statistics.median(logs)
+    deviations = [abs(value - median) for value in logs]
+    spread = _MAD_SCALE * statistics.median(deviations)
+    if not spread:
+        # Most runs took exactly as long, fall back on the mean deviation
+        spread = statistics.fmean(deviations)
+    if not spread:
+        return []
+    floor = median + math.log(min_ratio)
+    outliers = [
+        run
+        for run, value in zip(runs, logs)
+        if value >= floor and (value - median) / spread > threshold
+    ]
+    return sorted(outliers, key=lambda run: -run.ns)
+
+
+def write_profile(result: ProfileResult, output_dir: str) -> str:
+    """
+    Write a profile to <name>.pstats (cpu) or <name>.allocations.txt (mem)
+    in output_dir.
+
+    Returns:
+        str: The path of the written file
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if result.mode == "cpu":
+        path = os.path.join(output_dir, f"{result.func_name}.pstats")
+        result.stats.dump_stats(path)
+        return path
+
+    path = os.path.join(output_dir, f"{result.func_name}.allocations.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("bytes\tblocks\tsite\n")
+        for site, size, count in result.allocations:
+            f.write(f"{size}\t{count}\t{site}\n")
+    return path
+
+
+def _describe(test_case) -> str:
+    description = test_case.desc or repr(test_case.inp)
+    if len(description) > 60:
+        description = description[:57] + "..."
+    return description
+
+
+def format_profile(
+    result: ProfileResult, top: int = 20, outliers: Optional[list] = None
+) -> str:
+    """Summarize a profile: the top functions or allocation sites, and outliers"""
+    durations = [run.ns for run in result.runs]
+    lines = [
+        f"{result.func_name}: {len(result.runs)} cases, {result.errors} raised",
+    ]
+    if durations:
+        lines.append(
+            f"  runtime: median {statistics.median(durations) / 1e6:.3f} ms, "
+            f"max {max(durations) / 1e6:.3f} ms, total {sum(durations) / 1e9:.3f} s"
+        )
+
+    if result.mode == "cpu":
+        stream = io.StringIO()
+        result.stats.stream = stream
+        result.stats.sort_stats("cumulative").print_stats(top)
+        lines.append(stream.getvalue().rstrip())
+    else:
+        peaks = [run.peak for run in result.runs]
+        if peaks:
+            lines.append(
+                f"  peak memory: median {statistics.median(peaks) / 1024:.1f} KiB, "
+                f"max {max(peaks) / 1024:.1f} KiB"
+            )
+        lines.append("  top allocation sites (held after the call):")
+        for site, size, count in result.allocations[:top]:
+            lines.append(f"    {size / 1024:10.1f} KiB {count:8d} blocks  {site}")
+
+    if outliers:
+        lines.append("  outliers:")
+        for run in outliers:
+            lines.append(
+                f"    case {run.index}: {run.ns / 1e6:.3f} ms  {_describe(run.test_case)}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,128 @@
+"""
+Find the modules that donate tests without importing them.
+
+Importing every Python file of a repository just to look for decorated
+functions is slow, so the plugin first checks each file's source: a cheap
+substring test rules out almost every file, and the rest are parsed with
+ast to look for the donation decorator. Results are kept per file together
+with its mtime and size, so unchanged files are never read again.
+"""
+
+import ast
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DONATION_NAMES = frozenset({"register_for_donation", "donate"})
+PACKAGE_NAME = "donate_a_pytest"
+
+
+def _is_donation_decorator(node: ast.expr) -> bool:
+    if isinstance(node, ast.Name):
+        return node.id == "register_for_donation"
+    if isinstance(node, ast.Attribute):
+        return node.attr == "register_for_donation"
+    return False
+
+
+def scan_source(source: bytes) -> tuple[bool, list]:
+    """
+    Check if Python source refers to the donation decorator or marker, or
+    imports from donate_a_pytest, and find the functions it decorates.
+
+    Returns:
+        tuple: Whether the source donates tests, and the names of the
+        functions decorated with register_for_donation
+    """
+    # Both "donate" and "register_for_donation" contain this
+    if b"donat" not in source:
+        return False, []
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return False, []
+
+    donating = False
+    functions = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if any(_is_donation_decorator(d) for d in node.decorator_list):
+                functions.append(node.name)
+        elif isinstance(node, ast.Name) and node.id in DONATION_NAMES:
+            donating = True
+        elif isinstance(node, ast.Attribute) and node.attr in DONATION_NAMES:
+            donating = True
+        elif isinstance(node, ast.ImportFrom) and (node.module or "").startswith(
+            PACKAGE_NAME
+        ):
+            donating = True
+        elif isinstance(node, ast.Import) and any(
+            alias.name.startswith(PACKAGE_NAME) for alias in node.names
+        ):
+            donating = True
+    return donating or bool(functions), functions
+
+
+def uses_donation(source: bytes) -> bool:
+    """
+    Check if Python source refers to the donation decorator or marker, or
+    imports from donate_a_pytest.
+    """
+    return scan_source(source)[0]
+
+
+class ModuleScanner:
+    """
+    Remembers which Python files donate tests and which functions they
+    decorate, keyed by path, mtime and size.
+    """
+
+    def __init__(self, entries: dict = None) -> None:
+        # Path -> [mtime_ns, size, donating, decorated function names]
+        self._entries = {
+            path: entry
+            for path, entry in (entries or {}).items()
+            if isinstance(entry, list) and len(entry) == 4
+        }
+        self.changed = False
+
+    def _entry(self, path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self._entries.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry
+
+        try:
+            with open(path, "rb") as f:
+                donating, functions = scan_source(f.read())
+        except OSError:
+            return None
+
+        entry = [stat.st_mtime_ns, stat.st_size, donating, functions]
+        self._entries[path] = entry
+        self.changed = True
+        return entry
+
+    def is_donating(self, path: str) -> bool:
+        """Check if a Python file donates tests, reading it only if it changed"""
+        entry = self._entry(str(path))
+        return bool(entry and entry[2])
+
+    def functions(self, path: str) -> list:
+        """Get the names of the functions a Python file decorates for donation"""
+        entry = self._entry(str(path))
+        return list(entry[3]) if entry else []
+
+    def files_donating(self, func_name: str) -> list:
+        """Get the known files that decorate a function with the given name"""
+        return [path for path, entry in self._entries.items() if func_name in entry[3]]
+
+    def to_dict(self) -> dict:
+        """Get the scan results in a JSON serializable form"""
+        return dict(self._entries)
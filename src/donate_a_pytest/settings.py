@@ -0,0 +1,105 @@
+"""
+Runtime settings for donate-a-pytest.
+
+The pytest plugin fills these in from command line options and ini values
+when a session starts; the crawler and the generated test functions read
+them through get_settings().
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+# Directories that never hold donated test cases and are expensive to walk
+DEFAULT_IGNORED_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "node_modules",
+        "__pycache__",
+        ".tox",
+        ".nox",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        "build",
+        "dist",
+        "site-packages",
+    }
+)
+
+
+# How case files are matched to a function name, see tests_crawler
+CASE_MATCHING_STRATEGIES = ("substring", "exact", "sharded", "glob")
+DEFAULT_CASE_GLOBS = ("{name}.*", "*/{name}.*")
+
+
+@dataclass(frozen=True)
+class DonateSettings:
+    ignore_dirs: frozenset = DEFAULT_IGNORED_DIRS
+    case_matching: str = "substring"
+    # Patterns used by the glob strategy, {name} is the function name
+    case_globs: tuple = DEFAULT_CASE_GLOBS
+    # Function name -> patterns of its case files, whatever the strategy
+    case_files: dict = field(default_factory=dict)
+    # Directory of the parsed case file cache, None to parse every time
+    case_cache_dir: Optional[str] = None
+    case_cache_verify: bool = False
+    # Yield test cases one at a time instead of loading them all up front
+    stream_cases: bool = False
+    # Show a progress bar while the cases of a function run
+    progress: bool = False
+    # Number of worker processes running test cases, 0 or 1 to run them inline
+    workers: int = 0
+    chunk_size: int = 256
+    # Test cases of a coroutine function awaited at the same time
+    async_concurrency: int = 100
+    # Seconds a single awaited test case may take, None for no limit
+    case_timeout: Optional[float] = None
+    # Threads reading the case files of a function, 0 or 1 to read them in turn
+    parse_workers: int = 8
+    # Worker processes parsing yaml files, 0 or 1 to parse them in the threads
+    parse_processes: int = 0
+    # Run every case read from a file through TestCase validation
+    validate_cases: bool = False
+    # Locations of the case sources opened for the session
+    case_sources: tuple = ()
+    # Collect every test case as its own pytest item
+    split_cases: bool = False
+    # File remembering which test cases passed, None to run every case
+    result_cache_path: Optional[str] = None
+    result_cache_size: int = 200_000
+    # Time the phases of every donated function, see timings
+    record_timings: bool = False
+
+
+_settings = DonateSettings()
+
+
+def get_settings() -> DonateSettings:
+    """Get the settings currently in effect"""
+    return _settings
+
+
+def update_settings(**changes) -> DonateSettings:
+    """
+    Replace some settings and return the previous settings object so it can
+    be restored with set_settings().
+    """
+    global _settings
+    previous = _settings
+    _settings = replace(_settings, **changes)
+    return previous
+
+
+def set_settings(settings: DonateSettings) -> None:
+    """Install a complete settings object"""
+    global _settings
+    _settings = settings
+
+
+def reset_settings() -> None:
+    """Go back to the default settings"""
+    set_settings(DonateSettings())
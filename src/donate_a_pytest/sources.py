@@ -0,0 +1,308 @@
+"""
+Case sources: backends providing test cases besides the case files found
+next to the code and the cases registered in memory.
+
+A source implements CaseSource. Sources are either registered from code
+with register_case_source(), or listed in the donate_case_sources ini value
+as "<scheme>:<location>" (a path ending in .db, .sqlite or .sqlite3 needs
+no scheme). The crawler asks every source for the cases of a function after
+reading its case files.
+
+SQLiteCaseSource keeps cases in a SQLite database indexed by function
+name, so loading the cases of one function is an indexed query instead of
+a tree walk and a full parse.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Iterable, Iterator
+
+import yaml
+
+from donate_a_pytest.model import Budget, CaseRecord
+from donate_a_pytest.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class CaseSource:
+    """
+    Interface of a case source. Subclasses implement iter_cases, and may
+    override load_cases when they can load all cases of a function faster.
+    """
+
+    def iter_cases(self, func_name: str) -> Iterator[CaseRecord]:
+        """Yield the test cases of a function one at a time"""
+        raise NotImplementedError
+
+    def load_cases(self, func_name: str) -> list:
+        """Get all test cases of a function"""
+        return list(self.iter_cases(func_name))
+
+    def fingerprint(self):
+        """
+        Get a value that changes whenever the cases of the source change, or
+        None if the source cannot tell, so its cases are loaded every time
+        """
+        return None
+
+    def close(self) -> None:
+        """Release the resources held by the source"""
+
+
+def _to_record(test_case) -> CaseRecord:
+    if isinstance(test_case, dict):
+        return CaseRecord.from_raw(test_case)
+    return CaseRecord.from_test_case(test_case)
+
+
+def _from_row(inp: str, outp: str, desc: str, budget: str) -> CaseRecord:
+    if budget is None:
+        return CaseRecord(json.loads(inp), json.loads(outp), desc)
+    return CaseRecord(
+        json.loads(inp), json.loads(outp), desc, Budget(**json.loads(budget))
+    )
+
+
+class SQLiteCaseSource(CaseSource):
+    """
+    Test cases stored in a SQLite database, one row per case.
+
+    Inputs, outputs and budgets are stored as JSON. Cases are read in pages of
+    page_size rows using the primary key (keyset paging), so streaming the
+    cases of a function never holds more than one page in memory. Each
+    thread, and each process after a fork, uses its own connection.
+    """
+
+    def __init__(self, path: str, page_size: int = 1000) -> None:
+        self.path = str(path)
+        self.page_size = page_size
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cases ("
+                "id INTEGER PRIMARY KEY, "
+                "func_name TEXT NOT NULL, "
+                "input TEXT NOT NULL, "
+                "output TEXT NOT NULL, "
+                "description TEXT, "
+                "budget TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cases_func_name ON cases (func_name, id)"
+            )
+            # Databases created before budgets existed
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(cases)")]
+            if "budget" not in columns:
+                connection.execute("ALTER TABLE cases ADD COLUMN budget TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def iter_cases(self, func_name: str) -> Iterator[CaseRecord]:
+        """Yield the test cases of a function, a page of rows at a time"""
+        last_id = -1
+        while True:
+            cursor = self._connection().execute(
+                "SELECT id, input, output, description, budget FROM cases "
+                "WHERE func_name = ? AND id > ? ORDER BY id LIMIT ?",
+                (func_name, last_id, self.page_size),
+            )
+            rows = cursor.fetchmany(self.page_size)
+            if not rows:
+                return
+            for last_id, *row in rows:
+                yield _from_row(*row)
+            if len(rows) < self.page_size:
+                return
+
+    def load_cases(self, func_name: str) -> list:
+        """Get all test cases of a function with a single query"""
+        cursor = self._connection().execute(
+            "SELECT input, output, description, budget FROM cases "
+            "WHERE func_name = ? ORDER BY id",
+            (func_name,),
+        )
+        return [_from_row(*row) for row in cursor]
+
+    def fingerprint(self):
+        """Get the mtime and size of the database file"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def add_cases(self, func_name: str, test_cases: Iterable) -> int:
+        """
+        Store test cases, given as TestCases, CaseRecords or raw dicts, for a
+        function. Returns the number of stored cases.
+        """
+        rows = (
+            (
+                func_name,
+                json.dumps(record.inp),
+                json.dumps(record.outp),
+                record.desc,
+                json.dumps(record.budget._asdict()) if record.budget else None,
+            )
+            for record in map(_to_record, test_cases)
+        )
+        connection = self._connection()
+        with connection:
+            cursor = connection.executemany(
+                "INSERT INTO cases (func_name, input, output, description, budget) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return cursor.rowcount
+
+    def remove_cases(self, func_name: str) -> None:
+        """Delete every test case of a function"""
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM cases WHERE func_name = ?", (func_name,))
+
+    def functions(self) -> list:
+        """Get the names of the functions that have test cases"""
+        cursor = self._connection().execute(
+            "SELECT DISTINCT func_name FROM cases ORDER BY func_name"
+        )
+        return [func_name for func_name, in cursor]
+
+    def count(self, func_name: str) -> int:
+        """Get the number of test cases of a function"""
+        cursor = self._connection().execute(
+            "SELECT COUNT(*) FROM cases WHERE func_name = ?", (func_name,)
+        )
+        return cursor.fetchone()[0]
+
+    def import_files(self, func_names: Iterable, search_dir: str = None) -> int:
+        """
+        Import the case files of functions, found the same way as for their
+        donated tests, replacing the cases already stored for them.
+
+        Returns:
+            int: The number of imported cases
+        """
+        # Imported here, the crawler imports this module
+        from donate_a_pytest.tests_crawler import _find_case_files
+
+        imported = 0
+        for func_name in func_names:
+            self.remove_cases(func_name)
+            for path, case_format in _find_case_files(func_name, search_dir):
+                imported += self.add_cases(func_name, case_format.read(path))
+        return imported
+
+    def export_files(
+        self, directory: str, func_names: Iterable = None, file_format: str = "json"
+    ) -> list:
+        """
+        Write the cases of functions (default: all of them) to <name>.json or
+        <name>.yaml files in a directory.
+
+        Returns:
+            list: The paths of the written files
+        """
+        if file_format not in ("json", "yaml"):
+            raise ValueError(
+                f"file_format must be 'json' or 'yaml', got {file_format!r}"
+            )
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for func_name in func_names or self.functions():
+            test_cases = []
+            for record in self.iter_cases(func_name):
+                test_case = {"input": record.inp, "output": record.outp}
+                if record.desc is not None:
+                    test_case["description"] = record.desc
+                if record.budget is not None:
+                    test_case.update(
+                        (field, value)
+                        for field, value in record.budget._asdict().items()
+                        if value is not None
+                    )
+                test_cases.append(test_case)
+
+            path = os.path.join(directory, f"{func_name}.{file_format}")
+            with open(path, "w", encoding="utf-8") as f:
+                if file_format == "json":
+                    json.dump(test_cases, f, indent=2)
+                else:
+                    yaml.safe_dump(test_cases, f, sort_keys=False)
+            paths.append(path)
+        return paths
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+# Scheme of a source location -> factory taking the rest of the location
+SOURCE_TYPES = {"sqlite": SQLiteCaseSource}
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+_registered_sources: list = []
+_opened_sources: dict = {}
+
+
+def register_source_type(scheme: str, factory: callable) -> None:
+    """Let donate_case_sources open "<scheme>:<location>" with a factory"""
+    SOURCE_TYPES[scheme] = factory
+
+
+def open_case_source(location: str) -> CaseSource:
+    """Open a source from a "<scheme>:<location>" string or a SQLite path"""
+    scheme, sep, rest = location.partition(":")
+    if sep and scheme in SOURCE_TYPES:
+        return SOURCE_TYPES[scheme](rest)
+    if location.endswith(SQLITE_SUFFIXES):
+        return SQLiteCaseSource(location)
+    raise ValueError(f"Unknown case source: {location}")
+
+
+def register_case_source(source: CaseSource) -> None:
+    """Add a case source for the rest of the process"""
+    _registered_sources.append(source)
+
+
+def get_case_sources() -> list:
+    """Get the registered sources and the sources listed in the settings"""
+    sources = list(_registered_sources)
+    for location in get_settings().case_sources:
+        source = _opened_sources.get(location)
+        if source is None:
+            source = _opened_sources[location] = open_case_source(location)
+        sources.append(source)
+    return sources
+
+
+def close_case_sources() -> None:
+    """Close the sources opened from the settings"""
+    for source in _opened_sources.values():
+        source.close()
+    _opened_sources.clear()
+
+
+def clear_case_sources() -> None:
+    """Forget the registered sources and close the opened ones"""
+    _registered_sources.clear()
+    close_case_sources()
@@ -2,34 +2,355 @@ import os
 import json
 import yaml
 import logging
+import multiprocessing
+import threading
 
-from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Iterator
 
-from donate_a_pytest.utils import find_paths_with_substring
-from donate_a_pytest.model import TestCase, InputOutputRegistry
+from donate_a_pytest.cache import get_case_file_cache
+from donate_a_pytest.loaders import YAML_LOADER, loads_json
+from donate_a_pytest.utils import get_file_index
+from donate_a_pytest.model import CaseRecord, TestCase, InputOutputRegistry, _case_key
+from donate_a_pytest.packs import (
+    PACK_EXTENSION,
+    PackError,
+    iter_pack_file,
+    write_pack,
+)
+from donate_a_pytest.settings import get_settings
+from donate_a_pytest.sources import get_case_sources
+from donate_a_pytest.timings import get_timings, timed
 
+YAML_EXTENSIONS = (".yaml", ".yml")
 
-def crawl_json_test_cases(test_name: str, search_dir: str = None) -> list:
+
+def _iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator:
     """
-    Crawl the json input for a given test name
+    Yield the elements of the JSON array read from f one at a time, without
+    loading the whole array. Raises json.JSONDecodeError on invalid input.
     """
-    logger = logging.getLogger(__name__)
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    eof = not buffer
+    pos = 0
+    expect_value = True
+    after_comma = False
 
-    search_dir = search_dir or os.getcwd()
-    json_files = find_paths_with_substring(search_dir, test_name, ".json")
-    test_cases = []
-    for json_file in json_files:
-        with open(json_file, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                logger.warning(f"Invalid JSON file: {json_file}")
-                continue
+    while True:
+        # Skip whitespace, reading more data when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("Unterminated array", buffer, pos)
+
+        if buffer[pos] == "]" and not (expect_value and after_comma):
+            return
+        if not expect_value:
+            if buffer[pos] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos += 1
+            expect_value = after_comma = True
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
 
+        if not complete:
+            # The value may continue past the buffer, read more and retry
+            chunk = f.read(max(chunk_size, len(buffer)))
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        yield value
+        pos = end
+        expect_value = False
+
+
+def _iter_json_file(json_file: str) -> Iterator:
+    """
+    Yield the raw test cases of a json file. Arrays are parsed incrementally.
+    """
+    with open(json_file, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+
+        if head == "[":
+            yield from _iter_json_array(f)
+        else:
+            yield loads_json(head + f.read())
+
+
+def _read_json_file(json_file: str) -> list:
+    """
+    Read all raw test cases of a json file at once, with the fastest loader
+    """
+    with open(json_file, "rb") as f:
+        data = loads_json(f.read())
+    return data if isinstance(data, list) else [data]
+
+
+def _iter_jsonl_file(jsonl_file: str) -> Iterator:
+    """
+    Yield the raw test cases of a json lines file, one per non-empty line
+    """
+    with open(jsonl_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield loads_json(line)
+
+
+def _iter_yaml_file(yaml_file: str) -> Iterator:
+    """
+    Yield the raw test cases of a yaml file, document by document
+    """
+    with open(yaml_file, "r", encoding="utf-8") as f:
+        for data in yaml.load_all(f, Loader=YAML_LOADER):
             if isinstance(data, list):
-                test_cases.extend(data)
-            else:
-                test_cases.append(data)
+                yield from data
+            elif data:
+                yield data
+
+
+class CaseFileFormat:
+    """
+    A test case file format, read either completely or as a stream.
+
+    Complete reads use load when it is given, e.g. to parse a whole file in
+    one call instead of incrementally. An invalid file is skipped with a
+    warning. When it is read completely none of its cases are used; when it
+    is streamed, the cases before the error have already been yielded.
+    """
+
+    def __init__(
+        self, name: str, iterate: callable, error: type, load: callable = None
+    ) -> None:
+        self.name = name
+        self.iterate = iterate
+        self.error = error
+        self.load = load
+
+    def parse(self, path: str) -> list:
+        """Read all raw test cases of a file, raising self.error if it is invalid"""
+        if self.load is not None:
+            return self.load(path)
+        return list(self.iterate(path))
+
+    def read(self, path: str) -> list:
+        """Read all raw test cases of a file"""
+        try:
+            return self.parse(path)
+        except self.error:
+            self.warn_invalid(path)
+            return []
+
+    def warn_invalid(self, path: str) -> None:
+        logging.getLogger(__name__).warning(f"Invalid {self.name} file: {path}")
+
+    def stream(self, path: str) -> Iterator:
+        """Yield the raw test cases of a file one at a time"""
+        try:
+            yield from self.iterate(path)
+        except self.error:
+            self.warn_invalid(path)
+
+
+JSON_FORMAT = CaseFileFormat(
+    "JSON", _iter_json_file, json.JSONDecodeError, load=_read_json_file
+)
+JSONL_FORMAT = CaseFileFormat("JSON Lines", _iter_jsonl_file, json.JSONDecodeError)
+YAML_FORMAT = CaseFileFormat("YAML", _iter_yaml_file, yaml.YAMLError)
+PACK_FORMAT = CaseFileFormat("case pack", iter_pack_file, PackError)
+_FORMATS = {
+    case_format.name: case_format
+    for case_format in (JSON_FORMAT, JSONL_FORMAT, YAML_FORMAT, PACK_FORMAT)
+}
+
+
+def _parse_in_worker(format_name: str, path: str):
+    """Parse a case file in a worker process, None if it is invalid"""
+    case_format = _FORMATS[format_name]
+    try:
+        return case_format.parse(path)
+    except case_format.error:
+        return None
+
+
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Get the pool of processes parsing yaml files, kept for the session.
+    Workers are spawned rather than forked, as the pool is started from the
+    threads reading case files.
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown()
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def shutdown_parse_pool() -> None:
+    """Stop the worker processes parsing yaml files, if any were started"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
+
+
+def _read_in_process(case_format: CaseFileFormat, path: str) -> list:
+    """Read all raw test cases of a file in a worker process"""
+    workers = get_settings().parse_processes
+    test_cases = (
+        _get_process_pool(workers)
+        .submit(_parse_in_worker, case_format.name, path)
+        .result()
+    )
+    if test_cases is None:
+        case_format.warn_invalid(path)
+        return []
+    return test_cases
+
+
+def _reader(case_format: CaseFileFormat) -> callable:
+    """
+    Get the function reading all raw test cases of a file: in a worker
+    process for yaml files when the donate_parse_processes option is above 1
+    """
+    if case_format is YAML_FORMAT and get_settings().parse_processes > 1:
+        return partial(_read_in_process, case_format)
+    return case_format.read
+
+
+def _read_case_file(path: str, case_format: CaseFileFormat) -> list:
+    return _reader(case_format)(path)
+
+
+def _map_case_files(function: callable, files: list) -> list:
+    """
+    Call function(path, case_format) for every case file, over a pool of
+    donate_parse_workers threads when there are several files. Results are
+    returned in the order of the files.
+    """
+    workers = min(get_settings().parse_workers, len(files))
+    if workers <= 1:
+        return [function(path, case_format) for path, case_format in files]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, *zip(*files)))
+
+
+_FORMAT_EXTENSIONS = (
+    (".json", JSON_FORMAT),
+    (".jsonl", JSONL_FORMAT),
+    (YAML_EXTENSIONS, YAML_FORMAT),
+    (PACK_EXTENSION, PACK_FORMAT),
+)
+
+
+def _matching_paths(test_name: str, index, extension) -> list:
+    """
+    Get the indexed case files of a function with the given extension(s),
+    according to the case matching settings:
+
+    - substring: the file name contains the function name
+    - exact: the file name is the function name plus the extension
+    - sharded: exact, or <name>.<anything><extension> such as halve.001.json
+    - glob: the path relative to the search directory matches one of the
+      case_globs patterns, where {name} stands for the function name
+
+    Functions listed in the donate_cases mapping use their own patterns.
+    """
+    settings = get_settings()
+    patterns = settings.case_files.get(test_name)
+    strategy = "glob" if patterns else settings.case_matching
+
+    if strategy == "substring":
+        return index.find(test_name, extension)
+    if strategy == "exact":
+        extensions = (extension,) if isinstance(extension, str) else extension
+        names = {test_name + ext for ext in extensions}
+        return index.select(("exact", test_name, extension), names.__contains__)
+    if strategy == "sharded":
+        prefix = test_name + "."
+        return index.select(
+            ("sharded", test_name, extension),
+            lambda name: name.startswith(prefix) and name.endswith(extension),
+        )
+    if strategy == "glob":
+        if not patterns:
+            patterns = [glob.format(name=test_name) for glob in settings.case_globs]
+        return [path for path in index.glob(patterns) if path.endswith(extension)]
+    raise ValueError(f"Unknown case matching strategy: {strategy}")
+
+
+def _find_all_case_files(test_name: str, search_dir: str = None) -> list:
+    index = get_file_index(search_dir or os.getcwd())
+    return [
+        (path, case_format)
+        for extension, case_format in _FORMAT_EXTENSIONS
+        for path in _matching_paths(test_name, index, extension)
+    ]
+
+
+def _find_case_files(test_name: str, search_dir: str = None) -> list:
+    """
+    Find the case files for a given test name, paired with their format.
+    When there is a case pack for the test name, only packs are returned, as
+    a pack holds the cases of the files it was compiled from.
+    """
+    files = _find_all_case_files(test_name, search_dir)
+    packs = [
+        (path, case_format) for path, case_format in files if case_format is PACK_FORMAT
+    ]
+    return packs or files
+
+
+def find_case_files(test_name: str, search_dir: str = None) -> list:
+    """
+    Find the paths of the json, json lines, yaml and pack files for a given
+    test name
+    """
+    return [path for path, _ in _find_case_files(test_name, search_dir)]
+
+
+def crawl_json_test_cases(test_name: str, search_dir: str = None) -> list:
+    """
+    Crawl the json input for a given test name
+    """
+    files = [
+        (path, case_format)
+        for path, case_format in _find_case_files(test_name, search_dir)
+        if case_format in (JSON_FORMAT, JSONL_FORMAT)
+    ]
+    test_cases = []
+    for file_cases in _map_case_files(_read_case_file, files):
+        test_cases.extend(file_cases)
 
     return test_cases
 
@@ -38,32 +359,111 @@ def crawl_yaml_test_cases(test_name: str, search_dir: str = None) -> list:
     """
     Crawl the yaml input for a given test name
     """
-    logger = logging.getLogger(__name__)
-
-    search_dir = search_dir or os.getcwd()
-    yaml_files = find_paths_with_substring(search_dir, test_name, ".yaml")
+    files = [
+        (path, case_format)
+        for path, case_format in _find_case_files(test_name, search_dir)
+        if case_format is YAML_FORMAT
+    ]
     test_cases = []
-    for yaml_file in yaml_files:
-        with open(yaml_file, "r", encoding="utf-8") as f:
-            try:
-                data = yaml.load(f, Loader=yaml.SafeLoader)
-            except yaml.YAMLError:
-                logger.warning(f"Invalid YAML file: {yaml_file}")
-                continue
+    for file_cases in _map_case_files(_read_case_file, files):
+        test_cases.extend(file_cases)
 
-            if isinstance(data, list):
-                test_cases.extend(data)
-            elif data:
-                test_cases.append(data)
+    return test_cases
+
+
+def _validated_record(test_case) -> CaseRecord:
+    if isinstance(test_case, CaseRecord):
+        # Streamed from a case pack
+        return CaseRecord.from_test_case(test_case.validate())
+    return CaseRecord.from_test_case(TestCase(**test_case))
+
+
+def _record_factory() -> callable:
+    """
+    Get the function turning raw cases into CaseRecords: the fast path, or
+    full TestCase validation when the donate_validate option is set
+    """
+    if get_settings().validate_cases:
+        return _validated_record
+    return CaseRecord.from_raw
+
+
+def _records_of(path: str, reader: callable, to_record: callable, func_name: str):
+    """Parse a case file and turn its cases into records, timing both"""
+    timings = get_timings() if func_name else None
+    if timings is None:
+        return [to_record(test_case) for test_case in reader(path)]
+
+    with timings.phase(func_name, "parse"):
+        raw_cases = list(reader(path))
+    with timings.phase(func_name, "validate"):
+        return [to_record(test_case) for test_case in raw_cases]
+
+
+def load_case_file(path: str, reader: callable, func_name: str = None) -> list:
+    """
+    Get the test cases of a case file, as CaseRecords.
 
+    When a case file cache is configured, unchanged files are served from
+    it without being parsed or validated again. The time spent is added to
+    the timings of func_name, if given.
+    """
+    to_record = _record_factory()
+    cache = get_case_file_cache()
+    if cache is None:
+        return _records_of(path, reader, to_record, func_name)
+
+    stat = os.stat(path)
+    with timed(func_name, "parse"):
+        test_cases = cache.load(path, stat)
+    if test_cases is None:
+        test_cases = _records_of(path, reader, to_record, func_name)
+        cache.store(path, stat, test_cases)
     return test_cases
 
 
+def _load_any_case_file(
+    path: str, case_format: CaseFileFormat, func_name: str = None
+) -> list:
+    if case_format is PACK_FORMAT:
+        # Packs decode faster than the case file cache could load them
+        with timed(func_name, "parse"):
+            return case_format.read(path)
+    return load_case_file(path, _reader(case_format), func_name)
+
+
+def _load_fingerprint(files: list, sources: list):
+    """
+    Fingerprint what the cases of a function are loaded from: the path,
+    mtime and size of its case files and the fingerprint of every source.
+    None if any of them cannot tell whether it changed.
+    """
+    fingerprint = [get_settings().validate_cases]
+    for path, _ in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+    for source in sources:
+        source_fingerprint = source.fingerprint()
+        if source_fingerprint is None:
+            return None
+        fingerprint.append((id(source), source_fingerprint))
+    return fingerprint
+
+
 def get_all_test_cases(
     func_name: str = "", func: callable = None, search_dir: str = None
 ) -> list:
     """
     Get the test cases for a given function name or function
+
+    Case files are only loaded again when a file or case source changed
+    since the last call, or when the function's registered cases were
+    cleared. Otherwise the registered cases are returned right away. When
+    they are loaded again, the cases loaded before are replaced, while the
+    ones registered in memory are kept.
     """
     logger = logging.getLogger(__name__)
 
@@ -76,14 +476,103 @@ def get_all_test_cases(
     else:
         raise ValueError("Either func_name or func must be provided")
 
-    # Crawl the test cases from the json and yaml files
-    json_test_cases = crawl_json_test_cases(name, search_dir)
-    yaml_test_cases = crawl_yaml_test_cases(name, search_dir)
-    for test_case in chain(json_test_cases, yaml_test_cases):
-        test_case = TestCase(**test_case)
-        InputOutputRegistry.get_instance().register_testcase(name, test_case)
+    registry = InputOutputRegistry.get_instance()
+    with timed(name, "discover"):
+        files = _find_case_files(name, search_dir)
+        sources = get_case_sources()
+        fingerprint = _load_fingerprint(files, sources)
+    if fingerprint is not None and registry.is_loaded(name, fingerprint):
+        logger.info(f"Test cases for {name} are already loaded")
+        return registry.get(name)
 
-    logger.info(
-        f"Found {len(InputOutputRegistry.get_instance().get(name))} test cases for {name}"
-    )
-    return InputOutputRegistry.get_instance().get(name)
+    # Load the test cases from the json and yaml files, in place of the ones
+    # loaded before
+    registry.forget_loaded(name)
+    load = partial(_load_any_case_file, func_name=name)
+    for file_cases in _map_case_files(load, files):
+        with timed(name, "register"):
+            registry.extend(name, file_cases, loaded=True)
+    for source in sources:
+        with timed(name, "parse"):
+            source_cases = source.load_cases(name)
+        with timed(name, "register"):
+            registry.extend(name, source_cases, loaded=True)
+    if fingerprint is not None:
+        registry.mark_loaded(name, fingerprint)
+
+    logger.info(f"Found {len(registry.get(name))} test cases for {name}")
+    return registry.get(name)
+
+
+def iter_test_cases(
+    func_name: str = "", func: callable = None, search_dir: str = None
+) -> Iterator:
+    """
+    Yield the test cases for a given function name or function one at a time.
+
+    The cases registered in the InputOutputRegistry come first, followed by
+    the cases of the json, json lines, yaml and pack files, which are parsed
+    incrementally and never stored, and the cases of the case sources. File
+    cases that are already registered are skipped, but duplicates between
+    files are not detected.
+    """
+    name = ""
+    if func_name:
+        name = func_name
+    elif func:
+        name = func.__name__
+    else:
+        raise ValueError("Either func_name or func must be provided")
+
+    registry = InputOutputRegistry.get_instance()
+    registered = list(registry.get(name))
+    yield from registered
+
+    to_record = _record_factory()
+    with timed(name, "discover"):
+        files = _find_case_files(name, search_dir)
+    for path, case_format in files:
+        for test_case in case_format.stream(path):
+            test_case = to_record(test_case)
+            if not registered or not registry.contains(name, test_case):
+                yield test_case
+
+    for source in get_case_sources():
+        for test_case in source.iter_cases(name):
+            if not registered or not registry.contains(name, test_case):
+                yield test_case
+
+
+def pack_test_cases(
+    test_name: str, search_dir: str = None, output: str = None
+) -> tuple[str, int]:
+    """
+    Compile the json, json lines and yaml cases of a function into a case
+    pack, dropping duplicates. The pack is written to output, by default
+    <test_name>.dapack in search_dir. Once there is a pack, the files it was
+    compiled from are no longer read for the function's tests, but they are
+    still the ones packed again.
+
+    Returns:
+        tuple: The path of the pack and the number of cases in it
+    """
+    search_dir = search_dir or os.getcwd()
+    output = output or os.path.join(search_dir, test_name + PACK_EXTENSION)
+
+    def unique_cases():
+        seen = set()
+        for path, case_format in _find_all_case_files(test_name, search_dir):
+            if case_format is PACK_FORMAT:
+                continue
+            for test_case in case_format.stream(path):
+                record = CaseRecord.from_raw(test_case)
+                try:
+                    key = _case_key(record)
+                except TypeError:
+                    yield record
+                    continue
+                if key not in seen:
+                    seen.add(key)
+                    yield record
+
+    return output, write_pack(output, unique_cases())
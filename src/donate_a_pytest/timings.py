@@ -0,0 +1,185 @@
+"""
+Phase timings of the donated tests.
+
+When the donate_durations option is set, the crawler, the registry and the
+generated test functions add up the time each donated function spends in
+every phase:
+
+    discover  finding its case files
+    parse     reading and parsing them (or loading them from the case file
+              cache), and loading the cases of the case sources
+    validate  turning parsed cases into CaseRecords
+    register  adding them to the InputOutputRegistry
+    execute   calling the function
+    compare   comparing its output with the expected output
+
+Cases run one by one are also timed individually, and the slowest ones are
+kept for the report. Cases run over worker processes or awaited together
+only add to the execute phase of their function. Case files read by several
+threads add up the time of every thread, which can exceed the wall time.
+When cases are streamed, parsing happens while they run and is not reported.
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+from donate_a_pytest.loaders import loader_info
+from donate_a_pytest.settings import get_settings
+
+PHASES = ("discover", "parse", "validate", "register", "execute", "compare")
+
+# Slowest cases kept per function
+SLOWEST_CASES = 100
+
+
+class FunctionTimings:
+    """The time one donated function spent in each phase"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.cases = 0
+        # Min-heap of (seconds, -order, index, case) of the slowest cases
+        self._slowest = []
+        self._order = itertools.count()
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def slowest_cases(self) -> list:
+        """Get (seconds, index, case) of the slowest cases, slowest first"""
+        return [
+            (seconds, index, test_case)
+            for seconds, _, index, test_case in sorted(self._slowest, reverse=True)
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "cases": self.cases,
+            "phases": dict(self.phases),
+            "slowest_cases": [
+                {
+                    "index": index,
+                    "seconds": seconds,
+                    "description": test_case.desc,
+                    "input": repr(test_case.inp),
+                }
+                for seconds, index, test_case in self.slowest_cases()
+            ],
+        }
+
+
+class Timings:
+    """Phase timings of every donated function of a session"""
+
+    def __init__(self, slowest_cases: int = SLOWEST_CASES) -> None:
+        self.slowest_cases = slowest_cases
+        self.functions: dict = {}
+        self._lock = threading.Lock()
+
+    def _function(self, name: str) -> FunctionTimings:
+        timings = self.functions.get(name)
+        if timings is None:
+            with self._lock:
+                timings = self.functions.setdefault(name, FunctionTimings(name))
+        return timings
+
+    def add(self, name: str, phase: str, seconds: float, cases: int = 0) -> None:
+        """Add time spent by a function in a phase, for a number of cases"""
+        timings = self._function(name)
+        with self._lock:
+            timings.phases[phase] += seconds
+            timings.cases += cases
+
+    @contextmanager
+    def phase(self, name: str, phase: str):
+        """Time the body of a with statement as a phase of a function"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, phase, time.perf_counter() - start)
+
+    def add_case(
+        self, name: str, index: int, test_case, execute: float, compare: float
+    ) -> None:
+        """Add the timings of one case run by itself"""
+        timings = self._function(name)
+        with self._lock:
+            timings.phases["execute"] += execute
+            timings.phases["compare"] += compare
+            timings.cases += 1
+            # The order breaks ties, so cases themselves are never compared
+            entry = (execute + compare, -next(timings._order), index, test_case)
+            if len(timings._slowest) < self.slowest_cases:
+                heapq.heappush(timings._slowest, entry)
+            elif entry > timings._slowest[0]:
+                heapq.heapreplace(timings._slowest, entry)
+
+    def slowest_functions(self, count: Optional[int] = None) -> list:
+        """Get the FunctionTimings of the slowest functions, slowest first"""
+        functions = sorted(self.functions.values(), key=lambda f: -f.total)
+        return functions[:count] if count else functions
+
+    def slowest_cases_overall(self, count: Optional[int] = None) -> list:
+        """Get (seconds, function name, index, case) of the slowest cases"""
+        cases = sorted(
+            (
+                (seconds, timings.name, index, test_case)
+                for timings in self.functions.values()
+                for seconds, index, test_case in timings.slowest_cases()
+            ),
+            key=lambda case: -case[0],
+        )
+        return cases[:count] if count else cases
+
+    def to_dict(self) -> dict:
+        return {
+            "phases": list(PHASES),
+            "loaders": loader_info(),
+            "functions": {
+                timings.name: timings.to_dict() for timings in self.slowest_functions()
+            },
+        }
+
+    def write(self, path: str) -> None:
+        """Write the timings to a JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+_timings: Optional[Timings] = None
+
+
+def get_timings() -> Optional[Timings]:
+    """Get the timings of the session, None when they are not recorded"""
+    global _timings
+    if not get_settings().record_timings:
+        return None
+    if _timings is None:
+        _timings = Timings()
+    return _timings
+
+
+def reset_timings() -> None:
+    """Forget the recorded timings"""
+    global _timings
+    _timings = None
+
+
+def timed(name: Optional[str], phase: str):
+    """
+    Time the body of a with statement as a phase of a function, or do
+    nothing when timings are not recorded or no function is given
+    """
+    timings = get_timings() if name else None
+    if timings is None:
+        return nullcontext()
+    return timings.phase(name, phase)
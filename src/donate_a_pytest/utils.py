@@ -1,4 +1,28 @@
+import fnmatch
+import hashlib
+import json
 import os
+import re
+from typing import Any
+
+from donate_a_pytest.settings import DEFAULT_IGNORED_DIRS, get_settings
+
+CASE_FILE_EXTENSIONS = (".json", ".jsonl", ".yaml", ".yml", ".dapack")
+
+
+def stable_digest(value: Any, digest_size: int = 16) -> str:
+    """
+    Hash a JSON-like value, giving the same hex digest in every process.
+
+    Dict keys are sorted, and values that JSON cannot represent are hashed by
+    their repr.
+    """
+    try:
+        text = json.dumps(value, sort_keys=True, default=repr, separators=(",", ":"))
+    except TypeError:
+        # Dicts whose keys cannot be sorted against each other
+        text = repr(value)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=digest_size).hexdigest()
 
 
 def find_paths_with_substring(
@@ -43,3 +67,224 @@ def find_paths_with_substring(
         #         matching_paths.append(full_path)
 
     return matching_paths
+
+
+class FileIndex:
+    """
+    Index of the case files below a directory.
+
+    The tree is walked once with os.scandir and every file with one of the
+    indexed extensions is bucketed by its basename, so lookups never touch
+    the file system again. Results are returned in the same order as
+    find_paths_with_substring would return them.
+
+    The index can be saved with snapshot() and rebuilt from a snapshot in a
+    later session; only directories whose mtime changed since are read again.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        extensions: tuple = CASE_FILE_EXTENSIONS,
+        ignore_dirs: frozenset = DEFAULT_IGNORED_DIRS,
+        snapshot: dict = None,
+    ) -> None:
+        self.directory = str(directory)
+        self.extensions = tuple(extensions)
+        self.ignore_dirs = frozenset(ignore_dirs)
+        self._paths: list[str] = []
+        # The paths relative to directory, with / separators, for glob()
+        self._relative_paths: list[str] = []
+        self._by_name: dict[str, list[int]] = {}
+        self._lookups: dict[tuple, list[str]] = {}
+        # Directory path -> [mtime_ns, case file names, subdirectory names]
+        self._dirs: dict[str, list] = {}
+        self.rescanned = 0
+
+        previous = {}
+        if snapshot and self._matches(snapshot):
+            previous = snapshot["dirs"]
+        self._walk(self.directory, previous, "")
+
+    def _matches(self, snapshot: dict) -> bool:
+        """Check if a snapshot was taken with the same settings"""
+        return (
+            snapshot.get("directory") == self.directory
+            and tuple(snapshot.get("extensions", ())) == self.extensions
+            and frozenset(snapshot.get("ignore_dirs", ())) == self.ignore_dirs
+        )
+
+    def _scan(self, directory: str) -> tuple[list, list]:
+        """List the case files and the subdirectories to walk of a directory"""
+        files, subdirs = [], []
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    # Like os.walk, symlinked directories are listed but not followed
+                    if entry.name not in self.ignore_dirs and not entry.is_symlink():
+                        subdirs.append(entry.name)
+                elif entry.name.endswith(self.extensions):
+                    files.append(entry.name)
+        return files, subdirs
+
+    def _walk(self, directory: str, previous: dict, relative: str) -> None:
+        """Index a directory and its subdirectories in os.walk (top-down) order"""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+            record = previous.get(directory)
+            if record is not None and record[0] == mtime_ns:
+                files, subdirs = record[1], record[2]
+            else:
+                files, subdirs = self._scan(directory)
+                self.rescanned += 1
+        except OSError:
+            return
+
+        self._dirs[directory] = [mtime_ns, files, subdirs]
+        for name in files:
+            self._by_name.setdefault(name, []).append(len(self._paths))
+            self._paths.append(os.path.join(directory, name))
+            self._relative_paths.append(relative + name)
+
+        for name in subdirs:
+            self._walk(os.path.join(directory, name), previous, f"{relative}{name}/")
+
+    def snapshot(self) -> dict:
+        """Get the directory listing of the index in a JSON serializable form"""
+        return {
+            "directory": self.directory,
+            "extensions": list(self.extensions),
+            "ignore_dirs": sorted(self.ignore_dirs),
+            "dirs": self._dirs,
+        }
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def paths_named(self, file_name: str) -> list:
+        """Get every indexed path whose basename is exactly file_name"""
+        return [self._paths[i] for i in self._by_name.get(file_name, [])]
+
+    def find(
+        self,
+        substring: str,
+        file_extension: str | tuple = None,
+        exclude_substring: str = None,
+    ) -> list:
+        """
+        Get the indexed paths whose basename contains substring.
+
+        Mirrors find_paths_with_substring, but answers from memory and
+        memoizes each lookup. file_extension may also be a tuple of
+        extensions.
+        """
+
+        def matches(name: str) -> bool:
+            return (
+                substring in name
+                and (file_extension is None or name.endswith(file_extension))
+                and (exclude_substring is None or exclude_substring not in name)
+            )
+
+        return self.select(
+            ("find", substring, file_extension, exclude_substring), matches
+        )
+
+    def select(self, key: tuple, predicate: callable) -> list:
+        """
+        Get the indexed paths whose basename satisfies predicate, in walk
+        order. Results are memoized under key, which must identify the
+        predicate.
+        """
+        if key in self._lookups:
+            return list(self._lookups[key])
+
+        positions = []
+        for name, indices in self._by_name.items():
+            if predicate(name):
+                positions.extend(indices)
+
+        positions.sort()
+        result = [self._paths[i] for i in positions]
+        self._lookups[key] = result
+        return list(result)
+
+    def glob(self, patterns: tuple) -> list:
+        """
+        Get the indexed paths matching any of the fnmatch patterns, relative
+        to the indexed directory and with / separators, in walk order. As with
+        fnmatch, * also matches /.
+        """
+        key = ("glob", tuple(patterns))
+        if key in self._lookups:
+            return list(self._lookups[key])
+
+        if not patterns:
+            return []
+        match = re.compile(
+            "|".join(fnmatch.translate(pattern) for pattern in patterns)
+        ).match
+        result = [
+            path
+            for path, relative in zip(self._paths, self._relative_paths)
+            if match(relative)
+        ]
+        self._lookups[key] = result
+        return list(result)
+
+
+_file_indexes: dict[tuple, FileIndex] = {}
+_index_snapshots: dict[str, dict] = {}
+
+
+def get_file_index(directory: str, ignore_dirs: frozenset = None) -> FileIndex:
+    """
+    Get the session-wide FileIndex for a directory, building it on first use.
+    """
+    if ignore_dirs is None:
+        ignore_dirs = get_settings().ignore_dirs
+
+    key = (os.path.abspath(str(directory)), frozenset(ignore_dirs))
+    index = _file_indexes.get(key)
+    if index is None:
+        index = FileIndex(
+            directory,
+            ignore_dirs=ignore_dirs,
+            snapshot=_index_snapshots.get(str(directory)),
+        )
+        _file_indexes[key] = index
+    return index
+
+
+def clear_file_indexes() -> None:
+    """Forget every cached FileIndex, e.g. at the start of a new session."""
+    _file_indexes.clear()
+
+
+def load_file_index_snapshots(snapshots: dict) -> None:
+    """
+    Provide snapshots saved by an earlier session, keyed by directory, to
+    speed up building the indexes of those directories.
+    """
+    _index_snapshots.clear()
+    _index_snapshots.update(snapshots)
+
+
+def file_index_snapshots() -> dict:
+    """
+    Get snapshots of every index built since the snapshots were loaded, plus
+    the loaded snapshots of directories that still exist.
+    """
+    snapshots = {
+        directory: snapshot
+        for directory, snapshot in _index_snapshots.items()
+        if os.path.isdir(directory)
+    }
+    for index in _file_indexes.values():
+        snapshots[index.directory] = index.snapshot()
+    return snapshots
@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+
+
+def run_benchmarks(*args):
+    return subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS, "run.py"), *args],
+        capture_output=True,
+        text=True,
+    )
+
+
+@pytest.mark.skipif(not os.path.isdir(BENCHMARKS), reason="benchmarks not shipped")
+class TestBenchmarkSuite:
+    """Tests for the benchmark runner, at the smallest sizes"""
+
+    def test_results_and_baseline(self, tmp_path):
+        """Test writing results and catching a regression against a baseline"""
+        output = tmp_path / "results.json"
+        common = ["--sizes", "10", "--repeat", "1", "--data-dir", str(tmp_path)]
+        result = run_benchmarks(
+            "-k", "registry", "-k", "format=jsonl", "-o", str(output), *common
+        )
+        assert result.returncode == 0, result.stderr
+
+        results = json.loads(output.read_text())["results"]
+        assert "registry.extend[size=10]" in results
+        assert "get_all_test_cases[format=jsonl,size=10]" in results
+        assert all(key.startswith(("registry", "get_all")) for key in results)
+        assert results["registry.extend[size=10]"]["items"] == 10
+
+        # A baseline ten times faster than anything possible
+        baseline = tmp_path / "baseline.json"
+        for entry in results.values():
+            entry["best"] /= 10
+        baseline.write_text(json.dumps({"results": results}))
+        result = run_benchmarks(
+            "-k",
+            "registry.extend[",
+            "--baseline",
+            str(baseline),
+            "--min-time",
+            "0",
+            *common,
+        )
+        assert result.returncode == 1
+        assert "REGRESSION registry.extend[size=10]" in result.stdout
+
+    def test_list(self):
+        """Test listing the benchmarks of a preset"""
+        result = run_benchmarks("--list", "--sizes", "10")
+        assert result.returncode == 0
+        keys = result.stdout.split()
+        for name in (
+            "find_paths_with_substring",
+            "get_all_test_cases[format=yaml,size=10]",
+            "registry.register_testcase[size=10]",
+            "DonatedTestFile.collect[functions=10]",
+            "test_wrapper[size=10]",
+        ):
+            assert any(key.startswith(name) for key in keys), name
@@ -0,0 +1,140 @@
+import os
+import json
+
+import pytest
+from unittest.mock import patch
+
+from donate_a_pytest.cache import CaseFileCache, ResultCache, function_hash
+from donate_a_pytest.model import TestCase, InputOutputRegistry
+from donate_a_pytest.settings import update_settings, set_settings
+from donate_a_pytest.tests_crawler import get_all_test_cases
+
+
+@pytest.fixture
+def case_file(tmp_path):
+    """Create a JSON case file"""
+    path = tmp_path / "cases" / "cached_func.json"
+    path.parent.mkdir()
+    path.write_text(json.dumps([{"input": {"a": 1}, "output": 2}]))
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    """Enable the case file cache for the duration of a test"""
+    directory = tmp_path / "cache"
+    previous = update_settings(case_cache_dir=str(directory))
+    InputOutputRegistry._instance = None
+    yield directory
+    InputOutputRegistry._instance = None
+    set_settings(previous)
+
+
+class TestCaseFileCache:
+    """Tests for the CaseFileCache class"""
+
+    def test_store_and_load(self, tmp_path, case_file):
+        """Test that a stored entry is returned for an unchanged file"""
+        cache = CaseFileCache(str(tmp_path / "cache"))
+        cases = [TestCase(input={"a": 1}, output=2)]
+
+        assert cache.load(str(case_file), os.stat(case_file)) is None
+        cache.store(str(case_file), os.stat(case_file), cases)
+        assert cache.load(str(case_file), os.stat(case_file)) == cases
+
+    def test_changed_file_is_a_miss(self, tmp_path, case_file):
+        """Test that entries are invalidated by a change of size or mtime"""
+        cache = CaseFileCache(str(tmp_path / "cache"))
+        cache.store(str(case_file), os.stat(case_file), [])
+
+        case_file.write_text(json.dumps([]))
+        assert cache.load(str(case_file), os.stat(case_file)) is None
+
+    def test_verify_hash(self, tmp_path, case_file):
+        """Test that content changes are caught even if mtime and size match"""
+        cache = CaseFileCache(str(tmp_path / "cache"), verify_hash=True)
+        stat = os.stat(case_file)
+        cache.store(str(case_file), stat, [])
+
+        case_file.write_text(case_file.read_text().replace("1", "3"))
+        os.utime(case_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert cache.load(str(case_file), os.stat(case_file)) is None
+
+    def test_clear(self, tmp_path, case_file):
+        """Test removing every entry"""
+        cache = CaseFileCache(str(tmp_path / "cache"))
+        cache.store(str(case_file), os.stat(case_file), [])
+        cache.clear()
+        assert cache.load(str(case_file), os.stat(case_file)) is None
+
+
+def test_cached_files_are_not_parsed_again(case_file, cache_dir):
+    """Test that get_all_test_cases serves unchanged files from the cache"""
+    search_dir = str(case_file.parent)
+    assert len(get_all_test_cases("cached_func", search_dir=search_dir)) == 1
+
+    InputOutputRegistry._instance = None
+    with patch("donate_a_pytest.tests_crawler.json.load") as json_load:
+        test_cases = get_all_test_cases("cached_func", search_dir=search_dir)
+
+    json_load.assert_not_called()
+    assert test_cases[0].inp == {"a": 1}
+    assert test_cases[0].outp == 2
+
+
+def double(x):
+    return x * 2
+
+
+def triple(x):
+    return x * 3
+
+
+class TestResultCache:
+    """Tests for the ResultCache class"""
+
+    def test_keys(self, tmp_path):
+        """Test that keys change with the function, the input and the output"""
+        cache = ResultCache(str(tmp_path / "passed.json"))
+        case = TestCase(input={"x": 1}, output=2)
+
+        key = cache.case_key(double, case)
+        assert key == cache.case_key(double, TestCase(input={"x": 1}, output=2))
+        assert key != cache.case_key(triple, case)
+        assert key != cache.case_key(double, TestCase(input={"x": 2}, output=2))
+        assert key != cache.case_key(double, TestCase(input={"x": 1}, output=3))
+
+    def test_function_hash_covers_the_code(self):
+        """Test that functions with different code hash differently"""
+        assert function_hash(double) == function_hash(double)
+        assert function_hash(double) != function_hash(triple)
+
+    def test_pending(self, tmp_path):
+        """Test that cases that passed before are not yielded"""
+        cache = ResultCache(str(tmp_path / "passed.json"))
+        cases = [TestCase(input={"x": x}, output=x * 2) for x in range(3)]
+        cache.add_passed(cache.case_key(double, cases[1]))
+
+        keys = []
+        assert list(cache.pending(double, cases, keys)) == [cases[0], cases[2]]
+        assert keys == [cache.case_key(double, cases[i]) for i in (0, 2)]
+
+    def test_save_evicts_least_recently_used(self, tmp_path):
+        """Test that saving keeps the most recently used keys"""
+        path = str(tmp_path / "passed.json")
+        cache = ResultCache(path, max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.add_passed(key)
+        assert cache.has_passed("a")
+        cache.save()
+
+        cache = ResultCache(path)
+        assert len(cache) == 2
+        assert cache.has_passed("a") and cache.has_passed("c")
+        assert not cache.has_passed("b")
+
+    def test_unreadable_file(self, tmp_path):
+        """Test that a corrupt cache file is ignored"""
+        path = tmp_path / "passed.json"
+        path.write_text("{not json")
+        assert len(ResultCache(str(path))) == 0
@@ -1,3 +1,4 @@
+import io
 import os
 import json
 import yaml
@@ -9,9 +10,17 @@ import shutil
 from donate_a_pytest.tests_crawler import (
     crawl_json_test_cases,
     crawl_yaml_test_cases,
+    find_case_files,
     get_all_test_cases,
+    iter_test_cases,
+    load_case_file,
+    _iter_json_array,
+    shutdown_parse_pool,
+    JSON_FORMAT,
 )
-from donate_a_pytest.model import TestCase, InputOutputRegistry
+from donate_a_pytest.model import CaseRecord, TestCase, InputOutputRegistry
+from donate_a_pytest.settings import update_settings, set_settings
+from donate_a_pytest.utils import clear_file_indexes
 
 
 @pytest.fixture
@@ -158,3 +167,288 @@ class TestCrawlYamlTestCases:
 
         # Should still find the valid YAML files
         assert len(test_cases) == 3
+
+    def test_find_yml_files(self, test_files_dir):
+        """Test that files with the .yml extension are crawled too"""
+        yml_file = test_files_dir / "test_func" / "test_func_3.yml"
+        yml_file.write_text(yaml.dump({"input": {"b": 8}, "output": {"result": 16}}))
+
+        test_cases = crawl_yaml_test_cases("test_func", str(test_files_dir))
+        assert len(test_cases) == 4
+        assert any(tc.get("input", {}).get("b") == 8 for tc in test_cases)
+
+
+class TestStreaming:
+    """Tests for incremental parsing and iter_test_cases"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+    def test_json_array_chunks(self, chunk_size):
+        """Test that arrays are parsed the same whatever the chunk size"""
+        data = [
+            {"input": {"a": 12345, "s": "x, ]"}, "output": [1, 2.5]},
+            {"input": {}, "output": None},
+        ]
+        text = json.dumps(data, indent=2)
+        f = io.StringIO(text[1:])
+        assert list(_iter_json_array(f, chunk_size=chunk_size)) == data
+
+    @pytest.mark.parametrize("text", ["[1, 2", "[1 2]", "[1,]", "[{]"])
+    def test_json_array_errors(self, text):
+        """Test that malformed arrays raise JSONDecodeError"""
+        with pytest.raises(json.JSONDecodeError):
+            list(_iter_json_array(io.StringIO(text[1:]), chunk_size=2))
+
+    def test_jsonl_and_multi_document_yaml(self, tmp_path):
+        """Test reading json lines files and yaml files with several documents"""
+        (tmp_path / "stream_func.jsonl").write_text(
+            '{"input": {"a": 1}, "output": 1}\n\n{"input": {"a": 2}, "output": 2}\n'
+        )
+        (tmp_path / "stream_func.yaml").write_text(
+            "input: {a: 3}\noutput: 3\n---\n- input: {a: 4}\n  output: 4\n"
+        )
+
+        assert len(crawl_json_test_cases("stream_func", str(tmp_path))) == 2
+        assert len(crawl_yaml_test_cases("stream_func", str(tmp_path))) == 2
+
+    def test_iter_test_cases(self, tmp_path, reset_registry):
+        """Test that streamed cases are yielded after registered ones, unregistered"""
+        (tmp_path / "stream_func.json").write_text(
+            json.dumps(
+                [
+                    {"input": {"a": 1}, "output": 1},
+                    {"input": {"a": 2}, "output": 2},
+                ]
+            )
+        )
+        registry = InputOutputRegistry.get_instance()
+        registry.register("stream_func", None, {"a": 2}, 2)
+        registry.register("stream_func", None, {"a": 0}, 0)
+
+        test_cases = list(iter_test_cases("stream_func", search_dir=str(tmp_path)))
+
+        assert [tc.inp["a"] for tc in test_cases] == [2, 0, 1]
+        assert len(registry.get("stream_func")) == 2
+
+    def test_stream_stops_at_invalid_content(self, tmp_path, caplog):
+        """Test that streaming keeps the cases before an error and warns"""
+        path = tmp_path / "broken.json"
+        path.write_text('[{"input": {}, "output": 1}, {"input": ')
+
+        assert len(list(JSON_FORMAT.stream(str(path)))) == 1
+        assert JSON_FORMAT.read(str(path)) == []
+        assert "Invalid JSON file" in caplog.text
+
+
+class TestCaseRecords:
+    """Tests for loading case files as CaseRecords"""
+
+    def test_files_are_loaded_as_records(self, tmp_path, reset_registry):
+        """Test that file cases are stored as records"""
+        (tmp_path / "record_func.json").write_text(
+            json.dumps([{"input": {"a": 1}, "output": 1}])
+        )
+        test_cases = get_all_test_cases("record_func", search_dir=str(tmp_path))
+        assert [type(tc) for tc in test_cases] == [CaseRecord]
+
+    def test_validate_option(self, tmp_path, reset_registry):
+        """Test that donate_validate runs every case through TestCase"""
+        (tmp_path / "record_func.json").write_text(
+            json.dumps([{"input": {"a": 1}, "output": 1}])
+        )
+        previous = update_settings(validate_cases=True)
+        try:
+            with patch(
+                "donate_a_pytest.tests_crawler.TestCase", wraps=TestCase
+            ) as validate:
+                test_cases = get_all_test_cases("record_func", search_dir=str(tmp_path))
+        finally:
+            set_settings(previous)
+        validate.assert_called_once()
+        assert [type(tc) for tc in test_cases] == [CaseRecord]
+
+
+class TestConcurrentReading:
+    """Tests for reading the case files of a function concurrently"""
+
+    @pytest.fixture
+    def many_files(self, tmp_path):
+        """Create many json and yaml case files, two of them invalid"""
+        for i in range(12):
+            (tmp_path / f"many_{i:02}.json").write_text(
+                json.dumps(
+                    [{"input": {"file": i, "case": c}, "output": i} for c in range(3)]
+                )
+            )
+            (tmp_path / f"many_{i:02}.yaml").write_text(
+                f"- input: {{file: {i}, case: yaml}}\n  output: {i}\n"
+            )
+        (tmp_path / "many_bad.json").write_text("[{")
+        (tmp_path / "many_bad.yaml").write_text("- input: [unclosed\n")
+        return tmp_path
+
+    def _load(self, directory, **settings):
+        InputOutputRegistry._instance = None
+        previous = update_settings(**settings)
+        try:
+            return [
+                (tc.inp, tc.outp)
+                for tc in get_all_test_cases("many", search_dir=str(directory))
+            ]
+        finally:
+            set_settings(previous)
+            shutdown_parse_pool()
+            InputOutputRegistry._instance = None
+
+    def test_same_order_as_sequential(self, many_files, caplog):
+        """Test that threads give the cases in the same order as reading in turn"""
+        sequential = self._load(many_files, parse_workers=1)
+        caplog.clear()
+        concurrent = self._load(many_files, parse_workers=8)
+
+        assert len(sequential) == 12 * 4
+        assert concurrent == sequential
+        assert "Invalid JSON file" in caplog.text
+        assert "Invalid YAML file" in caplog.text
+
+    def test_yaml_in_processes(self, many_files, caplog):
+        """Test parsing yaml files in worker processes"""
+        expected = self._load(many_files, parse_workers=1)
+        caplog.clear()
+        assert self._load(many_files, parse_processes=2) == expected
+        assert "Invalid YAML file" in caplog.text
+        assert len(crawl_yaml_test_cases("many", str(many_files))) == 12
+
+
+class TestCaseMatching:
+    """Tests for the strategies matching case files to a function"""
+
+    @pytest.fixture
+    def matching_dir(self, tmp_path):
+        """Create case files for add and for functions whose name contains add"""
+        for name in [
+            "add.json",
+            "add.001.json",
+            "add_numbers.json",
+            "address_book.yaml",
+            "add.yml",
+            "nested/add.jsonl",
+            "nested/more/add.2.json",
+        ]:
+            path = tmp_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("[]" if not name.endswith("yml") else "[]\n")
+        return tmp_path
+
+    def _names(self, directory, **settings):
+        previous = update_settings(**settings)
+        try:
+            paths = find_case_files("add", str(directory))
+        finally:
+            set_settings(previous)
+        # Files of a directory come in os.scandir order, compare them sorted
+        return sorted(os.path.relpath(path, directory) for path in paths)
+
+    def test_substring(self, matching_dir):
+        """Test that the default strategy keeps matching substrings"""
+        assert "add_numbers.json" in self._names(matching_dir)
+        assert "address_book.yaml" in self._names(matching_dir)
+
+    def test_exact(self, matching_dir):
+        """Test matching the function name plus a case file extension"""
+        assert self._names(matching_dir, case_matching="exact") == [
+            "add.json",
+            "add.yml",
+            os.path.join("nested", "add.jsonl"),
+        ]
+
+    def test_sharded(self, matching_dir):
+        """Test matching <name>.json and <name>.<shard>.json"""
+        assert self._names(matching_dir, case_matching="sharded") == [
+            "add.001.json",
+            "add.json",
+            "add.yml",
+            os.path.join("nested", "add.jsonl"),
+            os.path.join("nested", "more", "add.2.json"),
+        ]
+
+    def test_glob(self, matching_dir):
+        """Test matching glob patterns relative to the search directory"""
+        assert self._names(
+            matching_dir, case_matching="glob", case_globs=("nested/*{name}.*",)
+        ) == [
+            os.path.join("nested", "add.jsonl"),
+            os.path.join("nested", "more", "add.2.json"),
+        ]
+
+    def test_mapping_overrides_strategy(self, matching_dir):
+        """Test that functions listed in donate_cases use their own patterns"""
+        assert self._names(matching_dir, case_files={"add": ["add_numbers.json"]}) == [
+            "add_numbers.json"
+        ]
+
+
+class TestLoadedCases:
+    """Tests for loading the case files of a function only once"""
+
+    @pytest.fixture
+    def case_dir(self, tmp_path, reset_registry):
+        (tmp_path / "loaded_func.json").write_text(
+            json.dumps([{"input": {"a": 1}, "output": 1}])
+        )
+        return tmp_path
+
+    def _get(self, directory):
+        with patch(
+            "donate_a_pytest.tests_crawler.load_case_file", wraps=load_case_file
+        ) as load:
+            test_cases = get_all_test_cases("loaded_func", search_dir=str(directory))
+        return test_cases, load.call_count
+
+    def test_unchanged_files_are_not_loaded_again(self, case_dir):
+        """Test that a second call only checks the file fingerprints"""
+        first, loads = self._get(case_dir)
+        assert loads == 1
+        second, loads = self._get(case_dir)
+        assert loads == 0
+        assert second is first
+
+    def test_changed_files_are_loaded_again(self, case_dir):
+        """Test that changing a case file or adding one loads the cases again"""
+        self._get(case_dir)
+        (case_dir / "loaded_func.json").write_text(
+            json.dumps([{"input": {"a": 22}, "output": 22}])
+        )
+        test_cases, loads = self._get(case_dir)
+        assert loads == 1
+        assert [tc.outp for tc in test_cases] == [22]
+
+        (case_dir / "loaded_func_more.json").write_text("[]")
+        clear_file_indexes()
+        assert self._get(case_dir)[1] == 2
+
+    def test_registered_cases_are_kept(self, case_dir):
+        """Test that reloading changed files keeps the cases registered in memory"""
+        registry = InputOutputRegistry.get_instance()
+        registry.register("loaded_func", None, {"a": 2}, 2)
+        self._get(case_dir)
+        (case_dir / "loaded_func.json").write_text(
+            json.dumps(
+                [{"input": {"a": 1}, "output": 3}, {"input": {"a": 2}, "output": 2}]
+            )
+        )
+        test_cases, _ = self._get(case_dir)
+        assert [tc.outp for tc in test_cases] == [2, 3]
+        assert registry.contains("loaded_func", CaseRecord({"a": 1}, 3))
+        assert not registry.contains("loaded_func", CaseRecord({"a": 1}, 1))
+
+        (case_dir / "loaded_func.json").write_text("[]")
+        test_cases, _ = self._get(case_dir)
+        assert [tc.outp for tc in test_cases] == [2]
+
+    def test_cleared_registry_loads_again(self, case_dir):
+        """Test that clearing the function's cases loads its files again"""
+        self._get(case_dir)
+        InputOutputRegistry.get_instance().clear_by_func_name("loaded_func")
+        test_cases, loads = self._get(case_dir)
+        assert loads == 1
+        assert len(test_cases) == 1
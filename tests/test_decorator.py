@@ -35,3 +35,73 @@ def test_test_function_created():
     test_func = getattr(current_module, "test_another_func")
     assert hasattr(test_func, "pytestmark")
     assert any(marker.name == "donate" for marker in test_func.pytestmark)
+
+
+class TestWrapperLoop:
+    """Tests for the loop running the cases of a donated function"""
+
+    @pytest.fixture(autouse=True)
+    def registry(self):
+        from donate_a_pytest.model import InputOutputRegistry
+
+        InputOutputRegistry._instance = None
+        yield
+        InputOutputRegistry._instance = None
+
+    def make_test(self, func_name, cases):
+        from donate_a_pytest.interface import register_test_cases
+
+        def double(x):
+            return 2 * x
+
+        double.__name__ = double.__qualname__ = func_name
+        register_test_cases(func_name, cases)
+        register_for_donation(double)
+        return getattr(sys.modules[__name__], f"test_{func_name}")
+
+    def test_failure_message_only_built_on_failure(self, monkeypatch):
+        """Test that passing cases never format a failure message"""
+        from donate_a_pytest import decorators
+
+        calls = []
+
+        def fake_format_failure(*args):
+            calls.append(args)
+            return "failed"
+
+        monkeypatch.setattr(decorators, "format_failure", fake_format_failure)
+        cases = [{"input": {"x": i}, "output": 2 * i} for i in range(20)]
+        test_func = self.make_test("wrapper_loop_double", cases)
+        test_func()
+        assert calls == []
+
+        cases.append({"input": {"x": 1}, "output": 3})
+        test_func = self.make_test("wrapper_loop_broken", cases)
+        with pytest.raises(AssertionError, match="failed"):
+            test_func()
+        assert calls == [({"x": 1}, 3, 2)]
+
+    def test_progress_is_opt_in(self, monkeypatch):
+        """Test that the progress bar is only used when enabled"""
+        from donate_a_pytest import decorators
+        from donate_a_pytest.settings import update_settings, set_settings
+
+        bars = []
+
+        def fake_tqdm(iterable, **kwargs):
+            bars.append(kwargs)
+            return iterable
+
+        monkeypatch.setattr(decorators, "tqdm", fake_tqdm)
+        test_func = self.make_test(
+            "wrapper_loop_progress", [{"input": {"x": 1}, "output": 2}]
+        )
+        test_func()
+        assert bars == []
+
+        previous = update_settings(progress=True)
+        try:
+            test_func()
+        finally:
+            set_settings(previous)
+        assert bars == [{"mininterval": decorators.PROGRESS_INTERVAL}]
@@ -0,0 +1,305 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+from donate_a_pytest.executor import (
+    check_budget,
+    format_failure,
+    run_cases_async,
+    run_cases_in_processes,
+)
+from donate_a_pytest.main import run_donated_tests
+from donate_a_pytest.model import Budget, CaseRecord, InputOutputRegistry, TestCase
+
+
+def square(x):
+    return x * x
+
+
+def broken_square(x):
+    if x == 3:
+        raise ValueError("three")
+    return x * x if x % 2 else x
+
+
+def test_format_failure():
+    """Test the failure message shared by every way of running cases"""
+    assert format_failure({"x": 2}, 4, 5) == (
+        "\nFailed test case:\nInput: {'x': 2}\nExpected output: 4\nActual output: 5"
+    )
+
+
+def test_all_cases_pass():
+    """Test running passing cases over worker processes"""
+    cases = (TestCase(input={"x": i}, output=i * i) for i in range(50))
+    assert run_cases_in_processes(square, cases, workers=2, chunk_size=7) == []
+
+
+def test_every_failure_is_reported_in_order():
+    """Test that every failing case is collected, not just the first"""
+    cases = [TestCase(input={"x": i}, output=i * i) for i in range(6)]
+    failures = run_cases_in_processes(broken_square, cases, workers=2, chunk_size=1)
+
+    assert failures == [
+        format_failure({"x": 2}, 4, 2),
+        format_failure({"x": 3}, 9, "raised ValueError('three')"),
+        format_failure({"x": 4}, 16, 4),
+    ]
+
+
+def test_nested_function_is_not_run():
+    """Test that functions workers cannot import are left to the caller"""
+
+    def nested(x):
+        return x
+
+    cases = [TestCase(input={"x": 1}, output=1)]
+    assert run_cases_in_processes(nested, cases, workers=2) is None
+
+
+def test_run_donated_tests_with_workers(tmp_path):
+    """Test a donated test run end to end with worker processes"""
+    (tmp_path / "test_parallel_sample.py").write_text("""
+from donate_a_pytest.decorators import register_for_donation
+
+@register_for_donation
+def parallel_double(x):
+    return 2 * x
+""")
+    (tmp_path / "parallel_double.json").write_text(
+        "["
+        + ",".join(f'{{"input": {{"x": {i}}}, "output": {2 * i}}}' for i in range(20))
+        + "]"
+    )
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        result = run_donated_tests(directory=str(tmp_path), workers=2)
+    finally:
+        os.chdir(cwd)
+
+    assert result["success"] is True
+
+
+async def async_square(x):
+    await asyncio.sleep(0.01 * (x % 3))
+    if x == 5:
+        await asyncio.sleep(1)
+    return x * x
+
+
+def test_async_cases_run_concurrently():
+    """Test that coroutine cases are awaited concurrently, within the limit"""
+    running = 0
+    peak = 0
+
+    async def tracked(x):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return x
+
+    cases = [TestCase(input={"x": i}, output=i) for i in range(20)]
+    assert run_cases_async(tracked, cases, concurrency=4) == []
+    assert peak == 4
+
+
+def test_async_failures_and_timeouts():
+    """Test that wrong outputs and timeouts are reported in case order"""
+    cases = [TestCase(input={"x": i}, output=i * i) for i in range(6)]
+    cases[1] = TestCase(input={"x": 1}, output=2)
+    failures = run_cases_async(async_square, cases, concurrency=10, timeout=0.2)
+
+    assert failures == [
+        format_failure({"x": 1}, 2, 1),
+        format_failure({"x": 5}, 25, "timed out after 0.2s"),
+    ]
+
+
+def test_donated_coroutine_function(tmp_path):
+    """Test that the generated test awaits coroutine functions"""
+    (tmp_path / "test_async_sample.py").write_text("""
+import asyncio
+from donate_a_pytest.decorators import register_for_donation
+
+@register_for_donation
+async def async_triple(x):
+    await asyncio.sleep(0)
+    return 3 * x
+""")
+    (tmp_path / "async_triple.json").write_text(
+        '[{"input": {"x": 1}, "output": 3}, {"input": {"x": 2}, "output": 6}]'
+    )
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        result = run_donated_tests(directory=str(tmp_path))
+    finally:
+        os.chdir(cwd)
+
+    assert result["success"] is True
+
+
+def test_run_donated_tests_detailed(tmp_path, capsys):
+    """Test the outcomes and phase timings of a detailed run"""
+    (tmp_path / "test_detailed_sample.py").write_text("""
+from donate_a_pytest.decorators import register_for_donation
+
+@register_for_donation
+def detailed_double(x):
+    return 2 * x
+""")
+    (tmp_path / "detailed_double.json").write_text(
+        '[{"input": {"x": 1}, "output": 2}, {"input": {"x": 2}, "output": 4}]'
+    )
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        result = run_donated_tests(directory=str(tmp_path), output_format="detailed")
+    finally:
+        os.chdir(cwd)
+
+    assert result["success"] is True
+    assert result["outcomes"] == {"passed": 1}
+    assert result["tests"][0]["nodeid"].endswith("::test_detailed_double")
+    timings = result["timings"]["functions"]["detailed_double"]
+    assert timings["cases"] == 2
+    assert set(timings["phases"]) == set(result["timings"]["phases"])
+    assert set(result["timings"]["loaders"]) == {"json", "yaml"}
+    # pytest's own output is kept out of stdout, which holds the JSON results
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "1 passed" in captured.err
+
+
+def test_edited_case_file_between_runs(tmp_path):
+    """Test that a case file edited between two runs replaces its old cases"""
+    (tmp_path / "test_edited_sample.py").write_text("""
+from donate_a_pytest.decorators import register_for_donation
+
+@register_for_donation
+def edited_add(a, b):
+    return a + b
+""")
+    case_file = tmp_path / "edited_add.json"
+    case_file.write_text('[{"input": {"a": 1, "b": 2}, "output": 4}]')
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        assert run_donated_tests(directory=str(tmp_path))["success"] is False
+        case_file.write_text('[{"input": {"a": 1, "b": 2}, "output": 3}]')
+        assert run_donated_tests(directory=str(tmp_path))["success"] is True
+    finally:
+        os.chdir(cwd)
+        InputOutputRegistry._instance = None
+        sys.modules.pop("test_edited_sample", None)
+
+
+def sleepy_square(x):
+    time.sleep(x / 1000)
+    return x * x
+
+
+def make_rows(n):
+    return [[0] * 100 for _ in range(n)]
+
+
+class TestBudgets:
+    """Tests for the time and memory budgets of test cases"""
+
+    def test_within_budget(self):
+        """Test that cases within their budget pass"""
+        test_case = TestCase(input={"x": 1}, output=1, max_ms=1000, max_peak_kb=1024)
+        assert check_budget(sleepy_square, test_case) is None
+        assert check_budget(sleepy_square, TestCase(input={"x": 1}, output=1)) is None
+
+    def test_over_time_budget(self):
+        """Test that the median of repeat runs is compared with max_ms"""
+        calls = []
+
+        def counted(x):
+            calls.append(x)
+            return sleepy_square(x)
+
+        test_case = TestCase(input={"x": 5}, output=25, max_ms=1, repeat=3)
+        message = check_budget(counted, test_case)
+        assert len(calls) == 3
+        assert "Test case over budget:\nInput: {'x': 5}" in message
+        assert "Time: median" in message
+        assert "over 3 runs" in message
+        assert "budget 1.0 ms" in message
+
+    def test_over_memory_budget(self):
+        """Test that the peak memory of a call is compared with max_peak_kb"""
+        test_case = TestCase(input={"n": 1000}, output=None, max_peak_kb=10)
+        message = check_budget(make_rows, test_case)
+        assert "Peak memory:" in message
+        assert "budget 10.0 KiB" in message
+        assert "Time" not in message
+        assert not tracemalloc.is_tracing()
+
+    def test_async_cases(self):
+        """Test that budgets of coroutine cases are checked after the others"""
+
+        async def sleepy(x):
+            await asyncio.sleep(x / 1000)
+            return x
+
+        cases = [
+            TestCase(input={"x": 1}, output=1, max_ms=1000),
+            TestCase(input={"x": 20}, output=20, max_ms=5),
+            TestCase(input={"x": 3}, output=4, max_ms=5),
+        ]
+        failures = run_cases_async(sleepy, cases)
+        assert len(failures) == 2
+        assert "over budget" in failures[0] and "{'x': 20}" in failures[0]
+        assert "Failed test case" in failures[1]
+
+    def test_cases_in_processes(self):
+        """Test that worker processes enforce budgets too"""
+        cases = [
+            TestCase(input={"x": 1}, output=1, max_ms=1000),
+            CaseRecord({"x": 30}, 900, budget=Budget(5, None, 1)),
+        ]
+        failures = run_cases_in_processes(sleepy_square, cases, workers=2)
+        assert len(failures) == 1
+        assert "over budget" in failures[0] and "{'x': 30}" in failures[0]
+
+
+def test_donated_case_over_budget(tmp_path):
+    """Test that a donated test fails when a case goes over its budget"""
+    (tmp_path / "test_budget_sample.py").write_text("""
+from donate_a_pytest.decorators import register_for_donation
+
+@register_for_donation
+def budget_rows(n):
+    return len([[0] * 100 for _ in range(n)])
+""")
+    case_file = tmp_path / "budget_rows.json"
+    case_file.write_text(
+        '[{"input": {"n": 10}, "output": 10, "max_ms": 1000, "repeat": 3},'
+        ' {"input": {"n": 10}, "output": 10, "max_peak_kb": 1000}]'
+    )
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        assert run_donated_tests(directory=str(tmp_path))["success"] is True
+        case_file.write_text(
+            '[{"input": {"n": 1000}, "output": 1000, "max_peak_kb": 10}]'
+        )
+        assert run_donated_tests(directory=str(tmp_path))["success"] is False
+    finally:
+        os.chdir(cwd)
+        InputOutputRegistry._instance = None
+        sys.modules.pop("test_budget_sample", None)
@@ -3,9 +3,11 @@ Tests for the interface functions that provide programmatic registration of test
 """
 
 import pytest
+from pydantic import ValidationError
 from donate_a_pytest.interface import (
     register_test_case,
     register,
+    register_test_cases,
     get_test_cases,
     get_all_test_cases,
     clear_function_test_cases,
@@ -166,3 +168,46 @@ def test_clear_all_test_cases(reset_registry):
     )
     clear_all_test_cases()
     assert len(get_all_test_cases()) == 0
+
+
+def test_register_test_cases_in_batch(reset_registry):
+    """Test registering TestCases and dicts with a single validation call."""
+    register_test_cases(
+        "add_function",
+        [
+            TestCase(input={"a": 1, "b": 2}, output=3),
+            {"input": {"a": 5, "b": 7}, "output": 12, "description": "5+7"},
+            {"input": {"a": 1, "b": 2}, "output": 3},
+        ],
+    )
+
+    cases = get_test_cases("add_function")
+    assert len(cases) == 2
+    assert all(isinstance(case, TestCase) for case in cases)
+    assert cases[1].desc == "5+7"
+
+
+def test_register_test_cases_reports_every_invalid_case(reset_registry):
+    """Test that batch validation rejects the whole batch."""
+    with pytest.raises(ValidationError) as excinfo:
+        register_test_cases(
+            "add_function",
+            [{"input": 1, "output": 2}, {"input": {}, "output": 1}, {"output": 3}],
+        )
+    assert excinfo.value.error_count() == 2
+    assert get_test_cases("add_function") == []
+
+
+def test_register_test_cases_without_validation(reset_registry):
+    """Test that validate="none" keeps well-formed cases as they are."""
+    test_case = TestCase(input={"a": 1}, output=1)
+    register_test_cases(
+        "func", [test_case, {"input": {"a": 2}, "output": 2}], validate="none"
+    )
+
+    cases = get_test_cases("func")
+    assert cases[0] is test_case
+    assert cases[1].inp == {"a": 2}
+
+    with pytest.raises(ValueError):
+        register_test_cases("func", [], validate="sometimes")
@@ -0,0 +1,80 @@
+import json
+import math
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from donate_a_pytest import loaders
+from donate_a_pytest.loaders import loader_info, loads_json
+from donate_a_pytest.tests_crawler import JSON_FORMAT
+
+
+@pytest.fixture(params=["fast", "json"])
+def json_loader(request):
+    """Run a test with the fast JSON loader, if any, and with the json module"""
+    if request.param == "json":
+        with patch.object(loaders, "_fast_loads", None):
+            yield request.param
+    else:
+        yield request.param
+
+
+def test_loads_json(json_loader):
+    """Test parsing str and bytes documents"""
+    assert loads_json('{"input": {"a": 1}, "output": [1.5, null]}') == {
+        "input": {"a": 1},
+        "output": [1.5, None],
+    }
+    assert loads_json(b'[{"a": "\\u00e9"}]') == [{"a": "é"}]
+
+
+def test_loads_json_falls_back_to_json(json_loader):
+    """Test documents only the json module accepts"""
+    assert math.isnan(loads_json('{"x": NaN}')["x"])
+    assert loads_json(str(2**70)) == 2**70
+
+
+def test_integers_beyond_64_bits(json_loader):
+    """Test that big integers are read exactly, not as nearby floats"""
+    for value in (2**64 + 1, -(2**63) - 1, 10**30 + 1):
+        assert type(loads_json(str(value))) is int
+        assert loads_json(str(value)) == value
+        assert loads_json(f'{{"output": [{value}]}}'.encode()) == {"output": [value]}
+    assert loads_json(str(2**63 - 1)) == 2**63 - 1
+    assert loads_json('{"x": 1.5e300}') == {"x": 1.5e300}
+
+
+def test_invalid_json_raises_json_errors(json_loader):
+    """Test that invalid documents raise json.JSONDecodeError"""
+    with pytest.raises(json.JSONDecodeError):
+        loads_json('{"input": ')
+
+
+def test_read_json_file(tmp_path, json_loader):
+    """Test reading whole JSON files, arrays or single cases"""
+    (tmp_path / "array.json").write_text('[{"input": {}, "output": 1}]')
+    (tmp_path / "single.json").write_text('{"input": {}, "output": 2}')
+
+    assert JSON_FORMAT.read(str(tmp_path / "array.json")) == [
+        {"input": {}, "output": 1}
+    ]
+    assert JSON_FORMAT.read(str(tmp_path / "single.json")) == [
+        {"input": {}, "output": 2}
+    ]
+
+
+def test_loader_info():
+    """Test that the loaders in use are reported"""
+    info = loader_info()
+    assert info["json"] == loaders.JSON_LOADER
+    expected = "CSafeLoader" if yaml.__with_libyaml__ else "SafeLoader"
+    assert info["yaml"] == expected
+
+
+def test_big_integers_read_and_streamed_alike(tmp_path, json_loader):
+    """Test that whole-file and streamed reads give the same big integers"""
+    path = tmp_path / "big.json"
+    path.write_text(f'[{{"input": {{"n": 64}}, "output": {2**64 + 1}}}]')
+    assert JSON_FORMAT.read(str(path)) == list(JSON_FORMAT.stream(str(path)))
+    assert JSON_FORMAT.read(str(path))[0]["output"] == 2**64 + 1
@@ -1,7 +1,13 @@
+import os
+import pickle
+import signal
+import threading
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock
 import logging
-from donate_a_pytest.model import TestCase, InputOutputRegistry
+from pydantic import ValidationError
+from donate_a_pytest.model import Budget, CaseRecord, TestCase, InputOutputRegistry
 
 
 class TestTestCase:
@@ -22,6 +28,91 @@ class TestTestCase:
         assert test_case.inp == {"a": 1}  # input -> inp
         assert test_case.outp == {"result": 2}  # output -> outp
 
+    def test_budget(self):
+        """Test the optional time and memory budget of a case"""
+        assert TestCase(input={}, output=1).budget is None
+        assert TestCase(input={}, output=1, repeat=5).budget is None
+        test_case = TestCase(input={}, output=1, max_ms=2.5, repeat=5)
+        assert test_case.budget == Budget(max_ms=2.5, max_peak_kb=None, repeat=5)
+        assert TestCase(input={}, output=1, max_peak_kb=64).budget == (None, 64, 1)
+
+    @pytest.mark.parametrize(
+        "budget", [{"max_ms": 0}, {"max_peak_kb": -1}, {"max_ms": 1, "repeat": 0}]
+    )
+    def test_invalid_budget(self, budget):
+        """Test that budgets must be positive"""
+        with pytest.raises(ValidationError):
+            TestCase(input={}, output=1, **budget)
+
+
+class TestCaseRecord:
+    """Tests for the CaseRecord class"""
+
+    def test_from_raw(self):
+        """Test that well-formed raw cases become records without a dict"""
+        record = CaseRecord.from_raw(
+            {"input": {"a": 1}, "output": [2], "description": "Test description"}
+        )
+        assert record.inp == {"a": 1}
+        assert record.outp == [2]
+        assert record.desc == "Test description"
+        assert not hasattr(record, "__dict__")
+
+    def test_equals_test_case(self):
+        """Test that records and TestCases with the same content compare equal"""
+        record = CaseRecord({"a": 1}, 2)
+        assert record == TestCase(input={"a": 1}, output=2)
+        assert TestCase(input={"a": 1}, output=2) == record
+        assert record != CaseRecord({"a": 1}, 2, "other")
+
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            {"input": 1, "output": 2},
+            {"input": {"a": 1}},
+            {"input": {"a": 1}, "output": 2, "description": ["not", "a", "str"]},
+        ],
+    )
+    def test_malformed_cases_are_validated(self, raw):
+        """Test that malformed raw cases still fail TestCase validation"""
+        with pytest.raises(ValidationError):
+            CaseRecord.from_raw(raw)
+
+    def test_budget(self):
+        """Test that raw cases with a budget are validated and keep it"""
+        record = CaseRecord.from_raw(
+            {"input": {"a": 1}, "output": 2, "max_ms": 5, "repeat": 3}
+        )
+        assert record.budget == Budget(5, None, 3)
+        assert CaseRecord.from_raw({"input": {"a": 1}, "output": 2}).budget is None
+        with pytest.raises(ValidationError):
+            CaseRecord.from_raw({"input": {"a": 1}, "output": 2, "max_ms": -5})
+
+        # The budget is part of the case
+        assert record != CaseRecord({"a": 1}, 2)
+        assert record == TestCase(input={"a": 1}, output=2, max_ms=5, repeat=3)
+        assert record.validate().budget == record.budget
+        assert pickle.loads(pickle.dumps(record)) == record
+        assert "budget=" in repr(record)
+
+    def test_validate(self):
+        """Test validating a record on demand"""
+        test_case = CaseRecord({"a": 1}, 2, "desc").validate()
+        assert isinstance(test_case, TestCase)
+        assert test_case.desc == "desc"
+        with pytest.raises(ValidationError):
+            CaseRecord("not a dict", 2).validate()
+
+    def test_registry_dedups_records(self):
+        """Test that records and TestCases are duplicates of each other"""
+        InputOutputRegistry._instance = None
+        registry = InputOutputRegistry.get_instance()
+        registry.register("func", None, {"a": 1}, 2)
+        registry.register_testcase("func", CaseRecord({"a": 1}, 2))
+        registry.register_testcase("func", CaseRecord({"a": 2}, 4))
+        assert len(registry.get("func")) == 2
+        InputOutputRegistry._instance = None
+
 
 class TestInputOutputRegistry:
     """Tests for the InputOutputRegistry class"""
@@ -187,6 +278,124 @@ class TestInputOutputRegistry:
             self.registry._check_duplicate("non_existent_func", duplicate_case) is False
         )
 
+    def test_check_duplicate_matches_equality(self):
+        """Test that fingerprint lookups agree with comparing cases with =="""
+        self.registry.register(
+            func_name="test_func",
+            inp={"a": [1, {"b": 2}], "c": {"d": 3}},
+            outp={"x": [1, 2]},
+        )
+
+        same = TestCase(
+            input={"c": {"d": 3.0}, "a": [True, {"b": 2}]}, output={"x": [1, 2]}
+        )
+        other_type = TestCase(
+            input={"a": [1, {"b": 2}], "c": {"d": 3}}, output={"x": (1, 2)}
+        )
+        other_desc = TestCase(
+            input={"a": [1, {"b": 2}], "c": {"d": 3}},
+            output={"x": [1, 2]},
+            description="d",
+        )
+
+        assert self.registry._check_duplicate("test_func", same) is True
+        assert self.registry._check_duplicate("test_func", other_type) is False
+        assert self.registry._check_duplicate("test_func", other_desc) is False
+
+    def test_check_duplicate_unhashable_values(self):
+        """Test that cases holding unhashable values are still deduplicated"""
+
+        class Unhashable:
+            __hash__ = None
+
+            def __init__(self, value):
+                self.value = value
+
+            def __eq__(self, other):
+                return isinstance(other, Unhashable) and other.value == self.value
+
+        self.registry.register(func_name="test_func", inp={"a": 1}, outp=Unhashable(1))
+        self.registry.register(func_name="test_func", inp={"a": 1}, outp=Unhashable(1))
+        self.registry.register(func_name="test_func", inp={"a": 1}, outp=Unhashable(2))
+
+        assert len(self.registry.get(func_name="test_func")) == 2
+
+    def test_extend(self, caplog):
+        """Test registering a batch, dropping duplicates within and across batches"""
+        caplog.set_level(logging.INFO)
+        self.registry.register("func", None, {"a": 1}, 1)
+        added = self.registry.extend(
+            "func",
+            [
+                TestCase(input={"a": 1}, output=1),
+                TestCase(input={"a": 2}, output=2),
+                TestCase(input={"a": 2}, output=2),
+                TestCase(input={"a": 3}, output=3),
+            ],
+        )
+
+        assert added == 2
+        assert [tc.inp["a"] for tc in self.registry.get("func")] == [1, 2, 3]
+        assert "2 test cases already registered: func" in caplog.text
+
+    def test_extend_unhashable_values(self):
+        """Test that extend also drops duplicates holding unhashable values"""
+        self.registry.register("func", None, {"a": 1}, 1)
+        unhashable = TestCase(input={"a": [1]}, output=bytearray(b"x"))
+        added = self.registry.extend(
+            "func",
+            [unhashable, TestCase(input={"a": [1]}, output=bytearray(b"x"))],
+        )
+
+        assert added == 1
+        assert self.registry.contains("func", unhashable)
+        assert self.registry.extend("func", [unhashable]) == 0
+
+    def test_digest_collisions(self, monkeypatch):
+        """Test that cases sharing a digest are compared before being dropped"""
+        from donate_a_pytest import model
+
+        monkeypatch.setattr(model, "_case_digest", lambda test_case: 0)
+        self.registry.register("func", None, {"a": 1}, 1)
+        self.registry.register("func", None, {"a": 2}, 2)
+        added = self.registry.extend(
+            "func",
+            [
+                CaseRecord({"a": 2}, 2),
+                CaseRecord({"a": 3}, 3),
+                CaseRecord({"a": 3}, 3),
+                CaseRecord({"a": 4}, 4),
+            ],
+        )
+
+        assert added == 2
+        assert [tc.inp["a"] for tc in self.registry.get("func")] == [1, 2, 3, 4]
+        assert self.registry.contains("func", CaseRecord({"a": 4}, 4))
+        assert not self.registry.contains("func", CaseRecord({"a": 5}, 5))
+
+    def test_failed_extend_registers_nothing(self):
+        """Test that a batch failing halfway leaves the registry unchanged"""
+
+        def cases():
+            yield CaseRecord({"a": 1}, 1)
+            raise ValueError("broken batch")
+
+        with pytest.raises(ValueError):
+            self.registry.extend("func", cases())
+        assert self.registry.get("func") == []
+        assert self.registry.extend("func", [CaseRecord({"a": 1}, 1)]) == 1
+
+    def test_clear_forgets_duplicates(self):
+        """Test that cleared test cases can be registered again"""
+        self.registry.register(func_name="test_func", inp={"a": 1}, outp={"result": 2})
+        self.registry.clear_by_func_name("test_func")
+        self.registry.register(func_name="test_func", inp={"a": 1}, outp={"result": 2})
+        assert len(self.registry.get(func_name="test_func")) == 1
+
+        self.registry.clear()
+        self.registry.register(func_name="test_func", inp={"a": 1}, outp={"result": 2})
+        assert len(self.registry.get(func_name="test_func")) == 1
+
     def test_clear_by_func_name(self):
         """Test the clear_by_func_name method"""
         self.registry.register(func_name="test_func", inp={"a": 1}, outp={"result": 2})
@@ -202,3 +411,80 @@ class TestInputOutputRegistry:
         )
         self.registry.clear()
         assert len(self.registry.get_all()) == 0
+
+
+class TestRegistryConcurrency:
+    """Tests for using the registry from several threads and processes"""
+
+    def setup_method(self):
+        InputOutputRegistry._instance = None
+
+    def teardown_method(self):
+        InputOutputRegistry._instance = None
+
+    def test_single_instance_across_threads(self):
+        """Test that threads racing to create the registry share one instance"""
+        barrier = threading.Barrier(8)
+
+        def get_instance(_):
+            barrier.wait()
+            return InputOutputRegistry.get_instance()
+
+        with ThreadPoolExecutor(8) as pool:
+            instances = list(pool.map(get_instance, range(8)))
+        assert all(instance is instances[0] for instance in instances)
+
+    def test_concurrent_registration(self):
+        """Test that no case is lost or duplicated when threads register at once"""
+        registry = InputOutputRegistry.get_instance()
+
+        def register(worker):
+            for i in range(200):
+                # Every worker registers the same cases for two shared functions
+                registry.register(f"func{i % 2}", None, {"i": i}, i)
+                registry.register_testcase(
+                    f"worker{worker}", TestCase(input={"i": i}, output=i)
+                )
+            registry.extend("batch", [CaseRecord({"i": i}, i) for i in range(200)])
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(register, range(8)))
+
+        assert len(registry.get("func0")) == 100
+        assert len(registry.get("func1")) == 100
+        assert len(registry.get("batch")) == 200
+        for worker in range(8):
+            assert len(registry.get(f"worker{worker}")) == 200
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+    def test_fork_while_a_lock_is_held(self):
+        """Test that a forked child can register while another thread held a lock"""
+        registry = InputOutputRegistry.get_instance()
+        registry.register("func", None, {"a": 1}, 1)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with registry._lock_for("func"):
+                locked.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    # Kill the child instead of hanging if the lock was inherited
+                    signal.alarm(5)
+                    registry.register("func", None, {"a": 2}, 2)
+                    os._exit(0 if len(registry.get("func")) == 2 else 1)
+                finally:
+                    os._exit(2)
+        finally:
+            release.set()
+            thread.join()
+        _, status = os.waitpid(pid, 0)
+
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert len(registry.get("func")) == 1
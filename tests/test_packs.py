@@ -0,0 +1,181 @@
+import json
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from donate_a_pytest.main import main
+from donate_a_pytest.model import Budget, CaseRecord, TestCase, InputOutputRegistry
+from donate_a_pytest.packs import CasePack, PackError, write_pack
+from donate_a_pytest.settings import set_settings, update_settings
+from donate_a_pytest.tests_crawler import (
+    find_case_files,
+    get_all_test_cases,
+    iter_test_cases,
+    pack_test_cases,
+)
+from donate_a_pytest.utils import clear_file_indexes
+
+
+@pytest.fixture
+def reset_registry():
+    """Reset the InputOutputRegistry before and after a test"""
+    InputOutputRegistry._instance = None
+    yield
+    InputOutputRegistry._instance = None
+
+
+@pytest.fixture
+def case_files(tmp_path):
+    """Create JSON and YAML case files for one function, with a duplicate"""
+    (tmp_path / "packed_func.json").write_text(
+        json.dumps(
+            [
+                {"input": {"a": 1}, "output": 1, "description": "one"},
+                {"input": {"a": 2}, "output": [2, 2]},
+            ]
+        )
+    )
+    (tmp_path / "packed_func.yaml").write_text(
+        "- input: {a: 1}\n  output: 1\n  description: one\n"
+        "- input: {a: 3}\n  output: {three: 3}\n"
+    )
+    return tmp_path
+
+
+class TestCasePack:
+    """Tests for writing and reading case packs"""
+
+    def test_round_trip(self, tmp_path):
+        """Test that every case is read back, by index and in order"""
+        cases = [
+            TestCase(input={"a": 1}, output=1, description="one"),
+            CaseRecord({"a": 2}, {"b": [2]}),
+        ]
+        path = tmp_path / "func.dapack"
+        assert write_pack(str(path), cases) == 2
+
+        with CasePack(str(path)) as pack:
+            assert len(pack) == 2
+            assert pack[1] == CaseRecord({"a": 2}, {"b": [2]})
+            assert pack[-1] == pack[1]
+            assert list(pack) == cases
+            with pytest.raises(IndexError):
+                pack[2]
+
+    def test_budgets(self, tmp_path):
+        """Test that the budgets of cases are packed"""
+        cases = [
+            TestCase(input={"a": 1}, output=1, max_ms=5, repeat=3),
+            CaseRecord({"a": 2}, 2, budget=Budget(None, 64.0, 1)),
+            CaseRecord({"a": 3}, 3),
+        ]
+        path = tmp_path / "func.dapack"
+        write_pack(str(path), cases)
+
+        with CasePack(str(path)) as pack:
+            assert [case.budget for case in pack] == [
+                Budget(5, None, 3),
+                Budget(None, 64.0, 1),
+                None,
+            ]
+            assert list(pack) == cases
+
+    def test_empty_pack(self, tmp_path):
+        """Test packing no cases at all"""
+        path = tmp_path / "func.dapack"
+        write_pack(str(path), [])
+        with CasePack(str(path)) as pack:
+            assert list(pack) == []
+
+    def test_cases_are_decoded_when_reached(self, tmp_path):
+        """Test that opening a pack decodes nothing"""
+        path = tmp_path / "func.dapack"
+        write_pack(str(path), [CaseRecord({"a": i}, i) for i in range(100)])
+
+        with patch("donate_a_pytest.packs.pickle.loads") as loads:
+            loads.return_value = ({}, None, None)
+            with CasePack(str(path)) as pack:
+                assert loads.call_count == 0
+                next(iter(pack))
+                assert loads.call_count == 1
+
+    @pytest.mark.parametrize("content", [b"", b"not a pack at all, really not"])
+    def test_invalid_pack(self, tmp_path, content):
+        """Test that files that are not packs are rejected"""
+        path = tmp_path / "func.dapack"
+        path.write_bytes(content)
+        with pytest.raises(PackError):
+            CasePack(str(path))
+
+
+def test_pack_test_cases(case_files, reset_registry):
+    """Test compiling case files into a pack, without duplicates"""
+    path, count = pack_test_cases("packed_func", str(case_files))
+
+    assert path == str(case_files / "packed_func.dapack")
+    assert count == 3
+    with CasePack(path) as pack:
+        assert [case.outp for case in pack] == [1, [2, 2], {"three": 3}]
+
+
+def test_pack_replaces_its_sources(case_files, reset_registry):
+    """Test that a pack next to its case files does not load their cases twice"""
+    path, count = pack_test_cases("packed_func", str(case_files))
+    clear_file_indexes()  # As in the next session
+    assert find_case_files("packed_func", str(case_files)) == [path]
+
+    test_cases = get_all_test_cases("packed_func", search_dir=str(case_files))
+    assert [case.outp for case in test_cases] == [1, [2, 2], {"three": 3}]
+    InputOutputRegistry._instance = None
+    streamed = iter_test_cases("packed_func", search_dir=str(case_files))
+    assert [case.outp for case in streamed] == [1, [2, 2], {"three": 3}]
+
+    # Packing again reads the source files, not the previous pack
+    assert pack_test_cases("packed_func", str(case_files)) == (path, 3)
+
+
+def test_crawler_reads_packs(tmp_path, reset_registry, caplog):
+    """Test that packs are found like other case files, and bad ones skipped"""
+    write_pack(
+        str(tmp_path / "packed_func.dapack"),
+        [CaseRecord({"a": 1}, 1), CaseRecord({"a": 2}, 2)],
+    )
+    (tmp_path / "packed_func_broken.dapack").write_bytes(b"broken")
+
+    test_cases = get_all_test_cases("packed_func", search_dir=str(tmp_path))
+    assert [case.outp for case in test_cases] == [1, 2]
+    assert "Invalid case pack file" in caplog.text
+
+    InputOutputRegistry._instance = None
+    streamed = iter_test_cases("packed_func", search_dir=str(tmp_path))
+    assert [case.outp for case in streamed] == [1, 2]
+
+
+def test_stream_validated_packs(tmp_path, reset_registry):
+    """Test streaming pack cases with the donate_validate option set"""
+    write_pack(
+        str(tmp_path / "packed_func.dapack"),
+        [CaseRecord({"a": 1}, 1), CaseRecord({"a": 2}, 2, budget=Budget(max_ms=5))],
+    )
+    previous = update_settings(validate_cases=True)
+    try:
+        streamed = list(iter_test_cases("packed_func", search_dir=str(tmp_path)))
+    finally:
+        set_settings(previous)
+    assert [case.outp for case in streamed] == [1, 2]
+    assert streamed[1].budget == Budget(max_ms=5)
+
+
+def test_pack_command(case_files, tmp_path, capsys):
+    """Test the donate-pytest pack command"""
+    output_dir = tmp_path / "packs"
+    argv = ["donate-pytest", "pack", "packed_func", "-d", str(case_files)]
+    with patch.object(sys, "argv", argv + ["-o", str(output_dir)]):
+        with pytest.raises(SystemExit) as excinfo:
+            main()
+
+    assert excinfo.value.code == 0
+    assert "3 test cases" in capsys.readouterr().out
+    with CasePack(str(output_dir / "packed_func.dapack")) as pack:
+        assert len(pack) == 3
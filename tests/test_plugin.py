@@ -0,0 +1,420 @@
+"""
+Tests for the pytest plugin, running pytest in-process on small projects.
+"""
+
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from donate_a_pytest.model import InputOutputRegistry
+from donate_a_pytest.sources import SQLiteCaseSource
+from donate_a_pytest.utils import FileIndex
+
+
+class ResultCollector:
+    """Plugin recording the collected items and the test reports of a run"""
+
+    def __init__(self):
+        self.nodeids = []
+        self.reports = {}
+
+    def pytest_collection_finish(self, session):
+        self.nodeids = [item.nodeid for item in session.items]
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call":
+            self.reports[report.nodeid] = report
+
+
+@pytest.fixture
+def donated_project(tmp_path, monkeypatch):
+    """Create a project with a donating module and a case file"""
+    (tmp_path / "arithmetic.py").write_text("""
+from donate_a_pytest import register_for_donation
+
+@register_for_donation
+def halve(x):
+    return x // 2
+""")
+    (tmp_path / "halve.json").write_text(
+        json.dumps(
+            [
+                {"input": {"x": 4}, "output": 2, "description": "even number"},
+                {"input": {"x": 5}, "output": 3, "description": "odd number"},
+                {"input": {"x": 0}, "output": 0},
+            ]
+        )
+    )
+    monkeypatch.chdir(tmp_path)
+    modules = set(sys.modules)
+    InputOutputRegistry._instance = None
+    yield tmp_path
+    InputOutputRegistry._instance = None
+
+    # Forget the project's modules, the next project reuses their names
+    for name in set(sys.modules) - modules:
+        if (getattr(sys.modules[name], "__file__", None) or "").startswith(
+            str(tmp_path)
+        ):
+            del sys.modules[name]
+
+
+def run_pytest(directory, *args):
+    """Run pytest on a directory and return the exit code and the collector"""
+    collector = ResultCollector()
+    if "-o" not in args:
+        args = ("-p", "no:cacheprovider", *args)
+    exit_code = pytest.main([str(directory), "-q", *args], plugins=[collector])
+    return exit_code, collector
+
+
+def test_one_item_per_function(donated_project):
+    """Test that without splitting every function is a single item"""
+    exit_code, collector = run_pytest(donated_project)
+
+    assert exit_code == pytest.ExitCode.TESTS_FAILED
+    assert collector.nodeids == ["arithmetic.py::test_halve"]
+
+
+def test_split_cases(donated_project):
+    """Test that --donate-split collects every case as its own item"""
+    exit_code, collector = run_pytest(donated_project, "--donate-split")
+
+    assert exit_code == pytest.ExitCode.TESTS_FAILED
+    assert collector.nodeids[:2] == [
+        "arithmetic.py::test_halve[even_number]",
+        "arithmetic.py::test_halve[odd_number]",
+    ]
+    assert len(collector.nodeids) == 3
+
+    outcomes = {nodeid: r.outcome for nodeid, r in collector.reports.items()}
+    assert outcomes["arithmetic.py::test_halve[odd_number]"] == "failed"
+    assert list(outcomes.values()).count("passed") == 2
+
+
+def test_split_failure_message_only_built_on_failure(donated_project):
+    """Test that passing split cases never format a failure message"""
+    from donate_a_pytest import plugin
+
+    with patch.object(
+        plugin, "format_failure", wraps=plugin.format_failure
+    ) as format_failure:
+        run_pytest(donated_project, "--donate-split")
+    format_failure.assert_called_once_with({"x": 5}, 3, 2)
+
+
+def test_split_cases_keep_the_marker(donated_project):
+    """Test that split items are still selected by -m donate"""
+    _, collector = run_pytest(donated_project, "--donate-split", "-m", "donate")
+    assert len(collector.nodeids) == 3
+
+
+def test_split_cases_in_test_modules(donated_project):
+    """Test splitting generated tests that live in regular test modules"""
+    (donated_project / "arithmetic.py").rename(donated_project / "test_arithmetic.py")
+    _, collector = run_pytest(donated_project, "--donate-split")
+    assert len(collector.nodeids) == 3
+    assert collector.nodeids[0] == "test_arithmetic.py::test_halve[even_number]"
+
+
+def test_unrelated_modules_are_not_imported(donated_project):
+    """Test that modules that do not mention donate-a-pytest are not imported"""
+    (donated_project / "heavy.py").write_text("open('imported.txt', 'w').close()\n")
+
+    _, collector = run_pytest(donated_project)
+    assert collector.nodeids == ["arithmetic.py::test_halve"]
+    assert not (donated_project / "imported.txt").exists()
+
+    run_pytest(donated_project, "--donate-import-all")
+    assert (donated_project / "imported.txt").exists()
+
+
+def test_manifest_is_reused(donated_project, tmp_path_factory):
+    """Test that a warm session reads neither sources nor directories again"""
+    cache_dir = tmp_path_factory.mktemp("cache")
+    args = ["-p", "cacheprovider", "-o", f"cache_dir={cache_dir}"]
+    pytest.main([str(donated_project), "-q", *args])
+
+    manifest = json.loads((cache_dir / "v" / "donate" / "manifest").read_text())
+    module = manifest["modules"][str(donated_project / "arithmetic.py")]
+    assert module[2:] == [True, ["halve"]]
+    assert list(manifest["cases"]["halve"]) == [str(donated_project / "halve.json")]
+
+    with (
+        patch("donate_a_pytest.scanner.scan_source") as scan_source,
+        patch.object(FileIndex, "_scan") as scan_directory,
+    ):
+        _, collector = run_pytest(donated_project, *args[2:])
+
+    scan_source.assert_not_called()
+    scan_directory.assert_not_called()
+    assert collector.nodeids == ["arithmetic.py::test_halve"]
+
+
+@pytest.fixture
+def two_function_project(donated_project):
+    """Add a second donating module, with its own case file"""
+    (donated_project / "strings.py").write_text("""
+from donate_a_pytest import register_for_donation
+
+@register_for_donation
+def shout(text):
+    return text.upper()
+""")
+    (donated_project / "shout.yaml").write_text("- input: {text: hi}\n  output: HI\n")
+    return donated_project
+
+
+def test_changed_since_git_revision(two_function_project):
+    """Test that --donate-changed only keeps functions changed since a commit"""
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(["git", "init", "-q"], cwd=two_function_project, check=True)
+    subprocess.run(git + ["add", "."], cwd=two_function_project, check=True)
+    subprocess.run(
+        git + ["commit", "-q", "-m", "cases"], cwd=two_function_project, check=True
+    )
+
+    _, collector = run_pytest(two_function_project, "--donate-changed")
+    assert collector.nodeids == []
+
+    with open(two_function_project / "shout.yaml", "a") as f:
+        f.write("- input: {text: yo}\n  output: YO\n")
+    _, collector = run_pytest(two_function_project, "--donate-changed")
+    assert collector.nodeids == ["strings.py::test_shout"]
+
+    (two_function_project / "halve_more.json").write_text("[]")
+    _, collector = run_pytest(two_function_project, "--donate-changed=HEAD")
+    assert sorted(collector.nodeids) == [
+        "arithmetic.py::test_halve",
+        "strings.py::test_shout",
+    ]
+
+
+def test_changed_since_last_session(two_function_project, tmp_path_factory):
+    """Test that --donate-changed=mtime compares with the previous session"""
+    # Failing functions are always selected, see test_failed_functions_stay_selected
+    (two_function_project / "halve.json").write_text(
+        json.dumps([{"input": {"x": 4}, "output": 2}])
+    )
+    cache_dir = tmp_path_factory.mktemp("cache")
+    args = ["-p", "cacheprovider", "-o", f"cache_dir={cache_dir}"]
+
+    _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    assert len(collector.nodeids) == 2
+
+    _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    assert collector.nodeids == []
+
+    (two_function_project / "strings.py").write_text(
+        (two_function_project / "strings.py").read_text() + "\n# changed\n"
+    )
+    _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    assert collector.nodeids == ["strings.py::test_shout"]
+
+
+@pytest.mark.parametrize("split", [False, True])
+def test_failed_functions_stay_selected(two_function_project, tmp_path_factory, split):
+    """Test that functions stay selected by --donate-changed until they pass"""
+    cache_dir = tmp_path_factory.mktemp("cache")
+    args = ["-p", "cacheprovider", "-o", f"cache_dir={cache_dir}"]
+    if split:
+        args.append("--donate-split")
+
+    run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    for _ in range(2):
+        _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+        assert {nodeid.split("[")[0] for nodeid in collector.nodeids} == {
+            "arithmetic.py::test_halve"
+        }
+
+    (two_function_project / "halve.json").write_text(
+        json.dumps([{"input": {"x": 4}, "output": 2}])
+    )
+    _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    assert [nodeid.split("[")[0] for nodeid in collector.nodeids] == [
+        "arithmetic.py::test_halve"
+    ]
+    _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    assert collector.nodeids == []
+
+
+def test_changed_helper_module(two_function_project, tmp_path_factory):
+    """Test that changing a module a function depends on marks it affected"""
+    (two_function_project / "helpers.py").write_text("""
+def combine(x):
+    return x // 2
+""")
+    (two_function_project / "arithmetic.py").write_text("""
+from donate_a_pytest import register_for_donation
+from helpers import combine
+
+@register_for_donation
+def halve(x):
+    return combine(x)
+""")
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(["git", "init", "-q"], cwd=two_function_project, check=True)
+    subprocess.run(git + ["add", "."], cwd=two_function_project, check=True)
+    subprocess.run(
+        git + ["commit", "-q", "-m", "cases"], cwd=two_function_project, check=True
+    )
+    cache_dir = tmp_path_factory.mktemp("cache")
+    args = ["-p", "cacheprovider", "-o", f"cache_dir={cache_dir}"]
+    run_pytest(two_function_project, *args, "--donate-changed=mtime")
+
+    with open(two_function_project / "helpers.py", "a") as f:
+        f.write("\n# changed\n")
+    _, collector = run_pytest(two_function_project, "--donate-changed")
+    assert collector.nodeids == ["arithmetic.py::test_halve"]
+
+    _, collector = run_pytest(two_function_project, *args, "--donate-changed=mtime")
+    assert collector.nodeids == ["arithmetic.py::test_halve"]
+
+
+def test_result_cache_skips_passed_cases(donated_project, tmp_path_factory):
+    """Test that --donate-result-cache only runs cases that did not pass before"""
+    (donated_project / "arithmetic.py").write_text("""
+from donate_a_pytest import register_for_donation
+
+calls = []
+
+@register_for_donation
+def halve(x):
+    calls.append(x)
+    return x // 2
+""")
+    cache_dir = tmp_path_factory.mktemp("cache")
+    args = ["-p", "cacheprovider", "-o", f"cache_dir={cache_dir}", "--donate-split"]
+
+    run_pytest(donated_project, *args, "--donate-result-cache")
+    calls = sys.modules["arithmetic"].calls
+    assert sorted(calls) == [0, 4, 5]
+
+    calls.clear()
+    _, collector = run_pytest(donated_project, *args, "--donate-result-cache")
+    assert calls == [5]
+    assert len(collector.reports) == 3
+
+    calls.clear()
+    run_pytest(
+        donated_project, *args, "--donate-result-cache", "--donate-no-result-cache"
+    )
+    assert sorted(calls) == [0, 4, 5]
+
+    # Changing the module invalidates every case of its functions
+    calls.clear()
+    with open(donated_project / "arithmetic.py", "a") as f:
+        f.write("\n# changed\n")
+    run_pytest(donated_project, *args, "--donate-result-cache")
+    assert sorted(calls) == [0, 4, 5]
+
+
+def test_case_sources_ini(donated_project):
+    """Test reading the cases of a donated function from a SQLite database"""
+    source = SQLiteCaseSource(str(donated_project / "cases.db"))
+    source.add_cases("halve", [{"input": {"x": 7}, "output": 3, "description": "db"}])
+    source.close()
+    (donated_project / "halve.json").write_text("[]")
+
+    _, collector = run_pytest(
+        donated_project,
+        "-p",
+        "no:cacheprovider",
+        "-o",
+        "donate_case_sources=sqlite:cases.db",
+        "--donate-split",
+    )
+    assert collector.nodeids == ["arithmetic.py::test_halve[db]"]
+    assert collector.reports["arithmetic.py::test_halve[db]"].passed
+
+
+def test_case_matching_options(donated_project):
+    """Test choosing the case files of a function from the ini file"""
+    (donated_project / "halve_more.json").write_text(
+        json.dumps([{"input": {"x": 8}, "output": 4, "description": "more"}])
+    )
+
+    _, collector = run_pytest(donated_project, "--donate-split")
+    assert len(collector.nodeids) == 4
+
+    # The registry keeps the cases of earlier runs in the same process
+    InputOutputRegistry._instance = None
+    _, collector = run_pytest(donated_project, "--donate-split", "--donate-match=exact")
+    assert len(collector.nodeids) == 3
+
+    InputOutputRegistry._instance = None
+    _, collector = run_pytest(
+        donated_project,
+        "-p",
+        "no:cacheprovider",
+        "-o",
+        "donate_cases=halve = *_more.json",
+        "--donate-split",
+    )
+    assert collector.nodeids == ["arithmetic.py::test_halve[more]"]
+
+
+def test_invalid_case_matching_options(donated_project):
+    """Test that invalid matching settings are usage errors"""
+    exit_code, _ = run_pytest(
+        donated_project, "-p", "no:cacheprovider", "-o", "donate_match=fuzzy"
+    )
+    assert exit_code == pytest.ExitCode.USAGE_ERROR
+
+    exit_code, _ = run_pytest(
+        donated_project, "-p", "no:cacheprovider", "-o", "donate_cases=halve"
+    )
+    assert exit_code == pytest.ExitCode.USAGE_ERROR
+
+
+def test_durations(donated_project, capsys):
+    """Test the slowest functions and cases summary and the JSON timings"""
+    report = donated_project / "timings.json"
+    run_pytest(
+        donated_project, "--donate-durations=2", f"--donate-durations-json={report}"
+    )
+
+    out = capsys.readouterr().out
+    assert "slowest donated functions" in out
+    # The second case fails, the third never runs
+    assert "halve (2 cases): discover" in out
+    assert "slowest donated test cases" in out
+    assert "halve[" in out
+
+    timings = json.loads(report.read_text())
+    assert timings["phases"] == [
+        "discover",
+        "parse",
+        "validate",
+        "register",
+        "execute",
+        "compare",
+    ]
+    halve = timings["functions"]["halve"]
+    # The second case fails, the third never runs
+    assert halve["cases"] == 2
+    assert halve["phases"]["parse"] > 0
+    assert halve["phases"]["execute"] > 0
+    assert [
+        case["index"]
+        for case in sorted(halve["slowest_cases"], key=lambda c: c["index"])
+    ] == [0, 1]
+
+
+def test_durations_split_cases(donated_project, capsys):
+    """Test that split test cases are timed one by one"""
+    run_pytest(donated_project, "--donate-split", "--donate-durations=0")
+
+    out = capsys.readouterr().out
+    assert "halve (3 cases)" in out
+    for description in ("even number", "odd number", "{'x': 0}"):
+        assert description in out
+
+
+def test_no_durations_by_default(donated_project, capsys):
+    """Test that nothing is timed without the options"""
+    run_pytest(donated_project)
+    assert "slowest donated" not in capsys.readouterr().out
@@ -0,0 +1,210 @@
+import fnmatch
+import inspect
+import os
+import pstats
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from donate_a_pytest import profiling
+from donate_a_pytest.model import CaseRecord
+from donate_a_pytest.profiling import (
+    CaseRun,
+    find_outliers,
+    format_profile,
+    profile_cases,
+    write_profile,
+)
+
+
+def make_rows(n):
+    if n < 0:
+        raise ValueError("negative")
+    return [[0] * 10 for _ in range(n)]
+
+
+CASES = [CaseRecord({"n": n}, None) for n in (1, 5, 10, -1)]
+
+
+class TestProfileCases:
+    """Tests for profiling a function against its test cases"""
+
+    def test_cpu(self, tmp_path):
+        """Test that every call ends up in one cProfile profile"""
+        result = profile_cases(make_rows, CASES, "cpu")
+
+        assert [run.index for run in result.runs] == [0, 1, 2, 3]
+        assert result.errors == 1
+        assert isinstance(result.runs[3].error, ValueError)
+        assert all(run.ns > 0 and run.peak is None for run in result.runs)
+
+        path = write_profile(result, str(tmp_path))
+        assert path == str(tmp_path / "make_rows.pstats")
+        calls = {func[2]: stat[1] for func, stat in pstats.Stats(path).stats.items()}
+        assert calls["make_rows"] == 4
+        assert "make_rows" in format_profile(result, top=5)
+        # Only the calls themselves are profiled, not the harness around them
+        files = {func[0] for func in pstats.Stats(path).stats}
+        assert not files & {profiling.__file__, inspect.__file__}
+
+    def test_mem(self, tmp_path):
+        """Test peak memory and the allocation sites of the outputs"""
+        result = profile_cases(make_rows, CASES, "mem")
+
+        peaks = [run.peak for run in result.runs]
+        assert peaks[2] > peaks[1] > peaks[0] > 0
+        sites = [site for site, _, _ in result.allocations]
+        assert any(site.startswith(__file__) for site in sites)
+
+        path = write_profile(result, str(tmp_path))
+        assert path == str(tmp_path / "make_rows.allocations.txt")
+        with open(path) as f:
+            assert f.readline() == "bytes\tblocks\tsite\n"
+        assert "top allocation sites" in format_profile(result)
+
+    def test_mem_leaves_out_the_harness(self):
+        """Test that compiling the trace filters is not reported as allocations"""
+        fnmatch._compile_pattern.cache_clear()
+        result = profile_cases(lambda x: None, [CaseRecord({"x": 1}, None)], "mem")
+        assert result.allocations == []
+
+    def test_coroutine_function(self):
+        """Test that coroutine functions are awaited"""
+
+        async def double(x):
+            return 2 * x
+
+        result = profile_cases(double, [CaseRecord({"x": 1}, 2)], "cpu")
+        assert result.errors == 0
+        assert "double" in {func[2] for func in result.stats.stats}
+        result = profile_cases(double, [CaseRecord({"x": 1}, 2)], "mem")
+        assert result.errors == 0
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            profile_cases(make_rows, CASES, "disk")
+
+
+class TestFindOutliers:
+    """Tests for flagging the cases far slower than the others"""
+
+    def runs(self, durations):
+        return [
+            CaseRun(index, CaseRecord({"i": index}, None), ns)
+            for index, ns in enumerate(durations)
+        ]
+
+    def test_slow_case_is_flagged(self):
+        runs = self.runs([1000, 1100, 900, 1050, 950, 500_000, 1000, 80_000])
+        assert [run.index for run in find_outliers(runs)] == [5, 7]
+
+    def test_jitter_is_not_flagged(self):
+        """Test that fast cases barely spreading are not outliers"""
+        runs = self.runs([1000] * 20 + [5000])
+        assert find_outliers(runs) == []
+        assert [run.index for run in find_outliers(runs, min_ratio=2)] == [20]
+
+    def test_wide_distribution(self):
+        """Test that runtimes growing with the input are not outliers"""
+        runs = self.runs([10**exponent for exponent in range(3, 9)])
+        assert find_outliers(runs) == []
+
+    def test_few_runs(self):
+        assert find_outliers(self.runs([1, 10**9])) == []
+
+
+@pytest.fixture
+def profiled_project(tmp_path, monkeypatch):
+    """A project with two donated functions, only one with test cases"""
+    from donate_a_pytest.model import InputOutputRegistry
+
+    (tmp_path / "profiled_sample.py").write_text(
+        "from donate_a_pytest import register_for_donation\n"
+        "\n"
+        "@register_for_donation\n"
+        "def profiled_square(x):\n"
+        "    return x * x\n"
+        "\n"
+        "@register_for_donation\n"
+        "def profiled_cube(x):\n"
+        "    return x ** 3\n"
+    )
+    (tmp_path / "profiled_square.json").write_text(
+        '[{"input": {"x": 2}, "output": 4}, {"input": {"x": 3}, "output": 9}]'
+    )
+    monkeypatch.chdir(tmp_path)
+    InputOutputRegistry._instance = None
+    yield tmp_path
+    InputOutputRegistry._instance = None
+    sys.modules.pop("profiled_sample", None)
+
+
+def test_profile_donated_functions(profiled_project, capsys):
+    """Test profiling the donated functions matching a keyword"""
+    from donate_a_pytest.main import profile_donated_functions
+
+    profiles = profile_donated_functions(
+        str(profiled_project),
+        keyword="square",
+        output_dir=str(profiled_project / "profiles"),
+        outlier_threshold=5.0,
+    )
+
+    assert len(profiles) == 1
+    result, path, outliers = profiles[0]
+    assert result.func_name == "profiled_square"
+    assert len(result.runs) == 2
+    assert os.path.exists(path)
+    assert outliers == []
+    assert "profiled_square: 2 cases, 0 raised" in format_profile(result)
+    assert capsys.readouterr().out == ""
+
+
+def test_profile_command(profiled_project, capsys):
+    """Test that donate-pytest --profile prints the summary of each profile"""
+    from donate_a_pytest.main import main
+
+    argv = ["donate-pytest", "--profile", "-k", "square", "-d", str(profiled_project)]
+    with patch.object(sys, "argv", argv + ["--profile-dir", str(profiled_project)]):
+        with pytest.raises(SystemExit) as excinfo:
+            main()
+
+    assert excinfo.value.code == 0
+    out = capsys.readouterr().out
+    assert "profiled_square: 2 cases, 0 raised" in out
+    assert f"Profile written to {profiled_project / 'profiled_square.pstats'}" in out
+
+
+@pytest.mark.parametrize("split", ["false", "true"])
+def test_profile_uses_pytest_configuration(tmp_path, monkeypatch, split):
+    """Test that profiled cases are found with the project's pytest settings"""
+    from donate_a_pytest.main import profile_donated_functions
+    from donate_a_pytest.model import InputOutputRegistry
+
+    (tmp_path / "pytest.ini").write_text(
+        f"[pytest]\ndonate_match = exact\ndonate_split = {split}\n"
+    )
+    (tmp_path / "configured_sample.py").write_text(
+        "from donate_a_pytest import register_for_donation\n"
+        "\n"
+        "@register_for_donation\n"
+        "def add(a, b):\n"
+        "    return a + b\n"
+    )
+    (tmp_path / "add.json").write_text('[{"input": {"a": 1, "b": 2}, "output": 3}]')
+    (tmp_path / "add_numbers.json").write_text('[{"input": {"x": 1}, "output": 1}]')
+    monkeypatch.chdir(tmp_path)
+    InputOutputRegistry._instance = None
+    try:
+        profiles = profile_donated_functions(
+            str(tmp_path), output_dir=str(tmp_path / "profiles")
+        )
+    finally:
+        InputOutputRegistry._instance = None
+        sys.modules.pop("configured_sample", None)
+
+    assert len(profiles) == 1
+    result, _, _ = profiles[0]
+    assert len(result.runs) == 1
+    assert result.errors == 0
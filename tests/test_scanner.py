@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from donate_a_pytest.scanner import ModuleScanner, scan_source, uses_donation
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "from donate_a_pytest import register_for_donation\n",
+        "import donate_a_pytest as d\n\n@d.register_for_donation\ndef f(): pass\n",
+        "from donate_a_pytest.plugin import donate\n",
+        "@register_for_donation\ndef f(): pass\n",
+    ],
+)
+def test_uses_donation(source):
+    """Test sources that donate tests"""
+    assert uses_donation(source.encode()) is True
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "import os\n",
+        "# register_for_donation is not used here\n",
+        "text = 'register_for_donation'\n",
+        "def donation_total(): pass\n",
+        "@register_for_donation\ndef broken(:\n",
+    ],
+)
+def test_does_not_use_donation(source):
+    """Test sources that only mention donations in passing, or do not parse"""
+    assert uses_donation(source.encode()) is False
+
+
+def test_decorated_functions():
+    """Test finding the names of the decorated functions"""
+    source = b"""
+import donate_a_pytest as d
+from donate_a_pytest import register_for_donation
+
+@register_for_donation
+def first(a): pass
+
+@d.register_for_donation
+async def second(a): pass
+
+def helper(a): pass
+"""
+    assert scan_source(source) == (True, ["first", "second"])
+
+
+class TestModuleScanner:
+    """Tests for the ModuleScanner class"""
+
+    def test_results_are_cached_by_mtime_and_size(self, tmp_path):
+        """Test that files are only read again after they change"""
+        path = tmp_path / "module.py"
+        path.write_text("import os\n")
+        scanner = ModuleScanner()
+
+        assert scanner.is_donating(path) is False
+        assert scanner.changed is True
+
+        scanner = ModuleScanner(scanner.to_dict())
+        assert scanner.is_donating(path) is False
+        assert scanner.changed is False
+
+        path.write_text("from donate_a_pytest import register_for_donation\n")
+        assert scanner.is_donating(path) is True
+        assert scanner.changed is True
+
+    def test_stale_entry_is_trusted_only_while_unchanged(self, tmp_path):
+        """Test that a cached result is used as long as mtime and size match"""
+        path = tmp_path / "module.py"
+        path.write_text("import os\n")
+        stat = os.stat(path)
+        scanner = ModuleScanner(
+            {str(path): [stat.st_mtime_ns, stat.st_size, True, ["f"]]}
+        )
+
+        assert scanner.is_donating(path) is True
+        assert scanner.functions(path) == ["f"]
+
+    def test_missing_file(self, tmp_path):
+        """Test that files that cannot be read do not donate tests"""
+        assert ModuleScanner().is_donating(tmp_path / "missing.py") is False
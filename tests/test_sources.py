@@ -0,0 +1,189 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+import yaml
+
+from donate_a_pytest.model import Budget, CaseRecord, TestCase, InputOutputRegistry
+from donate_a_pytest.settings import update_settings, set_settings
+from donate_a_pytest.sources import (
+    SQLiteCaseSource,
+    clear_case_sources,
+    get_case_sources,
+    open_case_source,
+    register_case_source,
+)
+from donate_a_pytest.tests_crawler import get_all_test_cases, iter_test_cases
+
+
+@pytest.fixture
+def source(tmp_path):
+    """Create an empty SQLite case source"""
+    source = SQLiteCaseSource(str(tmp_path / "cases.db"), page_size=2)
+    yield source
+    source.close()
+
+
+@pytest.fixture
+def reset_sources():
+    """Reset the registry and the registered sources around a test"""
+    InputOutputRegistry._instance = None
+    yield
+    clear_case_sources()
+    InputOutputRegistry._instance = None
+
+
+class TestSQLiteCaseSource:
+    """Tests for the SQLiteCaseSource class"""
+
+    def test_add_and_load(self, source):
+        """Test storing cases in any form and loading them back in order"""
+        added = source.add_cases(
+            "func",
+            [
+                TestCase(input={"a": 1}, output=1, description="one"),
+                CaseRecord({"a": 2}, [2]),
+                {"input": {"a": 3}, "output": {"three": 3}},
+            ],
+        )
+        source.add_cases("other", [{"input": {}, "output": None}])
+
+        assert added == 3
+        assert source.load_cases("func") == [
+            CaseRecord({"a": 1}, 1, "one"),
+            CaseRecord({"a": 2}, [2]),
+            CaseRecord({"a": 3}, {"three": 3}),
+        ]
+        assert source.count("func") == 3
+        assert source.functions() == ["func", "other"]
+
+    def test_budgets(self, source, tmp_path):
+        """Test storing, loading and exporting the budgets of cases"""
+        source.add_cases(
+            "func",
+            [
+                {"input": {"a": 1}, "output": 1, "max_ms": 2.5, "repeat": 4},
+                {"input": {"a": 2}, "output": 2},
+            ],
+        )
+        expected = [
+            CaseRecord({"a": 1}, 1, budget=Budget(2.5, None, 4)),
+            CaseRecord({"a": 2}, 2),
+        ]
+        assert source.load_cases("func") == expected
+        assert list(source.iter_cases("func")) == expected
+
+        (json_path,) = source.export_files(str(tmp_path / "json"))
+        assert json.loads(open(json_path).read()) == [
+            {"input": {"a": 1}, "output": 1, "max_ms": 2.5, "repeat": 4},
+            {"input": {"a": 2}, "output": 2},
+        ]
+
+    def test_database_without_budgets(self, tmp_path):
+        """Test opening a database created before budgets existed"""
+        path = tmp_path / "old.db"
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute(
+                "CREATE TABLE cases (id INTEGER PRIMARY KEY, func_name TEXT NOT NULL, "
+                "input TEXT NOT NULL, output TEXT NOT NULL, description TEXT)"
+            )
+            connection.execute(
+                "INSERT INTO cases (func_name, input, output) VALUES ('f', '{}', '1')"
+            )
+        connection.close()
+
+        source = SQLiteCaseSource(str(path))
+        try:
+            source.add_cases("f", [{"input": {}, "output": 2, "max_peak_kb": 8}])
+            assert source.load_cases("f") == [
+                CaseRecord({}, 1),
+                CaseRecord({}, 2, budget=Budget(None, 8, 1)),
+            ]
+        finally:
+            source.close()
+
+    def test_iter_cases_pages(self, source):
+        """Test that streaming goes through every page"""
+        source.add_cases("func", [{"input": {"a": i}, "output": i} for i in range(5)])
+        assert [case.outp for case in source.iter_cases("func")] == list(range(5))
+        assert list(source.iter_cases("missing")) == []
+
+    def test_invalid_cases_are_rejected(self, source):
+        """Test that malformed raw cases are validated before being stored"""
+        with pytest.raises(ValueError):
+            source.add_cases("func", [{"input": 1, "output": 1}])
+        assert source.count("func") == 0
+
+    def test_threads_use_their_own_connection(self, source):
+        """Test reading from several threads"""
+        source.add_cases("func", [{"input": {"a": 1}, "output": 1}])
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(source.load_cases("func")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 4 and all(len(r) == 1 for r in results)
+
+    def test_import_and_export(self, source, tmp_path):
+        """Test importing the case file layout and exporting it back"""
+        cases_dir = tmp_path / "cases"
+        cases_dir.mkdir()
+        (cases_dir / "func.json").write_text(
+            json.dumps([{"input": {"a": 1}, "output": 1, "description": "one"}])
+        )
+        (cases_dir / "func.yaml").write_text("- input: {a: 2}\n  output: 2\n")
+
+        assert source.import_files(["func"], str(cases_dir)) == 2
+        # Importing again replaces the cases instead of adding them twice
+        assert source.import_files(["func"], str(cases_dir)) == 2
+        assert source.count("func") == 2
+
+        (json_path,) = source.export_files(str(tmp_path / "json"))
+        assert json.loads(open(json_path).read()) == [
+            {"input": {"a": 1}, "output": 1, "description": "one"},
+            {"input": {"a": 2}, "output": 2},
+        ]
+        (yaml_path,) = source.export_files(str(tmp_path / "yaml"), file_format="yaml")
+        assert yaml.safe_load(open(yaml_path))[1] == {"input": {"a": 2}, "output": 2}
+
+
+def test_open_case_source(tmp_path):
+    """Test opening sources by scheme or by SQLite file suffix"""
+    assert isinstance(open_case_source(f"sqlite:{tmp_path / 'a'}"), SQLiteCaseSource)
+    assert isinstance(open_case_source(str(tmp_path / "b.sqlite")), SQLiteCaseSource)
+    with pytest.raises(ValueError):
+        open_case_source("unknown:somewhere")
+
+
+def test_crawler_reads_sources(source, tmp_path, reset_sources):
+    """Test that registered sources add to the case files of a function"""
+    (tmp_path / "func.json").write_text(json.dumps([{"input": {"a": 1}, "output": 1}]))
+    source.add_cases(
+        "func", [{"input": {"a": 1}, "output": 1}, {"input": {"a": 2}, "output": 2}]
+    )
+    register_case_source(source)
+
+    test_cases = get_all_test_cases("func", search_dir=str(tmp_path))
+    assert [case.outp for case in test_cases] == [1, 2]
+
+    InputOutputRegistry._instance = None
+    streamed = list(iter_test_cases("func", search_dir=str(tmp_path)))
+    assert [case.outp for case in streamed] == [1, 1, 2]
+
+
+def test_sources_from_settings(tmp_path, reset_sources):
+    """Test that the sources listed in the settings are opened once"""
+    location = f"sqlite:{tmp_path / 'cases.db'}"
+    previous = update_settings(case_sources=(location,))
+    try:
+        (first,) = get_case_sources()
+        assert get_case_sources() == [first]
+    finally:
+        set_settings(previous)
+    assert get_case_sources() == []
@@ -0,0 +1,104 @@
+import pytest
+
+from donate_a_pytest.model import CaseRecord
+from donate_a_pytest.settings import set_settings, update_settings
+from donate_a_pytest.timings import (
+    PHASES,
+    Timings,
+    get_timings,
+    reset_timings,
+    timed,
+)
+
+
+@pytest.fixture
+def recording():
+    """Record timings for the duration of a test"""
+    previous = update_settings(record_timings=True)
+    reset_timings()
+    yield get_timings()
+    reset_timings()
+    set_settings(previous)
+
+
+class TestTimings:
+    """Tests for the phase timings of donated functions"""
+
+    def test_phases_add_up(self):
+        """Test that the phases of a function add up to its total"""
+        timings = Timings()
+        timings.add("add", "parse", 0.5)
+        timings.add("add", "parse", 0.25)
+        timings.add("add", "execute", 1.0, cases=3)
+        timings.add("sub", "discover", 0.1)
+
+        add = timings.functions["add"]
+        assert add.phases["parse"] == 0.75
+        assert add.total == 1.75
+        assert add.cases == 3
+        assert [f.name for f in timings.slowest_functions()] == ["add", "sub"]
+        assert [f.name for f in timings.slowest_functions(1)] == ["add"]
+
+    def test_slowest_cases_are_kept(self):
+        """Test that only the slowest cases are kept, slowest first"""
+        timings = Timings(slowest_cases=3)
+        seconds = [0.1, 0.5, 0.2, 0.4, 0.3, 0.4]
+        for index, duration in enumerate(seconds):
+            timings.add_case("add", index, CaseRecord({"x": index}, index), duration, 0)
+
+        function = timings.functions["add"]
+        assert function.cases == 6
+        assert function.phases["execute"] == pytest.approx(sum(seconds))
+        # Ties keep the case that ran first
+        assert [index for _, index, _ in function.slowest_cases()] == [1, 3, 5]
+        assert [case[2] for case in timings.slowest_cases_overall(2)] == [1, 3]
+
+    def test_to_dict(self):
+        """Test the JSON form of the timings"""
+        timings = Timings()
+        timings.add_case("add", 0, CaseRecord({"x": 1}, 1, "one"), 0.25, 0.5)
+
+        data = timings.to_dict()
+        assert data["phases"] == list(PHASES)
+        assert set(data["loaders"]) == {"json", "yaml"}
+        add = data["functions"]["add"]
+        assert add["cases"] == 1
+        assert add["phases"]["compare"] == 0.5
+        assert add["slowest_cases"] == [
+            {"index": 0, "seconds": 0.75, "description": "one", "input": "{'x': 1}"}
+        ]
+
+    def test_disabled_by_default(self):
+        """Test that nothing is recorded unless the setting is on"""
+        assert get_timings() is None
+        with timed("add", "parse"):
+            pass
+        assert get_timings() is None
+
+    def test_timed(self, recording):
+        """Test timing a with statement as a phase"""
+        with timed("add", "discover"):
+            pass
+        with timed(None, "discover"):
+            pass
+        assert list(recording.functions) == ["add"]
+        assert recording.functions["add"].phases["discover"] > 0
+
+    def test_crawler_phases(self, recording, tmp_path):
+        """Test that loading the cases of a function times every phase"""
+        from donate_a_pytest.model import InputOutputRegistry
+        from donate_a_pytest.tests_crawler import get_all_test_cases
+
+        (tmp_path / "timed_func.json").write_text(
+            '[{"input": {"x": 1}, "output": 1}, {"input": {"x": 2}, "output": 2}]'
+        )
+        InputOutputRegistry._instance = None
+        try:
+            assert len(get_all_test_cases("timed_func", search_dir=str(tmp_path))) == 2
+        finally:
+            InputOutputRegistry._instance = None
+
+        phases = recording.functions["timed_func"].phases
+        for phase in ("discover", "parse", "validate", "register"):
+            assert phases[phase] > 0, phase
+        assert phases["execute"] == phases["compare"] == 0
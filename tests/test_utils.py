@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from donate_a_pytest.utils import (
+    FileIndex,
+    find_paths_with_substring,
+    get_file_index,
+    clear_file_indexes,
+)
+
+
+@pytest.fixture
+def case_tree(tmp_path):
+    """Create a small tree of case files, including directories to prune"""
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "add.json").write_text("[]")
+    (tmp_path / "a" / "b" / "add_numbers.yaml").write_text("[]")
+    (tmp_path / "a" / "b" / "add.yml").write_text("[]")
+    (tmp_path / "a" / "b" / "notes.txt").write_text("add")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "add.json").write_text("[]")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "add.yaml").write_text("[]")
+    return tmp_path
+
+
+class TestFileIndex:
+    """Tests for the FileIndex class"""
+
+    def test_matches_find_paths_with_substring(self, case_tree):
+        """Test that lookups agree with a full walk when nothing is pruned"""
+        index = FileIndex(str(case_tree), ignore_dirs=frozenset())
+        for extension in (".json", ".yaml", ".yml"):
+            assert index.find("add", extension) == find_paths_with_substring(
+                str(case_tree), "add", extension
+            )
+
+    def test_prunes_ignored_directories(self, case_tree):
+        """Test that ignored directories are not indexed"""
+        index = FileIndex(str(case_tree))
+        paths = index.find("add")
+        assert len(paths) == 3
+        assert not any("node_modules" in p or ".git" in p for p in paths)
+
+    def test_only_indexes_case_files(self, case_tree):
+        """Test that files with other extensions are skipped"""
+        index = FileIndex(str(case_tree))
+        assert index.find("notes") == []
+
+    def test_multiple_extensions_and_exclusion(self, case_tree):
+        """Test lookups with a tuple of extensions and an excluded substring"""
+        index = FileIndex(str(case_tree))
+        paths = index.find("add", (".yaml", ".yml"), exclude_substring="numbers")
+        assert [os.path.basename(p) for p in paths] == ["add.yml"]
+
+    def test_paths_named(self, case_tree):
+        """Test exact basename lookups"""
+        index = FileIndex(str(case_tree))
+        assert index.paths_named("add.json") == [str(case_tree / "a" / "add.json")]
+        assert index.paths_named("missing.json") == []
+
+    def test_glob(self, case_tree):
+        """Test glob patterns against the paths relative to the directory"""
+        index = FileIndex(str(case_tree))
+        paths = index.glob(("a/b/*.y*ml", "*/add.json"))
+        assert sorted(paths) == sorted(
+            str(case_tree / "a" / name)
+            for name in ("add.json", "b/add_numbers.yaml", "b/add.yml")
+        )
+        assert index.glob(("add.json",)) == []
+        assert index.glob(()) == []
+
+    def test_lookup_does_not_walk_again(self, case_tree):
+        """Test that new files are only seen after the index is rebuilt"""
+        clear_file_indexes()
+        index = get_file_index(str(case_tree))
+        assert get_file_index(str(case_tree)) is index
+
+        (case_tree / "add_more.json").write_text("[]")
+        assert len(get_file_index(str(case_tree)).find("add_more")) == 0
+
+        clear_file_indexes()
+        assert len(get_file_index(str(case_tree)).find("add_more")) == 1
+
+    def test_rebuild_from_snapshot(self, case_tree):
+        """Test that only changed directories are read when using a snapshot"""
+        index = FileIndex(str(case_tree))
+        snapshot = json.loads(json.dumps(index.snapshot()))
+
+        rebuilt = FileIndex(str(case_tree), snapshot=snapshot)
+        assert rebuilt.rescanned == 0
+        assert rebuilt.find("add") == index.find("add")
+
+        (case_tree / "a" / "b" / "add_more.json").write_text("[]")
+        rebuilt = FileIndex(str(case_tree), snapshot=snapshot)
+        assert rebuilt.rescanned == 1
+        assert len(rebuilt.find("add")) == len(index.find("add")) + 1
+
+    def test_snapshot_with_other_settings_is_ignored(self, case_tree):
+        """Test that a snapshot taken with other ignored directories is not used"""
+        snapshot = FileIndex(str(case_tree)).snapshot()
+        rebuilt = FileIndex(str(case_tree), ignore_dirs=frozenset(), snapshot=snapshot)
+        assert rebuilt.rescanned > 0
+        assert len(rebuilt.find("add")) == 5